@@ -2,6 +2,11 @@
 
 cd /opt/cornershop/backend-test
 
+# blocks until the database, cache and broker answer, failing after the timeout
+wait_for_dependencies() {
+    python manage.py wait_for_db --timeout "${WAIT_FOR_DEPENDENCIES_TIMEOUT:-60}" || exit 1
+}
+
 # image can run in multiple modes
 if [[ "${1}" == "shell" ]]; then
     exec /bin/bash
@@ -44,10 +49,15 @@ elif [[ "${1}" == "celery" ]]; then
     CONCURRENCY="${CONCURRENCY:-1}"
     MAX_TASKS="${MAX_TASKS:-1000}"
 
+    wait_for_dependencies
     exec celery -A $APP -l $LOG_LEVEL -c $CONCURRENCY --maxtasksperchild=$MAX_TASKS worker -Q $QUEUES
 
 else
     
+    wait_for_dependencies
+    if [[ "${GUNICORN_PROFILE}" == "uvicorn" ]]; then
+        exec gunicorn --config=gunicorn_config.py backend_test.asgi
+    fi
     exec gunicorn --config=gunicorn_config.py backend_test.wsgi
     
 fi
\ No newline at end of file
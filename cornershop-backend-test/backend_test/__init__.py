@@ -1,3 +1,11 @@
-from .celery import app as celery_app
-
 __all__ = ("celery_app",)
+
+
+def __getattr__(name):
+    # The Celery app is loaded on first use, web processes never pay for it.
+    # Task modules import it so their shared tasks bind to it
+    if name == "celery_app":
+        from .celery import app
+
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,37 @@
+"""
+ASGI config for backend_test project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
+"""
+
+import os
+
+import django
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend_test.settings")
+
+
+class ThreadedConnectionsASGIHandler(ASGIHandler):
+    """ASGI handler that manages the DB connection of the serving thread.
+
+    Django sends request_started and request_finished from arbitrary executor
+    threads, so the connection of the thread that ran the view would never be
+    recycled. Recycling it around get_response honours CONN_MAX_AGE per
+    thread, like the WSGI handler does.
+    """
+
+    def get_response(self, request):
+        close_old_connections()
+        try:
+            return super().get_response(request)
+        finally:
+            close_old_connections()
+
+
+django.setup(set_prefix=False)
+application = ThreadedConnectionsASGIHandler()
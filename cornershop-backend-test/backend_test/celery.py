@@ -1,11 +1,8 @@
 from celery import Celery
 from celery.schedules import crontab
 
-from menu.tasks.send_menu import (
-    send_todays_menu_to_slack as send_todays_menu_to_slack_task,
-)
-
 from .envtools import getenv
+from .utils.profiling import connect_task_signals
 
 
 class CelerySettings:
@@ -74,13 +71,32 @@ app.autodiscover_tasks()
 
 
 app.conf.beat_schedule = {
-    "add-every-30-seconds": {
+    "send-todays-menu": {
+        "task": "send_todays_menu_to_slack_task",
+        "schedule": crontab(hour=8, minute=0),
+    },
+    # Updates the digest when today's menus change, a no-op otherwise
+    "refresh-todays-menu": {
         "task": "send_todays_menu_to_slack_task",
-        "schedule": crontab(hour=8),
+        "schedule": crontab(hour="8-20", minute="*/15"),
     },
 }
 
+if getenv("MENU_FANOUT_ENABLED", default="False", coalesce=bool):
+    # Direct message to every employee with a Slack id
+    app.conf.beat_schedule["fan-out-todays-menu"] = {
+        "task": "fan_out_todays_menu_task",
+        "schedule": crontab(hour=8, minute=0),
+    }
+
+if getenv("PROFILING_ENABLED", default="False", coalesce=bool):
+    # Tasks flagged with profile=True, or listed in PROFILING_TASKS
+    connect_task_signals()
+
 
 @app.task(name="send_todays_menu_to_slack_task")
 def send_todays_menu_to_slack():
-    send_todays_menu_to_slack_task()
+    # Imported on first run, beat and the web processes never need it
+    from menu.tasks.send_menu import send_todays_menu_to_slack
+
+    send_todays_menu_to_slack()
@@ -5,6 +5,9 @@ from typing import Any, Dict, Type, Union
 
 from fluent.handler import FluentRecordFormatter
 
+# Values json.loads returns as they are
+JSON_LEAF_TYPES = frozenset((str, int, float, bool, type(None)))
+
 
 class VerboseFluentRecordFormatter(FluentRecordFormatter):
     def __init__(
@@ -41,8 +44,73 @@ class VerboseFluentRecordFormatter(FluentRecordFormatter):
             self._encoder = self.encoder_class(**self.encoder_options)
         return self._encoder
 
-    def json_encode(self, obj: Any) -> Dict:
-        return json.loads(self.encoder.encode(obj))
+    def json_encode(self, obj: Any) -> Any:
+        """Converts obj to what ``json.loads(self.encoder.encode(obj))``
+        would return, in a single pass without building the JSON string.
+
+        Objects JSON can not represent go through the encoder's ``default``,
+        e.g. dates and lazy strings with DjangoJSONEncoder.
+        """
+        return self._to_json(obj, set())
+
+    def _to_json(self, obj: Any, markers: set) -> Any:
+        obj_type = type(obj)
+        if obj_type in JSON_LEAF_TYPES:
+            return obj
+        if isinstance(obj, str):
+            return str(obj)
+        if obj is True or obj is False:
+            return obj
+        if isinstance(obj, int):
+            return int(obj)
+        if isinstance(obj, float):
+            return float(obj)
+
+        marker = id(obj)
+        if marker in markers:
+            raise ValueError("Circular reference detected")
+        markers.add(marker)
+        try:
+            # Leaves of the exact JSON types, most of the values logged, are
+            # copied without a call
+            if isinstance(obj, dict):
+                converted = {}
+                for key, value in obj.items():
+                    if type(key) is not str:
+                        key = self._to_json_key(key)
+                        if key is None:
+                            continue
+                    if type(value) in JSON_LEAF_TYPES:
+                        converted[key] = value
+                    else:
+                        converted[key] = self._to_json(value, markers)
+                return converted
+            if isinstance(obj, (list, tuple)):
+                return [
+                    value
+                    if type(value) in JSON_LEAF_TYPES
+                    else self._to_json(value, markers)
+                    for value in obj
+                ]
+            return self._to_json(self.encoder.default(obj), markers)
+        finally:
+            markers.discard(marker)
+
+    def _to_json_key(self, key: Any) -> Any:
+        """Object key as JSON writes it, None when it is skipped"""
+        if isinstance(key, str):
+            return str(key)
+        if key is True:
+            return "true"
+        if key is False:
+            return "false"
+        if key is None:
+            return "null"
+        if isinstance(key, (int, float)):
+            return json.dumps(key)
+        if self.encoder.skipkeys:
+            return None
+        raise TypeError(f"keys must be str, int, float, bool or None, not {key!r}")
 
     def _format_msg_default(self, record, msg):
         return {"message": record.getMessage()}
@@ -0,0 +1,167 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Tuple
+
+from fluent import sender
+
+DROP = "drop"
+BLOCK = "block"
+
+
+class FluentBatchListener(QueueListener):
+    """Ships the queued (timestamp, data) events to Fluent from its thread,
+    packing every event waiting in the queue into a single write"""
+
+    def __init__(self, event_queue: queue.Queue, fluent_sender, batch_size: int):
+        super().__init__(event_queue)
+        self.sender = fluent_sender
+        self.batch_size = batch_size
+        self.sent = 0
+        self.failed = 0
+
+    def enqueue_sentinel(self):
+        # Waits for room, the sentinel must not be dropped from a full queue
+        self.queue.put(self._sentinel)
+
+    def _monitor(self):
+        event_queue = self.queue
+        while True:
+            batch = [event_queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(event_queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            if self._sentinel in batch:
+                batch = batch[: batch.index(self._sentinel)]
+                stop = True
+            if batch:
+                self.ship(batch)
+            if stop:
+                return
+
+    def ship(self, batch: List[Tuple[Any, Dict]]):
+        packets = b"".join(
+            self.sender._make_packet(None, timestamp, data) for timestamp, data in batch
+        )
+        # On errors the sender keeps the bytes and retries them with the next
+        # batch, until its bufmax is exceeded
+        if self.sender._send(packets):
+            self.sent += len(batch)
+        else:
+            self.failed += len(batch)
+
+
+class AsyncFluentHandler(QueueHandler):
+    """Formats records on the logging thread and ships them to Fluent from a
+    background thread, through a bounded queue.
+
+    When the queue is full records are dropped with the ``drop`` policy, so
+    logging never waits on Fluent, or the caller waits up to
+    ``block_timeout`` seconds with the ``block`` policy. ``queued``,
+    ``dropped``, ``sent`` and ``failed`` count the records of this process.
+    """
+
+    def __init__(
+        self,
+        tag: str,
+        host: str = "localhost",
+        port: int = 24224,
+        *,
+        timeout: float = 3.0,
+        queue_size: int = 10000,
+        batch_size: int = 500,
+        policy: str = DROP,
+        block_timeout: float = 1.0,
+        bufmax: int = 1024 * 1024,
+    ):
+        if policy not in (DROP, BLOCK):
+            raise ValueError(f"Unknown policy {policy!r}, use {DROP!r} or {BLOCK!r}")
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.tag = tag
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.bufmax = bufmax
+        self.queued = 0
+        self.dropped = 0
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _start_listener(self):
+        """Starts the shipping thread of the current process, threads do not
+        survive the fork of preloaded gunicorn workers"""
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self.queued = self.dropped = 0
+            fluent_sender = sender.FluentSender(
+                self.tag,
+                host=self.host,
+                port=self.port,
+                timeout=self.timeout,
+                bufmax=self.bufmax,
+            )
+            self.listener = FluentBatchListener(
+                self.queue, fluent_sender, self.batch_size
+            )
+            self.listener.start()
+            self._pid = os.getpid()
+            atexit.register(self.close)
+
+    def prepare(self, record: logging.LogRecord) -> Tuple[int, Dict]:
+        return int(record.created), self.format(record)
+
+    def enqueue(self, event: Tuple[int, Dict]):
+        if self.policy == DROP:
+            self.queue.put_nowait(event)
+        else:
+            self.queue.put(event, timeout=self.block_timeout)
+
+    def emit(self, record: logging.LogRecord):
+        if self._pid != os.getpid():
+            self._start_listener()
+        try:
+            self.enqueue(self.prepare(record))
+            self.queued += 1
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    @property
+    def sent(self) -> int:
+        return self.listener.sent if self.listener else 0
+
+    @property
+    def failed(self) -> int:
+        return self.listener.failed if self.listener else 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "pending": self.queue.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+        }
+
+    def close(self):
+        """Ships the queued records and stops the shipping thread"""
+        with self._start_lock:
+            listener = self.listener
+            if listener is not None and listener._thread is not None:
+                if self._pid == os.getpid():
+                    listener.stop()
+                    listener.sender.close()
+        super().close()
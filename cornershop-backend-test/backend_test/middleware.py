@@ -1,13 +1,35 @@
+import logging
+from time import perf_counter_ns
+
 from django.conf import settings
-from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.exceptions import MiddlewareNotUsed
 from django.utils.cache import add_never_cache_headers
 
+from .utils import profiling
+from .utils.healthz import HEALTH_CHECK_VIEWS
+from .utils.metrics import get_histograms
+from .utils.queries import QueryBudgetExceeded, QueryStats
+
+logger = logging.getLogger("backend_test.queries")
+
+KNOWN_METHODS = frozenset(
+    ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "TRACE")
+)
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+
+
+class HealthCheckMiddleware:
+    """Answers the liveness and readiness probes of HEALTH_CHECK_VIEWS before
+    the rest of the middleware chain, sessions, CSRF and metrics included"""
 
-class HealthCheckAwareSessionMiddleware(SessionMiddleware):
-    def process_request(self, request):
-        if request.path_info.startswith("/healthz"):
-            request.COOKIES[settings.SESSION_COOKIE_NAME] = "healthcheck"
-        super(HealthCheckAwareSessionMiddleware, self).process_request(request)
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        view = HEALTH_CHECK_VIEWS.get(request.path_info)
+        if view is not None:
+            return view(request)
+        return self.get_response(request)
 
 
 class HeaderNoCacheMiddleware(object):
@@ -17,7 +39,118 @@ class HeaderNoCacheMiddleware(object):
     def __call__(self, request):
         response = self.get_response(request)
 
-        if request.method == "GET" and not response.has_header("Cache-Control"):
+        if (
+            request.method == "GET"
+            and not response.has_header("Cache-Control")
+            and not response.has_header("ETag")
+            and not response.has_header("Last-Modified")
+        ):
             add_never_cache_headers(response)
 
         return response
+
+
+class LatencyMetricsMiddleware:
+    """Records the latency of every request, until its response is returned,
+    in the shared memory histograms served by backend_test.utils.metrics"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.histograms = get_histograms(
+            settings.LATENCY_METRICS_DIR, settings.LATENCY_METRICS_MAX_SERIES
+        )
+
+    def __call__(self, request):
+        start = perf_counter_ns()
+        response = self.get_response(request)
+        duration_us = (perf_counter_ns() - start) // 1000
+
+        method = request.method if request.method in KNOWN_METHODS else "OTHER"
+        # View names are bounded, unlike paths with ids in them
+        match = request.resolver_match
+        route = match.view_name if match is not None else "unresolved"
+        status = STATUS_CLASSES[min(max(response.status_code // 100, 1), 5) - 1]
+        self.histograms.record(method, route, status, duration_us)
+        return response
+
+
+class QueryMetricsMiddleware:
+    """Counts the queries of every request, their time and the slowest one.
+
+    The numbers are logged as structured data and sent in the Server-Timing
+    header. Requests over the QUERY_BUDGETS entry of their method and view,
+    or else of their view, are logged as warnings. When QUERY_BUDGET_RAISE is
+    set (in tests) requests over their query count raise QueryBudgetExceeded,
+    their query time depends on the machine and is only logged. Queries
+    run while a streaming response is consumed are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        with stats.capture():
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        view_name = match.view_name if match is not None else "unresolved"
+        if stats.count:
+            timing = stats.server_timing()
+            if response.has_header("Server-Timing"):
+                timing = f"{response['Server-Timing']}, {timing}"
+            response["Server-Timing"] = timing
+
+        budgets = settings.QUERY_BUDGETS
+        budget = budgets.get(f"{request.method} {view_name}", budgets.get(view_name))
+        errors = stats.over_budget(budget)
+        data = {
+            "view": view_name,
+            "method": request.method,
+            "status": response.status_code,
+            **stats.as_data(),
+        }
+        if errors:
+            message = f"{view_name} is over its query budget: {', '.join(errors)}"
+            if settings.QUERY_BUDGET_RAISE and stats.over_budget(
+                budget, limits=("queries",)
+            ):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message, extra={"data": data})
+        elif stats.count:
+            logger.info(
+                f"{view_name}: {stats.count} queries in "
+                f"{stats.duration * 1000:.1f}ms",
+                extra={"data": data},
+            )
+        return response
+
+
+class ProfilingMiddleware:
+    """Samples the stacks of requests with a signed X-Profile header, or of a
+    PROFILING_SAMPLE_RATE share of them, see backend_test.utils.profiling.
+
+    Removed from the chain unless PROFILING_ENABLED is set.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiling.should_profile_request(request):
+            return self.get_response(request)
+
+        sampler = profiling.StackSampler(interval=settings.PROFILING_INTERVAL)
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = sampler.stop()
+        match = request.resolver_match
+        view_name = match.view_name if match is not None else "unresolved"
+        name = profiling.write_profile(view_name, stacks)
+        if name:
+            response["X-Profile-Id"] = name
+        return response
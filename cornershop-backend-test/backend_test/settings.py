@@ -58,7 +58,10 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
-    "backend_test.middleware.HealthCheckAwareSessionMiddleware",
+    "backend_test.middleware.HealthCheckMiddleware",
+    "backend_test.middleware.LatencyMetricsMiddleware",
+    "backend_test.middleware.QueryMetricsMiddleware",
+    "backend_test.middleware.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -105,6 +108,14 @@ DATABASES = {
         "DISABLE_SERVER_SIDE_CURSORS": True,
     },
 }
+# Read replica of the default database, it only receives the reads of
+# backend_test.utils.replicas when POSTGRES_REPLICA_HOSTNAME is set
+DATABASES["replica"] = {
+    **DATABASES["default"],
+    "HOST": getenv("POSTGRES_REPLICA_HOSTNAME", default=DATABASES["default"]["HOST"]),
+    "TEST": {"NAME": "test_replica"},
+}
+DATABASE_ROUTERS = ["backend_test.utils.replicas.ReplicaRouter"]
 
 CACHES = {
     "default": {
@@ -170,6 +181,93 @@ if getenv("BROWSABLE_API_RENDERER", default=False, coalesce=bool):
 
 # APP SPECIFIC SETTINGS
 
+# Default page size of the cursor paginated listings
+API_PAGE_SIZE = getenv("API_PAGE_SIZE", default="50", coalesce=int)
+
+# Selections for today's menu close at this hour
+MENU_SELECTION_CUTOFF_HOUR = getenv(
+    "MENU_SELECTION_CUTOFF_HOUR", default="11", coalesce=int
+)
+
+# Menu response cache, see menu.cache
+MENU_CACHE_TIMEOUT = getenv("MENU_CACHE_TIMEOUT", default="300", coalesce=int)
+MENU_CACHE_LOCAL_MAXSIZE = getenv(
+    "MENU_CACHE_LOCAL_MAXSIZE", default="1024", coalesce=int
+)
+MENU_CACHE_LOCAL_TTL = getenv("MENU_CACHE_LOCAL_TTL", default="5", coalesce=float)
+
+# Token to user snapshots of core.utils.authentication.CachedTokenAuthentication
+AUTH_TOKEN_CACHE_TIMEOUT = getenv(
+    "AUTH_TOKEN_CACHE_TIMEOUT", default="3600", coalesce=int
+)
+AUTH_TOKEN_CACHE_LOCAL_MAXSIZE = getenv(
+    "AUTH_TOKEN_CACHE_LOCAL_MAXSIZE", default="4096", coalesce=int
+)
+AUTH_TOKEN_CACHE_LOCAL_TTL = getenv(
+    "AUTH_TOKEN_CACHE_LOCAL_TTL", default="5", coalesce=float
+)
+
+# Shared memory latency histograms of backend_test.middleware.LatencyMetricsMiddleware
+LATENCY_METRICS_DIR = getenv("LATENCY_METRICS_DIR", default="/tmp/latency_metrics")
+LATENCY_METRICS_MAX_SERIES = getenv(
+    "LATENCY_METRICS_MAX_SERIES", default="512", coalesce=int
+)
+# Bearer token of the /metrics endpoint, which is disabled when empty
+METRICS_TOKEN = getenv("METRICS_TOKEN", default="")
+
+# Query budgets of backend_test.middleware.QueryMetricsMiddleware, by method
+# and view name or by view name. A cold token cache costs one more query
+QUERY_BUDGETS = {
+    "GET menu:menu-list": {"queries": 3, "time_ms": 200},
+    "GET menu:menu-detail": {"queries": 3, "time_ms": 100},
+    "GET menu_selection:menuselection-list": {"queries": 2, "time_ms": 200},
+    "GET users:me": {"queries": 2, "time_ms": 50},
+}
+# Raise instead of logging views over their query count budget, enabled by the
+# test suite. Views over their time budget are always logged
+QUERY_BUDGET_RAISE = getenv("QUERY_BUDGET_RAISE", default=False, coalesce=bool)
+
+# Stack sampling profiles of backend_test.utils.profiling, written as collapsed
+# stacks. Nothing is profiled, nor checked, when disabled
+PROFILING_ENABLED = getenv("PROFILING_ENABLED", default=False, coalesce=bool)
+PROFILING_SAMPLE_RATE = getenv("PROFILING_SAMPLE_RATE", default="0", coalesce=float)
+PROFILING_INTERVAL = getenv("PROFILING_INTERVAL", default="0.001", coalesce=float)
+PROFILING_DIR = getenv("PROFILING_DIR", default="/tmp/profiles")
+PROFILING_MAX_FILES = getenv("PROFILING_MAX_FILES", default="200", coalesce=int)
+PROFILING_TOKEN_MAX_AGE = getenv(
+    "PROFILING_TOKEN_MAX_AGE", default="3600", coalesce=int
+)
+# Celery tasks always profiled, comma separated names
+PROFILING_TASKS = getenv(
+    "PROFILING_TASKS",
+    default="",
+    coalesce=lambda names: [name for name in str(names).split(",") if name],
+)
+
+# Import time budgets of the entry points of the profile_imports command, in
+# milliseconds, enforced by the test suite
+IMPORT_TIME_BUDGETS_MS = {"web": 1000, "worker": 1200, "beat": 1200}
+
+# Database aliases the safe reads of backend_test.utils.replicas.ReplicaReadMixin
+# viewsets go to, and seconds the reads of a user stay on the primary after
+# they write
+READ_REPLICAS = ["replica"] if getenv("POSTGRES_REPLICA_HOSTNAME", default="") else []
+READ_REPLICA_PIN_SECONDS = getenv(
+    "READ_REPLICA_PIN_SECONDS", default="5", coalesce=float
+)
+
+# Readiness checks of /readyz, see backend_test.utils.healthz. Every process
+# runs them at most once per interval, whatever the rate of the probes
+READINESS_CHECKS = getenv(
+    "READINESS_CHECKS",
+    default="database,cache,broker",
+    coalesce=lambda names: [name for name in str(names).split(",") if name],
+)
+READINESS_CHECK_INTERVAL = getenv(
+    "READINESS_CHECK_INTERVAL", default="5", coalesce=float
+)
+READINESS_CHECK_TIMEOUT = getenv("READINESS_CHECK_TIMEOUT", default="2", coalesce=float)
+
 # if getenv("SENTRY_DSN", default=None):
 #    sentry_sdk.init(dsn=getenv("SENTRY_DSN"), integrations=[DjangoIntegration()])
 
@@ -216,10 +314,14 @@ LOGGING = {
             "filters": ["require_debug_true"],
         },
         "fluent": {
-            "class": "fluent.handler.FluentHandler",
+            # Ships from a background thread, see backend_test.logging_handlers
+            "()": "backend_test.logging_handlers.AsyncFluentHandler",
             "host": os.getenv("FLUENT_HOST", "fluentbit"),
             "port": int(os.getenv("FLUENT_PORT", 24224)),
             "tag": os.getenv("FLUENT_TAG", "catalog"),
+            "queue_size": int(os.getenv("FLUENT_QUEUE_SIZE", 10000)),
+            "batch_size": int(os.getenv("FLUENT_BATCH_SIZE", 500)),
+            "policy": os.getenv("FLUENT_QUEUE_POLICY", "drop"),
             "formatter": "fluent_formatter",
             "level": "INFO",
         },
@@ -13,12 +13,15 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.urls import path, include
+from django.urls import include, path
 
-from .utils.healthz import healthz
+from .utils.healthz import healthz, readyz
+from .utils.metrics import metrics
 
 urlpatterns = [
     path("healthz", healthz, name="healthz"),
+    path("readyz", readyz, name="readyz"),
+    path("metrics", metrics, name="metrics"),
     path("api/users/", include("users.urls")),
     path("api/menu/", include("menu.urls")),
     path("api/menuselection/", include("menu_selection.urls")),
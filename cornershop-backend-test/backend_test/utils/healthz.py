@@ -1,14 +1,170 @@
-from rest_framework import permissions
-from rest_framework.decorators import (
-    api_view,
-    authentication_classes,
-    permission_classes,
-)
-from rest_framework.response import Response
-
-
-@api_view(["GET", "HEAD"])
-@permission_classes([permissions.AllowAny])
-@authentication_classes([])
+import logging
+import math
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_safe
+
+logger = logging.getLogger("backend_test.healthz")
+
+
+def probe_database(timeout: float):
+    """Runs SELECT 1 on the default database.
+
+    PostgreSQL is probed over a new connection, with ``timeout`` as its
+    connect_timeout and statement_timeout, so an unreachable server fails the
+    probe instead of hanging it. That costs a connection per run, which
+    ReadinessChecks makes at most once per interval and process. Other
+    backends use the connection of the thread.
+    """
+    connection = connections["default"]
+    if connection.vendor != "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+        return
+    params = connection.get_connection_params()
+    # libpq only takes whole seconds
+    params["connect_timeout"] = max(1, math.ceil(timeout))
+    # Keeps the configured options, e.g. a search_path
+    params["options"] = " ".join(
+        option
+        for option in (
+            params.get("options"),
+            f"-c statement_timeout={int(timeout * 1000)}",
+        )
+        if option
+    )
+    raw_connection = connection.get_new_connection(params)
+    try:
+        with raw_connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+    finally:
+        raw_connection.close()
+
+
+def probe_cache(timeout: float):
+    """PINGs the Redis server of the default cache, other backends are read"""
+    try:
+        from django_redis import get_redis_connection
+
+        client = get_redis_connection("default")
+    except NotImplementedError:
+        # Not a django_redis cache
+        caches["default"].get("healthz")
+    else:
+        client.ping()
+
+
+def probe_broker(timeout: float):
+    """Connects to the Celery broker of BROKER_URL"""
+    from backend_test.celery import app
+
+    with app.connection_for_write(connect_timeout=timeout) as connection:
+        connection.ensure_connection(max_retries=0)
+
+
+# Dependencies of the application, probes raise when they are unavailable
+PROBES: Dict[str, Callable[[float], None]] = {
+    "database": probe_database,
+    "cache": probe_cache,
+    "broker": probe_broker,
+}
+
+
+class ReadinessChecks:
+    """Runs the probes of some dependencies at most once per ``interval``
+    seconds, sharing the result between the requests of the process.
+
+    While a request refreshes an expired result, the others get the previous
+    one instead of waiting for it.
+    """
+
+    def __init__(self, names: Tuple[str, ...], interval: float, timeout: float):
+        self.names = names
+        self.interval = interval
+        self.timeout = timeout
+        self._result: Optional[Dict] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _expired(self) -> bool:
+        return (
+            self._result is None or time.monotonic() - self._checked_at >= self.interval
+        )
+
+    def result(self) -> Dict:
+        """Latest result, ``{"ready": bool, "checks": {name: check}}``"""
+        if not self._expired():
+            return self._result
+        if not self._lock.acquire(blocking=self._result is None):
+            return self._result
+        try:
+            if self._expired():
+                self._result = self.run()
+                self._checked_at = time.monotonic()
+            return self._result
+        finally:
+            self._lock.release()
+
+    def run(self) -> Dict:
+        """Runs the probes, their errors are logged and not returned since
+        they may name internal hosts"""
+        checks = {}
+        for name in self.names:
+            start = time.perf_counter()
+            try:
+                PROBES[name](self.timeout)
+                ok = True
+            except Exception as e:
+                ok = False
+                logger.warning(
+                    "Readiness check %s failed",
+                    name,
+                    extra={"data": {"check": name, "error": repr(e)}},
+                )
+            checks[name] = {
+                "ok": ok,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+            }
+        ready = all(check["ok"] for check in checks.values())
+        return {"ready": ready, "checks": checks}
+
+
+@lru_cache(maxsize=None)
+def get_readiness_checks(
+    names: Tuple[str, ...], interval: float, timeout: float
+) -> ReadinessChecks:
+    """Checks shared by the whole process, so their result is too"""
+    return ReadinessChecks(names, interval, timeout)
+
+
+@require_safe
 def healthz(request, *args, **kwargs):
-    return Response(status=200)
+    """Liveness, the process answers requests"""
+    return HttpResponse(status=200)
+
+
+@require_safe
+def readyz(request, *args, **kwargs):
+    """Readiness, the dependencies of READINESS_CHECKS answered their last
+    check, run at most once per READINESS_CHECK_INTERVAL seconds"""
+    checks = get_readiness_checks(
+        tuple(settings.READINESS_CHECKS),
+        settings.READINESS_CHECK_INTERVAL,
+        settings.READINESS_CHECK_TIMEOUT,
+    )
+    result = checks.result()
+    return JsonResponse(result, status=200 if result["ready"] else 503)
+
+
+# Served by backend_test.middleware.HealthCheckMiddleware, ahead of the rest of
+# the middleware chain
+HEALTH_CHECK_VIEWS = {"/healthz": healthz, "/readyz": readyz}
@@ -0,0 +1,297 @@
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+# Upper bounds, in microseconds, of the latency buckets: 4 log-linear buckets
+# per doubling from 100us to ~26s, so any latency is within 19% of its bucket
+# bound. Anything slower lands in the +Inf bucket
+BUCKET_BOUNDS_US = tuple(round(100 * 2 ** (k / 4)) for k in range(73))
+# One counter per bucket, +Inf included, then the sum of latencies and count
+SERIES_WORDS = len(BUCKET_BOUNDS_US) + 3
+KEY_SIZE = 128
+HEADER = struct.Struct("4sII")
+MAGIC = b"LATH"
+LABELS = ("method", "route", "status")
+OVERFLOW_KEY = ("OTHER", "__overflow__", "OTHER")
+# File the histograms of dead workers are merged into
+ARCHIVE = "archive"
+
+
+class Series(NamedTuple):
+    buckets: List[int]
+    sum_us: int
+    count: int
+
+
+def _layout(max_series: int) -> Tuple[int, int]:
+    """Offset of the counters and size of a file holding max_series series"""
+    counts_offset = HEADER.size + max_series * KEY_SIZE
+    counts_offset += -counts_offset % 8
+    return counts_offset, counts_offset + max_series * SERIES_WORDS * 8
+
+
+def _encode_key(key: Tuple[str, ...]) -> bytes:
+    # Truncated on a character boundary, so the key still decodes
+    encoded = "\t".join(key).encode()[:KEY_SIZE].decode(errors="ignore").encode()
+    return encoded.ljust(KEY_SIZE, b"\0")
+
+
+def _decode_key(raw: bytes) -> Optional[Tuple[str, ...]]:
+    raw = raw.rstrip(b"\0")
+    if not raw:
+        return None
+    try:
+        key = tuple(raw.decode().split("\t"))
+    except UnicodeDecodeError:
+        return None
+    return key if len(key) == len(LABELS) else None
+
+
+class LatencyHistograms:
+    """Fixed-bucket latency histograms in a memory mapped file per process.
+
+    Each process only writes its own file, so preforked workers never contend
+    with each other; the lock only serializes the threads of a worker. The
+    files are summed by ``aggregate``, from any process. Series are claimed on
+    first use and live for the lifetime of the file, ``max_series`` bounds the
+    file size and further series are counted in an overflow series.
+
+    The files of dead workers are merged into an archive file by
+    ``mark_process_dead``, called by the gunicorn master, so they do not pile
+    up as workers are restarted.
+    """
+
+    def __init__(self, directory: str, max_series: int = 512, name: str = None):
+        self.directory = directory
+        self.max_series = max_series
+        # File name of the histograms, the pid of the process by default
+        self.name = name
+        self._lock = threading.Lock()
+        self._pid = None
+        self._mmap = None
+        self._counts = None
+        self._keys: Dict[Tuple[str, ...], int] = {}
+        self._archive: Optional["LatencyHistograms"] = None
+
+    @property
+    def path(self) -> str:
+        return self._path(self.name or os.getpid())
+
+    def _path(self, name) -> str:
+        return os.path.join(self.directory, f"latency-{name}.mmap")
+
+    def _open(self):
+        """Maps the file of the current process, after every fork"""
+        os.makedirs(self.directory, exist_ok=True)
+        counts_offset, size = _layout(self.max_series)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+            mapped = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        HEADER.pack_into(mapped, 0, MAGIC, len(BUCKET_BOUNDS_US), self.max_series)
+        self._keys = {}
+        for slot in range(self.max_series):
+            start = HEADER.size + slot * KEY_SIZE
+            key = _decode_key(mapped[start : start + KEY_SIZE])
+            if key is None:
+                break
+            self._keys[key] = slot * SERIES_WORDS
+        self._mmap = mapped
+        self._counts = memoryview(mapped)[counts_offset:].cast("Q")
+        self._pid = os.getpid()
+
+    def _claim(self, key: Tuple[str, ...]) -> int:
+        if len(self._keys) >= self.max_series - 1 and key != OVERFLOW_KEY:
+            offset = self._keys.get(OVERFLOW_KEY)
+            return self._claim(OVERFLOW_KEY) if offset is None else offset
+        slot = len(self._keys)
+        start = HEADER.size + slot * KEY_SIZE
+        # Counters of a new slot are zero, readers only see the slot once its
+        # key is written
+        self._mmap[start : start + KEY_SIZE] = _encode_key(key)
+        self._keys[key] = offset = slot * SERIES_WORDS
+        return offset
+
+    def record(self, method: str, route: str, status: str, duration_us: int):
+        """Counts a request in the histogram of its method, route and status"""
+        bucket = bisect_left(BUCKET_BOUNDS_US, duration_us)
+        key = (method, route, status)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            offset = self._keys.get(key)
+            if offset is None:
+                offset = self._claim(key)
+            counts = self._counts
+            counts[offset + bucket] += 1
+            counts[offset + SERIES_WORDS - 2] += duration_us
+            counts[offset + SERIES_WORDS - 1] += 1
+
+    def merge(self, key: Tuple[str, ...], series: Series):
+        """Adds the counters of a series to the histogram of its key"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            offset = self._keys.get(key)
+            if offset is None:
+                offset = self._claim(key)
+            counts = self._counts
+            for index, value in enumerate(series.buckets):
+                counts[offset + index] += value
+            counts[offset + SERIES_WORDS - 2] += series.sum_us
+            counts[offset + SERIES_WORDS - 1] += series.count
+
+    def mark_process_dead(self, pid: int):
+        """Merges the histograms of a dead process into the archive file and
+        removes its file.
+
+        The file is renamed away first, so ``aggregate`` never counts it in
+        both the file and the archive. The archive stays mapped for the next
+        dead process.
+        """
+        path = self._path(pid)
+        dead_path = f"{path}.dead"
+        try:
+            os.rename(path, dead_path)
+        except FileNotFoundError:
+            return
+        if self._archive is None:
+            self._archive = LatencyHistograms(
+                self.directory, self.max_series, name=ARCHIVE
+            )
+        for key, series in _read_file(dead_path):
+            self._archive.merge(key, series)
+        os.remove(dead_path)
+
+    def close(self):
+        """Unmaps the file, it is mapped again on the next write"""
+        with self._lock:
+            if self._mmap is not None:
+                self._counts.release()
+                self._mmap.close()
+            self._pid = self._mmap = self._counts = None
+            self._keys = {}
+
+    def reset(self):
+        """Removes the files of every process and the archive, e.g. when the
+        server starts"""
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.startswith("latency-"):
+                os.remove(os.path.join(self.directory, name))
+
+    def aggregate(self) -> Dict[Tuple[str, ...], Series]:
+        """Sums the histograms of every process and the archive of the dead
+        ones, so the counters never go backwards"""
+        totals: Dict[Tuple[str, ...], Series] = {}
+        for path in self._files():
+            for key, series in _read_file(path):
+                total = totals.get(key)
+                if total is None:
+                    totals[key] = series
+                    continue
+                totals[key] = Series(
+                    [a + b for a, b in zip(total.buckets, series.buckets)],
+                    total.sum_us + series.sum_us,
+                    total.count + series.count,
+                )
+        return totals
+
+    def _files(self) -> Iterator[str]:
+        if not os.path.isdir(self.directory):
+            return
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith("latency-") and name.endswith(".mmap"):
+                yield os.path.join(self.directory, name)
+
+
+def _read_file(path: str) -> Iterator[Tuple[Tuple[str, ...], Series]]:
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        return
+    magic, buckets, max_series = HEADER.unpack_from(data)
+    if magic != MAGIC or buckets != len(BUCKET_BOUNDS_US):
+        return
+    counts_offset, size = _layout(max_series)
+    if len(data) != size:
+        return
+    counts = memoryview(data)[counts_offset:].cast("Q")
+    for slot in range(max_series):
+        start = HEADER.size + slot * KEY_SIZE
+        key = _decode_key(data[start : start + KEY_SIZE])
+        if key is None:
+            return
+        offset = slot * SERIES_WORDS
+        words = counts[offset : offset + SERIES_WORDS].tolist()
+        yield key, Series(words[:-2], words[-2], words[-1])
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def render_prometheus(
+    series: Dict[Tuple[str, ...], Series],
+    name: str = "http_request_duration_seconds",
+) -> str:
+    """Renders histograms in the Prometheus text exposition format"""
+    bounds = [f"{bound / 1e6:g}" for bound in BUCKET_BOUNDS_US] + ["+Inf"]
+    lines = [
+        f"# HELP {name} Latency of the HTTP requests by method, route and status.",
+        f"# TYPE {name} histogram",
+    ]
+    for key in sorted(series):
+        buckets, sum_us, count = series[key]
+        labels = ",".join(
+            f'{label}="{_escape(value)}"' for label, value in zip(LABELS, key)
+        )
+        cumulative = 0
+        for bound, bucket in zip(bounds, buckets):
+            cumulative += bucket
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {sum_us / 1e6}")
+        lines.append(f"{name}_count{{{labels}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+@lru_cache(maxsize=None)
+def get_histograms(directory: str, max_series: int) -> LatencyHistograms:
+    """Histograms of a directory, shared by the whole process since a process
+    must write its file through a single instance"""
+    return LatencyHistograms(directory, max_series)
+
+
+def metrics(request):
+    """Latency histograms of every worker in the Prometheus text format.
+
+    Only served with ``Authorization: Bearer <METRICS_TOKEN>``, and not at all
+    when METRICS_TOKEN is not set.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.META.get("HTTP_AUTHORIZATION", "")
+    if not token or not constant_time_compare(authorization, f"Bearer {token}"):
+        raise Http404
+    histograms = get_histograms(
+        settings.LATENCY_METRICS_DIR, settings.LATENCY_METRICS_MAX_SERIES
+    )
+    return HttpResponse(
+        render_prometheus(histograms.aggregate()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
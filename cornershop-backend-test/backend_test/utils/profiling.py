@@ -0,0 +1,156 @@
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core import signing
+
+PROFILE_HEADER = "HTTP_X_PROFILE"
+TOKEN_SALT = "backend_test.profiling"
+PROFILE_SUFFIX = ".collapsed"
+UNSAFE_LABEL_CHARS = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class StackSampler:
+    """Samples the stack of a thread from a background thread.
+
+    Stacks are counted in the collapsed format of flamegraph.pl and speedscope,
+    root first and frames as ``module:function``. Nothing runs in the sampled
+    thread, so the overhead only is the GIL time of the sampling thread.
+    """
+
+    def __init__(self, thread_id: int = None, interval: float = 0.001):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._labels: Dict[object, str] = {}
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+
+    def _label(self, frame) -> str:
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            module = frame.f_globals.get("__name__", "?")
+            label = f"{module}:{code.co_name}".replace(";", ":").replace(" ", "_")
+            self._labels[code] = label
+        return label
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame))
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[";".join(stack)] += 1
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stopped.set()
+        self._thread.join()
+        return self.stacks
+
+
+def write_profile(label: str, stacks: Counter) -> Optional[str]:
+    """Writes collapsed stacks to PROFILING_DIR, keeping only the newest
+    PROFILING_MAX_FILES profiles.
+
+    Returns:
+        str | None: Name of the written file, None without samples.
+    """
+    if not stacks:
+        return None
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    label = UNSAFE_LABEL_CHARS.sub("-", label.replace(":", "."))[:80]
+    # Names sort chronologically, which rotation relies on
+    name = (
+        f"{time.strftime('%Y%m%dT%H%M%S')}-{label}-{os.getpid()}-"
+        f"{uuid.uuid4().hex[:8]}{PROFILE_SUFFIX}"
+    )
+    lines = "".join(f"{stack} {count}\n" for stack, count in stacks.items())
+    with open(os.path.join(directory, name), "w") as f:
+        f.write(lines)
+    rotate_profiles(directory, settings.PROFILING_MAX_FILES)
+    return name
+
+
+def rotate_profiles(directory: str, max_files: int):
+    profiles = sorted(
+        name for name in os.listdir(directory) if name.endswith(PROFILE_SUFFIX)
+    )
+    for name in profiles[: max(len(profiles) - max_files, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            # Rotated by another worker
+            pass
+
+
+def make_profiling_token() -> str:
+    """Value of the X-Profile header profiling a request, valid for
+    PROFILING_TOKEN_MAX_AGE seconds"""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(uuid.uuid4().hex)
+
+
+def should_profile_request(request) -> bool:
+    """Whether a request is sampled or carries a valid X-Profile header"""
+    token = request.META.get(PROFILE_HEADER)
+    if token:
+        try:
+            signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+                token, max_age=settings.PROFILING_TOKEN_MAX_AGE
+            )
+            return True
+        except signing.BadSignature:
+            pass
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+# Samplers of the running tasks, by task id
+_task_samplers: Dict[str, StackSampler] = {}
+
+
+def should_profile_task(task) -> bool:
+    return getattr(task, "profile", False) or task.name in settings.PROFILING_TASKS
+
+
+def start_task_profile(sender=None, task_id=None, task=None, **kwargs):
+    """task_prerun receiver sampling tasks flagged with ``profile=True`` or
+    listed in PROFILING_TASKS"""
+    if task is not None and should_profile_task(task):
+        _task_samplers[task_id] = StackSampler(
+            interval=settings.PROFILING_INTERVAL
+        ).start()
+
+
+def stop_task_profile(sender=None, task_id=None, task=None, **kwargs):
+    """task_postrun receiver writing the profile of a sampled task"""
+    sampler = _task_samplers.pop(task_id, None)
+    if sampler is not None:
+        write_profile(f"task-{task.name}", sampler.stop())
+
+
+def connect_task_signals():
+    """Profiles Celery tasks, only connected when PROFILING_ENABLED is set so
+    tasks pay nothing otherwise"""
+    from celery.signals import task_postrun, task_prerun
+
+    task_prerun.connect(start_task_profile, weak=False)
+    task_postrun.connect(stop_task_profile, weak=False)
@@ -0,0 +1,81 @@
+from contextlib import ExitStack, contextmanager
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from django.db import connections
+
+# Characters of the slowest statement kept in the logs
+SQL_MAX_LENGTH = 1000
+
+
+class QueryBudgetExceeded(Exception):
+    """A view ran more queries than its budget"""
+
+
+class QueryStats:
+    """``execute_wrapper`` counting the queries of a block, their total time
+    and the slowest statement, without their parameters.
+
+    Usage:
+        stats = QueryStats()
+        with stats.capture():
+            ...
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest_sql = None
+        self.slowest_duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if duration >= self.slowest_duration:
+                self.slowest_duration = duration
+                self.slowest_sql = sql
+
+    @contextmanager
+    def capture(self, aliases: Iterable[str] = None) -> Iterator["QueryStats"]:
+        """Wraps the queries of every database, or of the given aliases"""
+        with ExitStack() as stack:
+            for alias in connections if aliases is None else aliases:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+    def over_budget(
+        self, budget: Optional[Dict], limits: Iterable[str] = ("queries", "time_ms")
+    ) -> List[str]:
+        """Describes how the queries exceed a budget like
+        ``{"queries": 3, "time_ms": 50}``, both limits are optional and only
+        those in ``limits`` are checked"""
+        errors = []
+        if not budget:
+            return errors
+        max_queries = budget.get("queries") if "queries" in limits else None
+        if max_queries is not None and self.count > max_queries:
+            errors.append(f"{self.count} queries > {max_queries}")
+        max_time_ms = budget.get("time_ms") if "time_ms" in limits else None
+        if max_time_ms is not None and self.duration * 1000 > max_time_ms:
+            errors.append(f"{self.duration * 1000:.1f}ms > {max_time_ms}ms")
+        return errors
+
+    def server_timing(self) -> str:
+        """Entry of the Server-Timing header"""
+        return f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries"'
+
+    def as_data(self) -> Dict:
+        slowest_sql = self.slowest_sql
+        if slowest_sql is not None and len(slowest_sql) > SQL_MAX_LENGTH:
+            slowest_sql = f"{slowest_sql[:SQL_MAX_LENGTH]}..."
+        return {
+            "queries": self.count,
+            "db_time_ms": round(self.duration * 1000, 3),
+            "slowest_query_ms": round(self.slowest_duration * 1000, 3),
+            "slowest_query": slowest_sql,
+        }
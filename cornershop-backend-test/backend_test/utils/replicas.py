@@ -0,0 +1,99 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+# Alias the reads of the current request go to, None for the default database
+_read_database: ContextVar[Optional[str]] = ContextVar("read_database", default=None)
+
+
+class ReplicaRouter:
+    """Sends the reads of ``replica_reads`` blocks to a read replica and
+    everything else, writes included, to the default database"""
+
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints) -> Optional[str]:
+        # Instances read from a replica are saved to the primary
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        # Replicas hold the rows of the primary
+        return True
+
+
+@contextmanager
+def replica_reads() -> Iterator[Optional[str]]:
+    """Reads the queries of the block from one of READ_REPLICAS, from the
+    default database when there are none"""
+    alias = random.choice(settings.READ_REPLICAS) if settings.READ_REPLICAS else None
+    token = _read_database.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_database.reset(token)
+
+
+def reads_from_replica() -> bool:
+    """Whether the reads of the current block go to a replica"""
+    return _read_database.get() is not None
+
+
+def pin_key(user) -> str:
+    return f"db:pin:{user.pk}"
+
+
+def pin_to_primary(user):
+    """Sends the reads of a user to the primary for READ_REPLICA_PIN_SECONDS,
+    so they see their writes while the replicas catch up"""
+    cache.set(pin_key(user), True, timeout=settings.READ_REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(user) -> bool:
+    return bool(user and user.is_authenticated and cache.get(pin_key(user)))
+
+
+class ReplicaReadMixin:
+    """Runs the safe requests of the ``replica_actions`` of a viewset on a read
+    replica, once the request is authenticated.
+
+    Successful writes of authenticated users pin their reads to the primary.
+    The pin is a cache flag rather than a cookie, since API clients send
+    tokens and may not keep cookies. Anonymous users never write, so their
+    reads are not checked. Streamed responses are read from the primary.
+    """
+
+    replica_actions = ("list", "retrieve")
+
+    def use_replica(self, request) -> bool:
+        return (
+            bool(settings.READ_REPLICAS)
+            and request.method in SAFE_METHODS
+            and self.action in self.replica_actions
+            and not is_pinned_to_primary(request.user)
+        )
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.use_replica(request):
+            self._replica_reads = replica_reads()
+            self._replica_reads.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        replica = getattr(self, "_replica_reads", None)
+        if replica is not None:
+            self._replica_reads = None
+            replica.__exit__(None, None, None)
+        if (
+            settings.READ_REPLICAS
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and request.user.is_authenticated
+        ):
+            pin_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
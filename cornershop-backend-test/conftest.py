@@ -0,0 +1,66 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--run-slow",
+        action="store_true",
+        help="Run the tests marked slow: benchmarks and wall-clock budgets",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    """Tests marked slow depend on the speed and load of the machine, they are
+    skipped unless asked for"""
+    if config.getoption("--run-slow"):
+        return
+    skip_slow = pytest.mark.skip(reason="slow, run with --run-slow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
+
+
+@pytest.fixture(autouse=True)
+def raise_on_query_budget(settings):
+    """Views over the query count of their QUERY_BUDGETS fail the tests
+    instead of logging, their query time is only logged"""
+    settings.QUERY_BUDGET_RAISE = True
+
+
+@pytest.fixture
+def api_client():
+    """Unauthenticated DRF test client"""
+    return APIClient()
+
+
+@pytest.fixture
+def assert_list_queries():
+    """Assert that a listing runs an exact number of queries, and that the
+    number does not grow with the number of rows (N+1 regressions).
+
+    Usage:
+        assert_list_queries(client, url, add_rows, expected=1)
+
+    ``add_rows`` is called before each of the two requests and should add
+    enough rows to change the size of the listed page.
+    """
+
+    def _assert_list_queries(client, url, add_rows, expected, data=None):
+        counts = []
+        for _ in range(2):
+            add_rows()
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url, data)
+            assert response.status_code == 200, response.data
+            counts.append(len(context.captured_queries))
+
+        queries = "\n".join(query["sql"] for query in context.captured_queries)
+        assert counts == [expected, expected], (
+            f"Expected {expected} queries per request, got {counts}. "
+            f"Last request ran:\n{queries}"
+        )
+
+    return _assert_list_queries
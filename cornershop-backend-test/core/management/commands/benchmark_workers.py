@@ -0,0 +1,260 @@
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, NamedTuple, Sequence
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+import requests
+
+# Application served by each worker profile of gunicorn_config.py
+PROFILE_APPS = {
+    "sync": "backend_test.wsgi",
+    "gthread": "backend_test.wsgi",
+    "uvicorn": "backend_test.asgi",
+}
+DEFAULT_PATHS = (
+    "/api/menu/menu/",
+    "/api/menuselection/menu_selection/",
+    "/api/users/me/",
+)
+PERCENTILES = (50, 95, 99)
+
+
+class LoadResult(NamedTuple):
+    requests: int
+    errors: int
+    elapsed: float
+    latencies: List[float]
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of sorted values, 0 when there are none"""
+    if not values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def run_load(
+    base_url: str,
+    paths: Sequence[str],
+    *,
+    headers: dict,
+    concurrency: int,
+    total: int,
+    timeout: float = 30,
+) -> LoadResult:
+    """Sends ``total`` GET requests cycling over ``paths``, keeping exactly
+    ``concurrency`` of them in flight.
+
+    Args:
+        base_url (str): Server to benchmark, without trailing slash.
+        paths (Sequence[str]): Paths requested in turns.
+        headers (dict): Headers of every request, e.g. the authorization.
+        concurrency (int): Number of clients, each with its own keep-alive
+            session, sending requests one after the other.
+        total (int): Number of requests to send.
+        timeout (float): Seconds before a request is counted as an error.
+
+    Returns:
+        LoadResult: Counters and the sorted latencies, in seconds, of the
+            successful requests.
+    """
+    lock = threading.Lock()
+    sent = 0
+    errors = 0
+    latencies = []
+
+    def client():
+        nonlocal sent, errors
+        session = requests.Session()
+        session.headers.update(headers)
+        while True:
+            with lock:
+                if sent >= total:
+                    break
+                path = paths[sent % len(paths)]
+                sent += 1
+            start = time.perf_counter()
+            try:
+                response = session.get(f"{base_url}{path}", timeout=timeout)
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            latency = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(latency)
+                else:
+                    errors += 1
+        session.close()
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return LoadResult(total, errors, elapsed, sorted(latencies))
+
+
+class Command(BaseCommand):
+    """Django command to compare the gunicorn worker profiles under load.
+
+    Each profile is started on a local port and the menu endpoints are
+    requested at a fixed concurrency, reporting req/s and latency
+    percentiles. With --url an already running server is benchmarked.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profiles",
+            nargs="+",
+            default=list(PROFILE_APPS),
+            help="Worker profiles to benchmark",
+        )
+        parser.add_argument("--url", help="Benchmark this server instead")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=100,
+            help="Requests sent before measuring, to open connections",
+        )
+        parser.add_argument("--paths", nargs="+", default=list(DEFAULT_PATHS))
+        parser.add_argument(
+            "--username",
+            default="benchmark",
+            help="Staff user whose token authenticates the requests",
+        )
+        parser.add_argument(
+            "--startup-timeout",
+            type=float,
+            default=30,
+            help="Seconds to wait for a profile to answer /healthz",
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options["profiles"]) - set(PROFILE_APPS)
+        if unknown:
+            raise CommandError(f"Unknown profiles: {', '.join(sorted(unknown))}")
+        headers = {"Authorization": f"Token {self.get_token(options['username'])}"}
+
+        if options["url"]:
+            targets = [("server", options["url"].rstrip("/"))]
+        else:
+            targets = [
+                (profile, f"http://127.0.0.1:{options['port']}")
+                for profile in options["profiles"]
+            ]
+        self.stdout.write(
+            f"{options['requests']} requests at concurrency "
+            f"{options['concurrency']} over {', '.join(options['paths'])}"
+        )
+        self.stdout.write(
+            f"{'profile':<10}{'req/s':>10}{'errors':>8}"
+            + "".join(f"{f'p{pct} ms':>10}" for pct in PERCENTILES)
+        )
+        for profile, base_url in targets:
+            if options["url"]:
+                result = self.benchmark(base_url, headers, options)
+            else:
+                with self.serve(profile, options):
+                    result = self.benchmark(base_url, headers, options)
+            self.stdout.write(
+                f"{profile:<10}{result.throughput:>10.1f}{result.errors:>8}"
+                + "".join(
+                    f"{percentile(result.latencies, pct) * 1000:>10.1f}"
+                    for pct in PERCENTILES
+                )
+            )
+
+    def get_token(self, username: str) -> str:
+        user, created = get_user_model().objects.get_or_create(
+            username=username, defaults={"is_staff": True}
+        )
+        if created:
+            user.set_unusable_password()
+            user.save()
+        return Token.objects.get_or_create(user=user)[0].key
+
+    def benchmark(self, base_url: str, headers: dict, options: dict) -> LoadResult:
+        if options["warmup"]:
+            run_load(
+                base_url,
+                options["paths"],
+                headers=headers,
+                concurrency=options["concurrency"],
+                total=options["warmup"],
+            )
+        return run_load(
+            base_url,
+            options["paths"],
+            headers=headers,
+            concurrency=options["concurrency"],
+            total=options["requests"],
+        )
+
+    @contextmanager
+    def serve(self, profile: str, options: dict) -> Iterator[None]:
+        """Runs gunicorn with a worker profile until the block exits"""
+        env = {
+            **os.environ,
+            "GUNICORN_PROFILE": profile,
+            "CONCURRENCY": str(options["workers"]),
+            "THREADS": str(options["threads"]),
+        }
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                "from gunicorn.app.wsgiapp import run; run()",
+                "--config=gunicorn_config.py",
+                f"--bind=127.0.0.1:{options['port']}",
+                PROFILE_APPS[profile],
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            self.wait_until_ready(
+                f"http://127.0.0.1:{options['port']}/healthz",
+                process,
+                options["startup_timeout"],
+            )
+            yield
+        finally:
+            process.terminate()
+            process.wait()
+
+    def wait_until_ready(self, url: str, process, timeout: float):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f"gunicorn exited with code {process.returncode}")
+            try:
+                if requests.get(url, timeout=1).ok:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise CommandError(f"{url} did not answer in {timeout} seconds")
@@ -0,0 +1,148 @@
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Imports of each process type until it is ready to serve, written to stderr
+# after ENTRY_MARKER so the interpreter startup is left out
+ENTRY_MARKER = "-- entry point --"
+ENTRY_POINTS = {
+    # gunicorn preloads the WSGI application, the URLconf is loaded by the
+    # first request
+    "web": (
+        "import backend_test.wsgi\n"
+        "from django.urls import get_resolver\n"
+        "get_resolver().url_patterns\n"
+    ),
+    # celery worker and beat set up Django and import the task modules
+    "worker": (
+        "import django\n"
+        "django.setup()\n"
+        "import celery.apps.worker\n"
+        "from backend_test.celery import app\n"
+        "app.loader.import_default_modules()\n"
+    ),
+    "beat": (
+        "import django\n"
+        "django.setup()\n"
+        "import celery.apps.beat\n"
+        "from backend_test.celery import app\n"
+        "app.loader.import_default_modules()\n"
+    ),
+}
+
+
+class ImportNode(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    children: List["ImportNode"]
+
+
+def parse_importtime(output: str) -> List[ImportNode]:
+    """Import trees of the ``-X importtime`` lines after ENTRY_MARKER.
+
+    Modules are reported once their imports are done, children first, and
+    indented two spaces per level.
+    """
+    lines = output.split(f"{ENTRY_MARKER}\n", 1)[-1].splitlines()
+    pending: Dict[int, List[ImportNode]] = {}
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            # Header line
+            continue
+        depth = len(name) - len(name.lstrip(" "))
+        node = ImportNode(
+            name.strip(),
+            int(self_us),
+            int(cumulative_us),
+            pending.pop(depth + 2, []),
+        )
+        pending.setdefault(depth, []).append(node)
+    return pending[min(pending)] if pending else []
+
+
+def measure_imports(entry_point: str) -> List[ImportNode]:
+    """Import trees of an entry point of ENTRY_POINTS, in a new interpreter
+    inheriting the DJANGO_SETTINGS_MODULE of this one"""
+    code = f"import sys\nsys.stderr.write({ENTRY_MARKER + chr(10)!r})\n"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code + ENTRY_POINTS[entry_point]],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if result.returncode:
+        raise CommandError(f"{entry_point} failed to import:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def total_ms(roots: List[ImportNode]) -> float:
+    return sum(root.cumulative_us for root in roots) / 1000
+
+
+class Command(BaseCommand):
+    """Django command to report the per module import times of the web,
+    worker and beat processes, in the best of a few runs.
+
+    Modules below --min-ms are left out of the tree. With --check the
+    command fails when an entry point is over its IMPORT_TIME_BUDGETS_MS.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "entry_points",
+            nargs="*",
+            default=list(ENTRY_POINTS),
+            help="Entry points to profile",
+        )
+        parser.add_argument("--runs", type=int, default=3)
+        parser.add_argument("--min-ms", type=float, default=5.0)
+        parser.add_argument("--depth", type=int, default=6)
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Fail when an entry point is over its import time budget",
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options["entry_points"]) - set(ENTRY_POINTS)
+        if unknown:
+            raise CommandError(f"Unknown entry points: {', '.join(sorted(unknown))}")
+
+        over_budget = []
+        for entry_point in options["entry_points"]:
+            roots = min(
+                (measure_imports(entry_point) for _ in range(options["runs"])),
+                key=total_ms,
+            )
+            total = total_ms(roots)
+            budget = settings.IMPORT_TIME_BUDGETS_MS.get(entry_point)
+            self.stdout.write(
+                self.style.MIGRATE_HEADING(
+                    f"{entry_point}: {total:.1f}ms"
+                    + (f" (budget {budget}ms)" if budget else "")
+                )
+            )
+            for root in sorted(roots, key=lambda node: -node.cumulative_us):
+                self.write_tree(root, 1, options)
+            if budget and total > budget:
+                over_budget.append(f"{entry_point} {total:.1f}ms > {budget}ms")
+
+        if options["check"] and over_budget:
+            raise CommandError(f"Over the import time budget: {', '.join(over_budget)}")
+
+    def write_tree(self, node: ImportNode, depth: int, options: dict):
+        if node.cumulative_us / 1000 < options["min_ms"] or depth > options["depth"]:
+            return
+        self.stdout.write(
+            f"{'  ' * depth}{node.module} {node.cumulative_us / 1000:.1f}ms "
+            f"(self {node.self_us / 1000:.1f}ms)"
+        )
+        for child in sorted(node.children, key=lambda child: -child.cumulative_us):
+            self.write_tree(child, depth + 1, options)
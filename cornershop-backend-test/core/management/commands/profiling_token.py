@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from backend_test.utils.profiling import make_profiling_token
+
+
+class Command(BaseCommand):
+    """Django command to print an X-Profile header profiling the requests
+    that send it, when PROFILING_ENABLED is set"""
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"X-Profile: {make_profiling_token()}")
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from menu_selection import tallies
+
+
+class Command(BaseCommand):
+    """Django command to rebuild the menu selection tallies from the live
+    selections, or to check that they match"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--day",
+            help="Only the tallies of the menus of this day (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Compare the tallies with the selections without writing",
+        )
+
+    def handle(self, *args, **options):
+        day = None
+        if options["day"]:
+            try:
+                day = parse_date(options["day"])
+            except ValueError:
+                pass
+            if day is None:
+                raise CommandError(f"Invalid day: {options['day']}")
+
+        if not options["check"]:
+            written = tallies.rebuild_tallies(day)
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} tallies"))
+            return
+
+        expected = tallies.count_selections(day)
+        stored = tallies.stored_tallies(day)
+        drifted = sorted(
+            menu_id
+            for menu_id in expected.keys() | stored.keys()
+            if expected.get(menu_id) != stored.get(menu_id)
+        )
+        for menu_id in drifted:
+            self.stdout.write(
+                f"Menu {menu_id}: expected {expected.get(menu_id)}, "
+                f"stored {stored.get(menu_id)}"
+            )
+        if drifted:
+            raise CommandError(f"{len(drifted)} tallies do not match")
+        self.stdout.write(self.style.SUCCESS(f"{len(expected)} tallies match"))
@@ -1,20 +1,111 @@
+import logging
+import threading
 import time
+from typing import Callable, Optional
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import connections
-from django.db.utils import OperationalError
 
+from backend_test.utils.healthz import PROBES
+
+logger = logging.getLogger("backend_test.startup")
+
+# Seconds between the attempts of a probe, doubling up to MAX_DELAY
+INITIAL_DELAY = 0.1
+MAX_DELAY = 5.0
 
-class Command(BaseCommand):
-    """Django command to pause excecution until database is available"""
 
-    def handle(self, *args, **kwargs):
-        self.stdout.write("Waiting for database...")
-        db_connection = None
-        while not db_connection:
+class Probe(threading.Thread):
+    """Retries a dependency probe with exponential backoff until it succeeds
+    or the deadline passes"""
+
+    def __init__(self, name: str, probe: Callable[[float], None], deadline: float):
+        super().__init__(name=f"wait-for-{name}", daemon=True)
+        self.dependency = name
+        self.probe = probe
+        self.deadline = deadline
+        self.attempts = 0
+        self.elapsed: Optional[float] = None
+        self.error: Optional[Exception] = None
+
+    def run(self):
+        start = time.monotonic()
+        delay = INITIAL_DELAY
+        while True:
+            self.attempts += 1
             try:
-                db_connection = connections["default"]
-            except OperationalError:
-                self.stdout.write("Database unavailable, waiting 1 second")
-                time.sleep(1)
-        self.stdout.write(self.style.SUCCESS("Database available!"))
+                self.probe(max(self.deadline - time.monotonic(), 0.1))
+            except Exception as e:
+                self.error = e
+            else:
+                self.elapsed = time.monotonic() - start
+                return
+            finally:
+                # Connections belong to the probing thread, do not leak them
+                connections.close_all()
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, MAX_DELAY)
+
+    @property
+    def ready(self) -> bool:
+        return self.elapsed is not None
+
+
+class Command(BaseCommand):
+    """Django command to pause excecution until the database, the cache and
+    the Celery broker are available"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=60,
+            help="Seconds to wait for every dependency before failing",
+        )
+        parser.add_argument(
+            "--skip",
+            action="append",
+            choices=list(PROBES),
+            default=[],
+            help="Dependency not to wait for, can be repeated",
+        )
+
+    def handle(self, *args, **options):
+        names = [name for name in PROBES if name not in options["skip"]]
+        self.stdout.write(f"Waiting for {', '.join(names)}...")
+        deadline = time.monotonic() + options["timeout"]
+        probes = [Probe(name, PROBES[name], deadline) for name in names]
+        for probe in probes:
+            probe.start()
+        for probe in probes:
+            # A probe stuck in a connect past the deadline is abandoned
+            probe.join(max(deadline - time.monotonic(), 0) + 1)
+
+        timings = {}
+        for probe in probes:
+            if probe.ready:
+                timings[f"{probe.dependency}_s"] = round(probe.elapsed, 3)
+                self.stdout.write(
+                    f"{probe.dependency} ready in {probe.elapsed:.2f}s "
+                    f"({probe.attempts} attempts)"
+                )
+            else:
+                self.stderr.write(
+                    f"{probe.dependency} unavailable after {probe.attempts} "
+                    f"attempts: {probe.error!r}"
+                )
+        unavailable = [probe.dependency for probe in probes if not probe.ready]
+        logger.info(
+            "Dependencies %s",
+            "unavailable" if unavailable else "ready",
+            extra={"data": {**timings, "unavailable": unavailable}},
+        )
+        if unavailable:
+            raise CommandError(
+                f"Timed out after {options['timeout']}s waiting for "
+                f"{', '.join(unavailable)}"
+            )
+        self.stdout.write(self.style.SUCCESS("Dependencies available!"))
@@ -0,0 +1,25 @@
+# Generated by Django 3.0.8 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_auto_20210710_0235'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='menu',
+            index=models.Index(fields=['preparation_date', 'meal_time'], name='core_menu_prep_meal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuselection',
+            index=models.Index(fields=['user', 'selected_at'], name='core_selection_user_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuselection',
+            index=models.Index(fields=['menu', 'selected_at'], name='core_selection_menu_at_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.0.8 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_menu_selection_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='menuselection',
+            index=models.Index(fields=['selected_at', 'id'], name='core_selection_at_id_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.0.8 on 2026-10-18 15:04
+
+from django.db import migrations, models
+
+
+def check_duplicate_selections(apps, schema_editor):
+    """Selections repeated for a user and menu are orders of the employees,
+    they must be resolved by hand before adding the constraint"""
+    MenuSelection = apps.get_model('core', 'MenuSelection')
+    duplicates = list(
+        MenuSelection.objects.values('user', 'menu')
+        .annotate(selections=models.Count('id'))
+        .filter(selections__gt=1)
+        .order_by('user', 'menu')
+    )
+    if duplicates:
+        raise RuntimeError(
+            f"{len(duplicates)} users selected a menu more than once, remove "
+            f"the repeated selections before migrating: {duplicates[:20]}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_menuselection_selected_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_selections, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='menuselection',
+            constraint=models.UniqueConstraint(fields=('user', 'menu'), name='core_selection_user_menu_uniq'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.0.8 on 2026-10-18 15:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_menuselection_user_menu_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuDigest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('kind', models.CharField(choices=[('channel', 'Canal'), ('direct', 'Mensaje directo')], default='channel', max_length=16)),
+                ('channel', models.CharField(max_length=255)),
+                ('channel_id', models.CharField(max_length=64)),
+                ('ts', models.CharField(max_length=64)),
+                ('checksum', models.CharField(max_length=32)),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='menudigest',
+            constraint=models.UniqueConstraint(fields=('day', 'kind', 'channel'), name='core_digest_day_kind_channel_uniq'),
+        ),
+    ]
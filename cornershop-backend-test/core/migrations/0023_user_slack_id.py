@@ -0,0 +1,18 @@
+# Generated by Django 3.0.8 on 2026-10-18 15:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_menudigest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='slack_id',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
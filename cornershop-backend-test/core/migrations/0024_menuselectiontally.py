@@ -0,0 +1,27 @@
+# Generated by Django 3.0.8 on 2026-10-18 15:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_user_slack_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuSelectionTally',
+            fields=[
+                ('menu', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='tally', serialize=False, to='core.Menu')),
+                ('day', models.DateField()),
+                ('meal_time', models.PositiveSmallIntegerField(choices=[(1, 'Desayuno'), (2, 'Comida'), (3, 'Cena'), (4, 'After')])),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='menuselectiontally',
+            index=models.Index(fields=['day', 'meal_time', 'menu'], name='core_tally_day_meal_idx'),
+        ),
+    ]
@@ -35,6 +35,8 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     username = models.CharField(max_length=255, unique=True)
     name = models.CharField(max_length=255)
+    # Slack member id, the user gets the daily menu as a direct message
+    slack_id = models.CharField(max_length=64, blank=True)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
 
@@ -50,6 +52,12 @@ class CapitalField(models.CharField):
     def get_prep_value(self, value):
         return str(value).capitalize()
 
+    def pre_save(self, model_instance, add):
+        """Capitalizes the instance value too, so it matches the saved one"""
+        value = self.get_prep_value(super().pre_save(model_instance, add))
+        setattr(model_instance, self.attname, value)
+        return value
+
 
 class Menu(models.Model):
     """Menu item for a certain day"""
@@ -86,6 +94,14 @@ class Menu(models.Model):
         models.CASCADE,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["preparation_date", "meal_time"],
+                name="core_menu_prep_meal_idx",
+            ),
+        ]
+
     @staticmethod
     def get_human_readable_value(index, attr) -> str:
         """Get string representation of the index value from model choices
@@ -136,3 +152,77 @@ class MenuSelection(models.Model):
         models.CASCADE,
     )
     customizations = models.TextField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "selected_at"],
+                name="core_selection_user_at_idx",
+            ),
+            models.Index(
+                fields=["menu", "selected_at"],
+                name="core_selection_menu_at_idx",
+            ),
+            models.Index(
+                fields=["selected_at", "id"],
+                name="core_selection_at_id_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "menu"],
+                name="core_selection_user_menu_uniq",
+            ),
+        ]
+
+
+class MenuSelectionTally(models.Model):
+    """Number of selections of a menu, kept current by menu_selection.tallies"""
+
+    menu = models.OneToOneField(
+        Menu,
+        models.CASCADE,
+        primary_key=True,
+        related_name="tally",
+    )
+    day = models.DateField()
+    meal_time = models.PositiveSmallIntegerField(choices=Menu.MEAL_TIMES)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["day", "meal_time", "menu"],
+                name="core_tally_day_meal_idx",
+            ),
+        ]
+
+
+class MenuDigest(models.Model):
+    """Ledger of the daily menu messages delivered to a Slack channel, or to
+    an employee as a direct message"""
+
+    CHANNEL = "channel"
+    DIRECT_MESSAGE = "direct"
+    KINDS = (
+        (CHANNEL, _("Canal")),
+        (DIRECT_MESSAGE, _("Mensaje directo")),
+    )
+
+    day = models.DateField()
+    kind = models.CharField(max_length=16, choices=KINDS, default=CHANNEL)
+    # Channel name, or Slack member id of a direct message
+    channel = models.CharField(max_length=255)
+    channel_id = models.CharField(max_length=64)
+    ts = models.CharField(max_length=64)
+    checksum = models.CharField(max_length=32)
+    sent_at = models.DateTimeField(auto_now_add=True)
+    modified_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "kind", "channel"],
+                name="core_digest_day_kind_channel_uniq",
+            ),
+        ]
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.utils.authentication import forget_token
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Stop authenticating with a deleted token"""
+    forget_token(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def forget_user_tokens(sender, instance, created, **kwargs):
+    """Refresh the token snapshots of a saved user, e.g. deactivated"""
+    if created:
+        return
+    for key in Token.objects.filter(user_id=instance.pk).values_list("key", flat=True):
+        forget_token(key)
@@ -0,0 +1,93 @@
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubSlackHandler(BaseHTTPRequestHandler):
+    """Answers Slack Web API calls with the responses queued on the server"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        url = urlparse(self.path)
+        method = url.path.rsplit("/", 1)[-1]
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        self.server.calls.append(
+            {
+                "method": method,
+                "http_method": self.command,
+                "params": parse_qs(url.query),
+                "json": json.loads(body) if body else None,
+                "headers": dict(self.headers),
+                "client_port": self.client_address[1],
+            }
+        )
+
+        status, payload, headers, delay = self.server.next_response(method)
+        if delay:
+            time.sleep(delay)
+        content = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+class StubSlackServer(ThreadingHTTPServer):
+    """Local Slack Web API stand-in for tests.
+
+    Responses are queued per API method with ``add_response``; when the queue
+    of a method is empty it answers ``{"ok": true}``. Every call is recorded
+    in ``calls``.
+
+    Usage:
+        with StubSlackServer() as server:
+            server.add_response("chat.postMessage", {"ok": True})
+            client = SlackRESTClient("token", base_url=server.base_url)
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubSlackHandler)
+        self.calls = []
+        self.responses = defaultdict(deque)
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address
+        return f"http://{host}:{port}/api/"
+
+    def add_response(self, method, payload, status=200, headers=None, delay=0):
+        self.responses[method].append((status, payload, headers or {}, delay))
+
+    def next_response(self, method):
+        if self.responses[method]:
+            return self.responses[method].popleft()
+        return 200, {"ok": True}, {}, 0
+
+    def calls_to(self, method):
+        return [call for call in self.calls if call["method"] == method]
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
@@ -0,0 +1,119 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.utils.authentication import CachedTokenAuthentication, token_cache
+from menu.cache import menu_cache
+
+MENU_URL = reverse("menu:menu-list")
+BENCHMARK_REQUESTS = 100
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test the token authentication backed by user snapshots"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            "authuser", "test123", name="Auth user"
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.authentication = CachedTokenAuthentication()
+
+    def test_warm_cache_runs_no_queries(self):
+        """Test that only the first authentication queries the database"""
+        with self.assertNumQueries(1):
+            user, token = self.authentication.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            user, token = self.authentication.authenticate_credentials(self.token.key)
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.username, "authuser")
+        self.assertTrue(user.is_authenticated)
+        self.assertEqual(token.key, self.token.key)
+
+    def test_other_fields_are_deferred(self):
+        """Test that fields out of the snapshot are loaded on access"""
+        self.authentication.authenticate_credentials(self.token.key)
+        user, _ = self.authentication.authenticate_credentials(self.token.key)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(user.name, "Auth user")
+
+    def test_invalid_token(self):
+        """Test that unknown tokens are rejected and not cached"""
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate_credentials("unknown")
+        with self.assertNumQueries(1), self.assertRaises(
+            exceptions.AuthenticationFailed
+        ):
+            self.authentication.authenticate_credentials("unknown")
+
+    def test_deleted_token_is_forgotten(self):
+        """Test that a deleted token stops authenticating"""
+        key = self.token.key
+        self.authentication.authenticate_credentials(key)
+        self.token.delete()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate_credentials(key)
+
+    def test_saved_user_is_refreshed(self):
+        """Test that a deactivated user stops authenticating"""
+        self.authentication.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+    def test_snapshot_user_can_be_saved(self):
+        """Test that saving a snapshot user keeps its deferred fields"""
+        user, _ = self.authentication.authenticate_credentials(self.token.key)
+        user.username = "renamed"
+        user.save()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.username, "renamed")
+        self.assertEqual(self.user.name, "Auth user")
+        self.assertTrue(self.user.check_password("test123"))
+
+
+class CachedTokenAuthenticationBenchmarkTests(TestCase):
+    """Benchmark token authenticated requests on a warm cache"""
+
+    def setUp(self):
+        token_cache.clear()
+        menu_cache.clear()
+        user = get_user_model().objects.create_user("benchuser", "test123")
+        token = Token.objects.create(user=user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def test_warm_requests_run_no_queries(self):
+        """Test that cached listings with a cached token run no queries"""
+        self.client.get(MENU_URL)
+
+        with CaptureQueriesContext(connection) as context:
+            for _ in range(BENCHMARK_REQUESTS):
+                res = self.client.get(MENU_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_uncached_authentication_queries_every_request(self):
+        """Baseline: DRF token authentication queries on every request"""
+        authentication = TokenAuthentication()
+        key = Token.objects.get().key
+
+        with CaptureQueriesContext(connection) as context:
+            for _ in range(BENCHMARK_REQUESTS):
+                authentication.authenticate_credentials(key)
+
+        self.assertEqual(len(context.captured_queries), BENCHMARK_REQUESTS)
@@ -1,22 +1,220 @@
-from unittest.mock import patch
+from io import StringIO
+from unittest.mock import Mock, patch
 
-from django.core.management import call_command
+import pytest
+from django.conf import settings
+from django.core.management import CommandError, call_command
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.management.commands import profile_imports, wait_for_db
+from core.management.commands.benchmark_workers import LoadResult, percentile, run_load
 
 
 class CommandTests(TestCase):
+    def setUp(self):
+        # No broker in tests, the database and cache probes are real
+        probes = patch.dict(wait_for_db.PROBES, broker=Mock())
+        probes.start()
+        self.addCleanup(probes.stop)
+
     def test_wait_for_db_ready(self):
         """Test waiting for db when db is available"""
-        with patch("django.db.utils.ConnectionHandler.__getitem__") as gi:
-            gi.return_value = True
-            call_command("wait_for_db")
-            self.assertEqual(gi.call_count, 1)
+        out = StringIO()
+        with self.assertLogs("backend_test.startup") as logs:
+            call_command("wait_for_db", stdout=out)
+
+        self.assertIn("database ready", out.getvalue())
+        self.assertIn("cache ready", out.getvalue())
+        self.assertIn("Dependencies available!", out.getvalue())
+        self.assertEqual(wait_for_db.PROBES["broker"].call_count, 1)
+        data = logs.records[0].data
+        self.assertEqual(
+            set(data), {"database_s", "cache_s", "broker_s", "unavailable"}
+        )
+        self.assertEqual(data["unavailable"], [])
 
     @patch("time.sleep", return_value=True)
     def test_wait_for_db(self, ts):
         """Test waiting for db"""
-        with patch("django.db.utils.ConnectionHandler.__getitem__") as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command("wait_for_db")
-            self.assertEqual(gi.call_count, 6)
+        with patch.dict(wait_for_db.PROBES, database=Mock()) as probes:
+            probes["database"].side_effect = [OperationalError] * 5 + [None]
+            call_command("wait_for_db", stdout=StringIO())
+            self.assertEqual(probes["database"].call_count, 6)
+        self.assertEqual(
+            [call.args[0] for call in ts.call_args_list], [0.1, 0.2, 0.4, 0.8, 1.6]
+        )
+
+    def test_wait_for_db_timeout(self):
+        """Test that the command fails when a dependency stays unavailable"""
+        wait_for_db.PROBES["broker"].side_effect = ConnectionRefusedError
+        err = StringIO()
+
+        with self.assertRaisesMessage(CommandError, "waiting for broker"):
+            call_command("wait_for_db", timeout=0.2, stdout=StringIO(), stderr=err)
+
+        self.assertIn("broker unavailable after", err.getvalue())
+        self.assertGreater(wait_for_db.PROBES["broker"].call_count, 1)
+
+    def test_wait_for_db_skip(self):
+        """Test that skipped dependencies are not probed"""
+        call_command("wait_for_db", skip=["broker"], stdout=StringIO())
+
+        wait_for_db.PROBES["broker"].assert_not_called()
+
+
+class BenchmarkWorkersCommandTests(TestCase):
+    """Test the command comparing the gunicorn worker profiles"""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertEqual(percentile([], 95), 0)
+
+    @patch("requests.Session.get")
+    def test_run_load(self, get):
+        """Test that every request is sent and failures are counted"""
+        get.side_effect = [Mock(status_code=200)] * 9 + [Mock(status_code=500)]
+
+        result = run_load(
+            "http://server",
+            ["/a/", "/b/"],
+            headers={"Authorization": "Token abc"},
+            concurrency=3,
+            total=10,
+        )
+
+        self.assertEqual(get.call_count, 10)
+        self.assertEqual((result.requests, result.errors), (10, 1))
+        self.assertEqual(len(result.latencies), 9)
+        self.assertEqual(result.latencies, sorted(result.latencies))
+        urls = sorted(call.args[0] for call in get.call_args_list)
+        self.assertEqual(urls, ["http://server/a/"] * 5 + ["http://server/b/"] * 5)
+
+    @patch("core.management.commands.benchmark_workers.run_load")
+    def test_benchmark_running_server(self, run_load):
+        """Test that a running server is benchmarked and reported"""
+        run_load.return_value = LoadResult(100, 0, 2.0, [0.01] * 100)
+        out = StringIO()
+
+        call_command(
+            "benchmark_workers", "--url", "http://server/", "--warmup", "0", stdout=out
+        )
+
+        run_load.assert_called_once()
+        self.assertEqual(run_load.call_args.args[0], "http://server")
+        self.assertIn("Token ", run_load.call_args.kwargs["headers"]["Authorization"])
+        self.assertRegex(out.getvalue(), r"server\s+50\.0\s+0\s+10\.0\s+10\.0\s+10\.0")
+
+    def test_unknown_profile(self):
+        """Test that unknown worker profiles are rejected"""
+        with self.assertRaises(CommandError):
+            call_command("benchmark_workers", "--profiles", "gevent")
+
+
+IMPORTTIME_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 | site
+-- entry point --
+import time: self [us] | cumulative | imported package
+import time:       200 |        200 |     c
+import time:       300 |        500 |   b
+import time:       400 |        400 |   d
+import time:      1000 |       1900 | a
+import time:        50 |         50 | e
+"""
+
+# Factor over IMPORT_TIME_BUDGETS_MS allowed to a single measurement
+IMPORT_TIME_HEADROOM = 1.5
+
+
+class ProfileImportsCommandTests(SimpleTestCase):
+    """Test the import time report and budgets of the entry points"""
+
+    measured = {}
+
+    @classmethod
+    def measure(cls, entry_point):
+        """Import tree of an entry point, measured once for every test"""
+        if entry_point not in cls.measured:
+            cls.measured[entry_point] = profile_imports.measure_imports(entry_point)
+        return cls.measured[entry_point]
+
+    def modules(self, nodes):
+        for node in nodes:
+            yield node.module
+            yield from self.modules(node.children)
+
+    def test_parse_importtime(self):
+        """Test that the import tree is rebuilt after the entry point"""
+        roots = profile_imports.parse_importtime(IMPORTTIME_OUTPUT)
+
+        self.assertEqual([root.module for root in roots], ["a", "e"])
+        self.assertEqual(profile_imports.total_ms(roots), 1.95)
+        a = roots[0]
+        self.assertEqual([child.module for child in a.children], ["b", "d"])
+        self.assertEqual(a.children[0].children[0], ("c", 200, 200, []))
+
+    def test_import_time_within_headroom(self):
+        """Test that every entry point imports within its budget plus some
+        headroom for a single run on a busy machine"""
+        for entry_point, budget in settings.IMPORT_TIME_BUDGETS_MS.items():
+            with self.subTest(entry_point):
+                total = profile_imports.total_ms(self.measure(entry_point))
+                self.assertLess(
+                    total,
+                    budget * IMPORT_TIME_HEADROOM,
+                    f"{entry_point} imports: {total:.1f}ms, budget {budget}ms",
+                )
+
+    @pytest.mark.slow
+    def test_import_time_budgets(self):
+        """Test that every entry point imports within its budget, in the best
+        of three runs"""
+        for entry_point, budget in settings.IMPORT_TIME_BUDGETS_MS.items():
+            with self.subTest(entry_point):
+                total = min(
+                    profile_imports.total_ms(
+                        profile_imports.measure_imports(entry_point)
+                    )
+                    for _ in range(3)
+                )
+                self.assertLess(total, budget, f"{entry_point} imports: {total:.1f}ms")
+
+    def test_lazy_imports(self):
+        """Test that web processes load neither Celery nor the Slack client,
+        which workers only load when a task uses it"""
+        web = set(self.modules(self.measure("web")))
+        worker = set(self.modules(self.measure("worker")))
+
+        self.assertFalse({"celery", "backend_test.celery", "menu.tasks.fan_out"} & web)
+        self.assertNotIn("core.utils.slack_client", web)
+        self.assertIn("menu.tasks.fan_out", worker)
+        self.assertNotIn("core.utils.slack_client", worker)
+
+    @override_settings(IMPORT_TIME_BUDGETS_MS={"web": 1})
+    @patch("core.management.commands.profile_imports.measure_imports")
+    def test_check(self, measure_imports):
+        """Test that the tree is reported and budgets enforced with --check"""
+        measure_imports.return_value = profile_imports.parse_importtime(
+            IMPORTTIME_OUTPUT
+        )
+        out = StringIO()
+
+        call_command("profile_imports", "web", "--min-ms", "0.3", stdout=out)
+        with self.assertRaisesMessage(CommandError, "web 1.9ms > 1ms"):
+            call_command("profile_imports", "web", "--check", stdout=StringIO())
+
+        self.assertEqual(
+            out.getvalue().splitlines(),
+            [
+                "web: 1.9ms (budget 1ms)",
+                "  a 1.9ms (self 1.0ms)",
+                "    b 0.5ms (self 0.3ms)",
+                "    d 0.4ms (self 0.4ms)",
+            ],
+        )
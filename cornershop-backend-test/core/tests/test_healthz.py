@@ -0,0 +1,136 @@
+import threading
+from unittest.mock import MagicMock, Mock, patch
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from backend_test.utils import healthz
+
+HEALTHZ_URL = reverse("healthz")
+READYZ_URL = reverse("readyz")
+
+
+class LivenessTests(SimpleTestCase):
+    """Test the liveness endpoint"""
+
+    def test_healthz(self):
+        """Test that the process answers without running the middleware"""
+        with patch(
+            "django.contrib.sessions.middleware.SessionMiddleware.process_request"
+        ) as process_request:
+            res = self.client.get(HEALTHZ_URL)
+
+        self.assertEqual(res.status_code, 200)
+        process_request.assert_not_called()
+        self.assertFalse(res.cookies)
+        self.assertFalse(res.has_header("Cache-Control"))
+
+    def test_healthz_head(self):
+        """Test that probes may use HEAD but not unsafe methods"""
+        self.assertEqual(self.client.head(HEALTHZ_URL).status_code, 200)
+        self.assertEqual(self.client.post(HEALTHZ_URL).status_code, 405)
+
+
+class ReadinessTests(TestCase):
+    """Test the readiness endpoint and its cached checks"""
+
+    def setUp(self):
+        # No broker in tests, the database and cache probes are real
+        probes = patch.dict(healthz.PROBES, broker=Mock())
+        probes.start()
+        self.addCleanup(probes.stop)
+        healthz.get_readiness_checks.cache_clear()
+        self.addCleanup(healthz.get_readiness_checks.cache_clear)
+
+    def test_ready(self):
+        """Test that every dependency is checked"""
+        res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 200)
+        data = res.json()
+        self.assertTrue(data["ready"])
+        self.assertEqual(set(data["checks"]), {"database", "cache", "broker"})
+        self.assertTrue(all(check["ok"] for check in data["checks"].values()))
+        self.assertFalse(res.cookies)
+
+    def test_not_ready(self):
+        """Test that an unavailable dependency fails the probe"""
+        healthz.PROBES["broker"].side_effect = ConnectionRefusedError
+
+        with self.assertLogs("backend_test.healthz", "WARNING") as logs:
+            res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 503)
+        data = res.json()
+        self.assertFalse(data["ready"])
+        self.assertTrue(data["checks"]["database"]["ok"])
+        self.assertEqual(set(data["checks"]["broker"]), {"ok", "duration_ms"})
+        self.assertFalse(data["checks"]["broker"]["ok"])
+        self.assertEqual(
+            logs.records[0].data,
+            {"check": "broker", "error": "ConnectionRefusedError()"},
+        )
+
+    def test_database_probe_timeout(self):
+        """Test that PostgreSQL is probed with the timeout of the checks"""
+        connection = MagicMock(vendor="postgresql")
+        connection.get_connection_params.return_value = {
+            "host": "postgres",
+            "options": "-c search_path=app",
+        }
+
+        with patch.object(healthz, "connections", {"default": connection}):
+            healthz.probe_database(1.5)
+
+        connection.get_new_connection.assert_called_once_with(
+            {
+                "host": "postgres",
+                "connect_timeout": 2,
+                "options": "-c search_path=app -c statement_timeout=1500",
+            }
+        )
+        connection.get_new_connection.return_value.close.assert_called_once_with()
+
+    def test_checks_are_cached(self):
+        """Test that frequent probes run the checks once per interval"""
+        with self.assertNumQueries(1):
+            for _ in range(20):
+                self.assertEqual(self.client.get(READYZ_URL).status_code, 200)
+
+        self.assertEqual(healthz.PROBES["broker"].call_count, 1)
+
+    @override_settings(READINESS_CHECK_INTERVAL=0)
+    def test_expired_checks(self):
+        """Test that the checks run again once the interval has passed"""
+        for _ in range(3):
+            self.client.get(READYZ_URL)
+
+        self.assertEqual(healthz.PROBES["broker"].call_count, 3)
+
+    @override_settings(READINESS_CHECKS=["broker"])
+    def test_configured_checks(self):
+        """Test that only the configured dependencies are checked"""
+        res = self.client.get(READYZ_URL)
+
+        self.assertEqual(set(res.json()["checks"]), {"broker"})
+
+    def test_stale_result_while_refreshing(self):
+        """Test that requests do not wait for the refresh of another one"""
+        checks = healthz.ReadinessChecks(("broker",), interval=0, timeout=1)
+        stale = checks.result()
+        refreshing = threading.Event()
+        release = threading.Event()
+
+        def slow_probe(timeout):
+            refreshing.set()
+            release.wait(5)
+
+        healthz.PROBES["broker"].side_effect = slow_probe
+        thread = threading.Thread(target=checks.result)
+        thread.start()
+        self.assertTrue(refreshing.wait(5))
+
+        self.assertIs(checks.result(), stale)
+        release.set()
+        thread.join()
+        self.assertIsNot(checks.result(), stale)
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+from unittest import skipUnless
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+import pytz
+
+from core.models import Menu, MenuSelection
+from core.utils.pagination import keyset_after
+from menu_selection.export import CHUNK_SIZE, EXPORT_KEYS
+
+SEED_MENUS = 1_000_000
+SEED_USERS = 1_000
+SEED_SELECTIONS = 200_000
+SEED_START = datetime(2020, 1, 1, tzinfo=pytz.UTC)
+SEED_DAYS = 1_500
+
+
+@pytest.mark.slow
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN plans are Postgres specific")
+class IndexUsageTests(TestCase):
+    """Test that the planner uses the composite indexes on a seeded table"""
+
+    @classmethod
+    def setUpTestData(cls):
+        staff_user = get_user_model().objects.create_superuser("indexstaff", "test123")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO core_menu (
+                    created_at, modified_at, preparation_date, main_dish,
+                    side_dish, dessert, meal_time, weekday, added_by_user_id
+                )
+                SELECT
+                    now(), now(),
+                    %s + (i %% %s) * interval '1 day' + (i %% 24) * interval '1 hour',
+                    'Main', 'Side', 'Dessert', i %% 4 + 1, 1, %s
+                FROM generate_series(1, %s) AS i
+                """,
+                [SEED_START, SEED_DAYS, staff_user.id, SEED_MENUS],
+            )
+            cursor.execute(
+                """
+                INSERT INTO core_user (
+                    password, username, name, is_active, is_staff, is_superuser
+                )
+                SELECT '', 'indexuser' || i, '', true, false, false
+                FROM generate_series(1, %s) AS i
+                """,
+                [SEED_USERS],
+            )
+            cursor.execute(
+                """
+                INSERT INTO core_menuselection (
+                    selected_at, modified_at, customizations, user_id, menu_id
+                )
+                SELECT
+                    %s + (i %% %s) * interval '1 day', now(), '',
+                    (SELECT min(id) FROM core_user) + i %% %s,
+                    (SELECT min(id) FROM core_menu) + i %% %s
+                FROM generate_series(1, %s) AS i
+                """,
+                [SEED_START, SEED_DAYS, SEED_USERS, SEED_MENUS, SEED_SELECTIONS],
+            )
+            cursor.execute("ANALYZE core_menu, core_user, core_menuselection")
+        cls.user = get_user_model().objects.get(username="indexuser1")
+        cls.menu = Menu.objects.order_by("id").first()
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, msg=plan)
+
+    def test_menu_day_range_uses_index(self):
+        """Test that the day range scan of the menu listing uses the index"""
+        gte = SEED_START + timedelta(days=100)
+        lte = gte.replace(hour=23, minute=59, second=59)
+        queryset = Menu.objects.filter(
+            preparation_date__gte=gte,
+            preparation_date__lte=lte,
+        ).order_by("weekday")
+
+        self.assertUsesIndex(queryset, "core_menu_prep_meal_idx")
+
+    def test_menu_day_range_and_meal_time_uses_index(self):
+        """Test that filtering a day by meal time uses both index columns"""
+        gte = SEED_START + timedelta(days=100)
+        lte = gte.replace(hour=23, minute=59, second=59)
+        queryset = Menu.objects.filter(
+            preparation_date__gte=gte,
+            preparation_date__lte=lte,
+            meal_time=2,
+        )
+
+        self.assertUsesIndex(queryset, "core_menu_prep_meal_idx")
+
+    def test_selections_of_user_use_index(self):
+        """Test that the selections of a user ordered by date use the index"""
+        queryset = MenuSelection.objects.filter(user=self.user).order_by(
+            "-selected_at"
+        )[:20]
+
+        self.assertUsesIndex(queryset, "core_selection_user_at_idx")
+
+    def test_selections_of_menu_use_index(self):
+        """Test that the selections of a menu ordered by date use the index"""
+        queryset = MenuSelection.objects.filter(menu=self.menu).order_by("selected_at")
+
+        self.assertUsesIndex(queryset, "core_selection_menu_at_idx")
+
+    def test_export_batch_uses_index(self):
+        """Test that a keyset batch of the export starts an index range scan"""
+        last = (SEED_START + timedelta(days=SEED_DAYS // 2), 0)
+        queryset = keyset_after(
+            MenuSelection.objects.order_by(*EXPORT_KEYS), EXPORT_KEYS, last
+        )[:CHUNK_SIZE]
+
+        self.assertUsesIndex(queryset, "core_selection_at_id_idx")
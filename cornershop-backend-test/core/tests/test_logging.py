@@ -0,0 +1,264 @@
+import datetime
+import decimal
+import json
+import logging
+import socketserver
+import threading
+import time
+import uuid
+
+import pytest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+
+import msgpack
+from fluent.handler import FluentHandler
+
+from backend_test.logging_formatter import VerboseFluentRecordFormatter
+from backend_test.logging_handlers import BLOCK, AsyncFluentHandler
+
+FORMAT = {"level": "%(levelname)s", "logger": "%(name)s", "module": "%(module)s"}
+
+
+def make_formatter(formatter_class=VerboseFluentRecordFormatter, **options):
+    return formatter_class(
+        fmt=FORMAT, encoder_class=DjangoJSONEncoder, encoder_options=options
+    )
+
+
+def make_record(data=None):
+    record = logging.LogRecord(
+        "backend_test", logging.INFO, __file__, 1, "menu:menu-list", None, None
+    )
+    record.data = data or {
+        "view": "menu:menu-list",
+        "method": "GET",
+        "status": 200,
+        "queries": 3,
+        "db_time_ms": 1.25,
+        "slowest_query_ms": 0.5,
+        "slowest_query": "SELECT 1",
+    }
+    return record
+
+
+def best_time(function, iterations=2_000, rounds=5):
+    """Best time per call over a few rounds, the least disturbed by the rest
+    of the machine"""
+    function()
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            function()
+        timings.append((time.perf_counter() - start) / iterations)
+    return min(timings)
+
+
+class RoundTripFormatter(VerboseFluentRecordFormatter):
+    """The encoder of the formatter before the single pass conversion"""
+
+    def json_encode(self, obj):
+        return json.loads(self.encoder.encode(obj))
+
+
+class FluentServer(socketserver.ThreadingTCPServer):
+    """Local Fluent forward endpoint collecting the received events"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        self.events = []
+        self.received = threading.Event()
+        self.expected = 0
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                unpacker = msgpack.Unpacker(raw=False)
+                while True:
+                    data = self.request.recv(65536)
+                    if not data:
+                        return
+                    unpacker.feed(data)
+                    for event in unpacker:
+                        server.events.append(event)
+                        if len(server.events) >= server.expected:
+                            server.received.set()
+
+        super().__init__(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class SinglePassEncoderTests(SimpleTestCase):
+    """Test that the single pass encoder matches the JSON round trip"""
+
+    def test_matches_round_trip(self):
+        """Test nested payloads with values JSON can not represent"""
+        payload = {
+            "at": datetime.datetime(2021, 7, 10, 12, 30, tzinfo=datetime.timezone.utc),
+            "day": datetime.date(2021, 7, 10),
+            "amount": decimal.Decimal("10.50"),
+            "id": uuid.UUID("12345678123456781234567812345678"),
+            "label": gettext_lazy("Menu"),
+            "items": ({"a": 1}, [1.5, None, True]),
+            1: "int key",
+            2.5: "float key",
+            None: "none key",
+        }
+        formatter = make_formatter()
+
+        self.assertEqual(
+            formatter.json_encode(payload),
+            json.loads(formatter.encoder.encode(payload)),
+        )
+
+    def test_errors(self):
+        """Test that the round trip errors are raised too"""
+        formatter = make_formatter()
+        circular = []
+        circular.append(circular)
+
+        with self.assertRaises(ValueError):
+            formatter.json_encode({"a": circular})
+        with self.assertRaises(TypeError):
+            formatter.json_encode({"a": object()})
+        with self.assertRaises(TypeError):
+            formatter.json_encode({(1, 2): "tuple key"})
+        self.assertEqual(
+            make_formatter(skipkeys=True).json_encode({(1, 2): "a", "b": 1}),
+            {"b": 1},
+        )
+
+    def test_repeated_objects(self):
+        """Test that an object repeated without a cycle is encoded"""
+        shared = {"a": 1}
+
+        self.assertEqual(
+            make_formatter().json_encode([shared, shared]), [{"a": 1}, {"a": 1}]
+        )
+
+    @pytest.mark.slow
+    def test_format_benchmark(self):
+        """Test that encoding and formatting a record are faster than with the
+        round trip"""
+        record = make_record()
+        timings = {}
+        for formatter_class in (RoundTripFormatter, VerboseFluentRecordFormatter):
+            formatter = make_formatter(formatter_class)
+            timings[formatter_class] = (
+                best_time(lambda: formatter.json_encode(record.data)),
+                best_time(lambda: formatter.format(record)),
+            )
+
+        before = timings[RoundTripFormatter]
+        after = timings[VerboseFluentRecordFormatter]
+        self.assertLess(
+            after[0],
+            before[0],
+            f"encode per record: {before[0] * 1e6:.1f}us before, "
+            f"{after[0] * 1e6:.1f}us after",
+        )
+
+
+class AsyncFluentHandlerTests(SimpleTestCase):
+    """Test the queued and batched Fluent shipping"""
+
+    def setUp(self):
+        self.server = FluentServer()
+        self.addCleanup(self.server.stop)
+
+    def make_handler(self, **kwargs):
+        handler = AsyncFluentHandler("backend", port=self.server.port, **kwargs)
+        handler.setFormatter(make_formatter())
+        self.addCleanup(handler.close)
+        return handler
+
+    def test_records_are_shipped(self):
+        """Test that every record reaches Fluent as a structured event"""
+        handler = self.make_handler()
+        self.server.expected = 100
+
+        for i in range(100):
+            handler.handle(make_record({"i": i}))
+        handler.close()
+
+        self.assertTrue(self.server.received.wait(5))
+        tags = {tag for tag, _, _ in self.server.events}
+        self.assertEqual(tags, {"backend"})
+        self.assertEqual(
+            [data["data"]["i"] for _, _, data in self.server.events], list(range(100))
+        )
+        self.assertEqual(self.server.events[0][2]["level"], "INFO")
+        self.assertEqual(
+            handler.stats(),
+            {"queued": 100, "dropped": 0, "pending": 0, "sent": 100, "failed": 0},
+        )
+
+    def stall(self, handler):
+        """Keeps the shipping thread from draining the queue"""
+        handler._start_listener()
+        handler.listener.stop()
+
+    def test_drop_policy(self):
+        """Test that records are dropped, without waiting, when the queue is
+        full"""
+        handler = self.make_handler(queue_size=2)
+        self.stall(handler)
+
+        start = time.perf_counter()
+        for _ in range(5):
+            handler.handle(make_record())
+
+        self.assertLess(time.perf_counter() - start, 0.05)
+        self.assertEqual((handler.queued, handler.dropped), (2, 3))
+
+    def test_block_policy(self):
+        """Test that callers wait for room before dropping records"""
+        handler = self.make_handler(queue_size=2, policy=BLOCK, block_timeout=0.05)
+        self.stall(handler)
+
+        start = time.perf_counter()
+        for _ in range(3):
+            handler.handle(make_record())
+
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+        self.assertEqual((handler.queued, handler.dropped), (2, 1))
+
+    def test_unknown_policy(self):
+        """Test that only the drop and block policies are accepted"""
+        with self.assertRaises(ValueError):
+            AsyncFluentHandler("backend", policy="spill")
+
+    @pytest.mark.slow
+    def test_emit_benchmark(self):
+        """Test that emitting a record costs less than sending it to Fluent"""
+        iterations, rounds = 1_000, 5
+        self.server.expected = 2 * (iterations * rounds + 1)
+        sync_handler = FluentHandler("backend", port=self.server.port)
+        sync_handler.setFormatter(make_formatter(RoundTripFormatter))
+        self.addCleanup(sync_handler.close)
+        async_handler = self.make_handler(queue_size=iterations * rounds)
+        record = make_record()
+
+        before = best_time(lambda: sync_handler.handle(record), iterations, rounds)
+        after = best_time(lambda: async_handler.handle(record), iterations, rounds)
+        async_handler.close()
+
+        self.assertTrue(self.server.received.wait(5))
+        self.assertLess(
+            after,
+            before,
+            f"emit per record: {before * 1e6:.1f}us before, {after * 1e6:.1f}us after",
+        )
+        self.assertEqual(async_handler.dropped, 0)
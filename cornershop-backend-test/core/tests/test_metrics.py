@@ -0,0 +1,291 @@
+import os
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from django.http import HttpResponse
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from backend_test.middleware import LatencyMetricsMiddleware
+from backend_test.utils.metrics import (
+    BUCKET_BOUNDS_US,
+    OVERFLOW_KEY,
+    LatencyHistograms,
+    get_histograms,
+    render_prometheus,
+)
+
+METRICS_URL = reverse("metrics")
+HEALTHZ_URL = reverse("healthz")
+
+
+def best_per_call(function, iterations=20_000, rounds=5):
+    """Best time per call over a few rounds, the least disturbed by the rest
+    of the machine"""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for i in range(iterations):
+            function(i)
+        timings.append((time.perf_counter() - start) / iterations)
+    return min(timings)
+
+
+class MetricsDirMixin:
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings_override = override_settings(
+            LATENCY_METRICS_DIR=self.directory, METRICS_TOKEN="s3cret"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class LatencyHistogramsTests(MetricsDirMixin, SimpleTestCase):
+    """Test the shared memory latency histograms"""
+
+    def test_record(self):
+        """Test that latencies are counted in their bucket"""
+        histograms = LatencyHistograms(self.directory)
+
+        histograms.record("GET", "menu:menu-list", "2xx", 50)
+        histograms.record("GET", "menu:menu-list", "2xx", 150)
+        histograms.record("GET", "menu:menu-list", "2xx", 1_000_000_000)
+        histograms.record("POST", "menu:menu-list", "4xx", 100)
+
+        series = histograms.aggregate()
+        self.assertEqual(
+            set(series),
+            {
+                ("GET", "menu:menu-list", "2xx"),
+                ("POST", "menu:menu-list", "4xx"),
+            },
+        )
+        buckets, sum_us, count = series[("GET", "menu:menu-list", "2xx")]
+        self.assertEqual((sum_us, count), (1_000_000_000 + 200, 3))
+        self.assertEqual(len(buckets), len(BUCKET_BOUNDS_US) + 1)
+        self.assertEqual(buckets[0], 1)
+        self.assertEqual(sum(buckets[1:4]), 1)
+        self.assertEqual(buckets[-1], 1)
+
+    def test_workers_are_aggregated(self):
+        """Test that every forked worker writes its own file, and they are
+        summed by any process"""
+        histograms = LatencyHistograms(self.directory)
+        histograms.record("GET", "healthz", "2xx", 100)
+
+        pids = []
+        for _ in range(2):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    histograms.record("GET", "healthz", "2xx", 100)
+                    histograms.record("GET", "me", "2xx", 1000)
+                finally:
+                    os._exit(0)
+            pids.append(pid)
+        for pid in pids:
+            os.waitpid(pid, 0)
+
+        self.assertEqual(len(os.listdir(self.directory)), 3)
+        series = LatencyHistograms(self.directory).aggregate()
+        self.assertEqual(series[("GET", "healthz", "2xx")].count, 3)
+        self.assertEqual(series[("GET", "me", "2xx")].count, 2)
+
+    def test_dead_workers_are_archived(self):
+        """Test that the files of dead workers are merged into the archive"""
+        histograms = LatencyHistograms(self.directory)
+        histograms.record("GET", "healthz", "2xx", 100)
+
+        for route in ("healthz", "me"):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    histograms.record("GET", route, "2xx", 1000)
+                finally:
+                    os._exit(0)
+            os.waitpid(pid, 0)
+            histograms.mark_process_dead(pid)
+
+        self.assertCountEqual(
+            os.listdir(self.directory),
+            ["latency-archive.mmap", f"latency-{os.getpid()}.mmap"],
+        )
+        series = LatencyHistograms(self.directory).aggregate()
+        self.assertEqual(series[("GET", "healthz", "2xx")].count, 2)
+        self.assertEqual(series[("GET", "healthz", "2xx")].sum_us, 1100)
+        self.assertEqual(series[("GET", "me", "2xx")].count, 1)
+
+    def test_dead_worker_is_not_counted_twice(self):
+        """Test that a scrape while a dead worker is merged does not count it
+        in both its file and the archive, and that the archive is reused"""
+        histograms = LatencyHistograms(self.directory)
+        key = ("GET", "me", "2xx")
+        pids = []
+        for _ in range(2):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    histograms.record(*key, 1000)
+                finally:
+                    os._exit(0)
+            os.waitpid(pid, 0)
+            pids.append(pid)
+        histograms.mark_process_dead(pids[0])
+        archive = histograms._archive
+        scraped = []
+        merge = archive.merge
+
+        def scraping_merge(key, series):
+            scraped.append(histograms.aggregate()[key].count)
+            merge(key, series)
+
+        with patch.object(archive, "merge", scraping_merge):
+            histograms.mark_process_dead(pids[1])
+
+        self.assertIs(histograms._archive, archive)
+        self.assertEqual(scraped, [1])
+        self.assertEqual(histograms.aggregate()[key].count, 2)
+
+    def test_reopened_file_keeps_series(self):
+        """Test that a process reopening its file keeps counting its series"""
+        LatencyHistograms(self.directory).record("GET", "healthz", "2xx", 100)
+
+        histograms = LatencyHistograms(self.directory)
+        histograms.record("GET", "me", "2xx", 100)
+        histograms.record("GET", "healthz", "2xx", 100)
+
+        series = histograms.aggregate()
+        self.assertEqual(series[("GET", "healthz", "2xx")].count, 2)
+        self.assertEqual(series[("GET", "me", "2xx")].count, 1)
+
+    def test_overflow(self):
+        """Test that series beyond max_series are counted together"""
+        histograms = LatencyHistograms(self.directory, max_series=3)
+
+        for route in ("a", "b", "c", "d"):
+            histograms.record("GET", route, "2xx", 100)
+
+        series = histograms.aggregate()
+        self.assertEqual(
+            set(series), {("GET", "a", "2xx"), ("GET", "b", "2xx"), OVERFLOW_KEY}
+        )
+        self.assertEqual(series[OVERFLOW_KEY].count, 2)
+
+    def test_reset(self):
+        """Test that reset removes the histograms of every process"""
+        histograms = LatencyHistograms(self.directory)
+        histograms.record("GET", "healthz", "2xx", 100)
+
+        histograms.reset()
+
+        self.assertEqual(histograms.aggregate(), {})
+
+    def test_reset_closes_the_archive(self):
+        """Test that reset unmaps the archive before removing its file"""
+        LatencyHistograms(self.directory, name="123").record("GET", "me", "2xx", 1)
+        histograms = LatencyHistograms(self.directory)
+        histograms.mark_process_dead(123)
+        archive = histograms._archive
+
+        histograms.reset()
+
+        self.assertIsNone(histograms._archive)
+        self.assertIsNone(archive._mmap)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_render_prometheus(self):
+        """Test the Prometheus text exposition of the histograms"""
+        histograms = LatencyHistograms(self.directory)
+        histograms.record("GET", 'we"ird', "2xx", 150)
+        histograms.record("GET", 'we"ird', "2xx", 1_000_000_000)
+
+        text = render_prometheus(histograms.aggregate())
+
+        labels = 'method="GET",route="we\\"ird",status="2xx"'
+        self.assertIn("# TYPE http_request_duration_seconds histogram", text)
+        self.assertIn(
+            f'http_request_duration_seconds_bucket{{{labels},le="0.0001"}} 0', text
+        )
+        self.assertIn(
+            f'http_request_duration_seconds_bucket{{{labels},le="0.000168"}} 1',
+            text,
+        )
+        self.assertIn(
+            f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2', text
+        )
+        self.assertIn(f"http_request_duration_seconds_sum{{{labels}}} 1000.00015", text)
+        self.assertIn(f"http_request_duration_seconds_count{{{labels}}} 2", text)
+
+    @pytest.mark.slow
+    def test_record_overhead(self):
+        """Test that recording a request takes a few microseconds"""
+        histograms = LatencyHistograms(self.directory)
+        routes = [f"route-{i}" for i in range(20)]
+        histograms.record("GET", "warmup", "2xx", 1)
+
+        per_call = best_per_call(
+            lambda i: histograms.record("GET", routes[i % 20], "2xx", i)
+        )
+
+        self.assertLess(per_call, 5e-6, f"{per_call * 1e6:.2f}us per call")
+
+    @pytest.mark.slow
+    def test_middleware_overhead(self):
+        """Test that the middleware adds a few microseconds per request"""
+        response = HttpResponse()
+        middleware = LatencyMetricsMiddleware(lambda request: response)
+        request = SimpleNamespace(
+            method="GET", resolver_match=SimpleNamespace(view_name="menu:menu-list")
+        )
+        middleware(request)
+
+        per_call = best_per_call(lambda i: middleware(request))
+
+        self.assertLess(per_call, 5e-6, f"{per_call * 1e6:.2f}us per request")
+
+
+class MetricsEndpointTests(MetricsDirMixin, SimpleTestCase):
+    """Test the recorded requests and the metrics endpoint"""
+
+    def test_requests_are_recorded(self):
+        """Test that requests are recorded by view name and status class"""
+        self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer s3cret")
+        self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer s3cret")
+        self.client.get("/not-a-page/")
+        self.client.get(HEALTHZ_URL)
+
+        series = get_histograms(self.directory, 512).aggregate()
+        self.assertEqual(series[("GET", "metrics", "2xx")].count, 2)
+        self.assertEqual(series[("GET", "unresolved", "4xx")].count, 1)
+        # Health checks are answered ahead of the middleware
+        self.assertNotIn(("GET", "healthz", "2xx"), series)
+
+    def test_metrics(self):
+        """Test that the histograms are served in the Prometheus format"""
+        self.client.get(METRICS_URL)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer s3cret")
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res["Content-Type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",route="metrics",'
+            'status="4xx"} 1',
+            res.content.decode(),
+        )
+
+    def test_metrics_require_token(self):
+        """Test that the metrics are hidden without the token"""
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(res.status_code, 404)
+
+        with override_settings(METRICS_TOKEN=""):
+            res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer ")
+        self.assertEqual(res.status_code, 404)
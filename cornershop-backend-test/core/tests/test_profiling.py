@@ -0,0 +1,185 @@
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from io import StringIO
+from unittest.mock import Mock
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import resolve, reverse
+
+from backend_test.middleware import ProfilingMiddleware
+from backend_test.utils import profiling
+
+HEALTHZ_URL = reverse("healthz")
+
+
+def busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ProfilingTestCase(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings_override = override_settings(
+            PROFILING_ENABLED=True, PROFILING_DIR=self.directory
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def profiles(self):
+        return sorted(os.listdir(self.directory))
+
+    def read_profile(self, name):
+        with open(os.path.join(self.directory, name)) as f:
+            return f.read()
+
+
+class StackSamplerTests(ProfilingTestCase):
+    """Test the stack sampler and the written profiles"""
+
+    def test_sample_stacks(self):
+        """Test that the stacks of the sampled thread are counted"""
+        sampler = profiling.StackSampler(interval=0.001).start()
+        busy_wait(0.05)
+        stacks = sampler.stop()
+
+        self.assertGreater(sum(stacks.values()), 0)
+        busy_stacks = [stack for stack in stacks if "busy_wait" in stack]
+        self.assertTrue(busy_stacks)
+        self.assertTrue(
+            busy_stacks[0].endswith("core.tests.test_profiling:busy_wait"),
+            busy_stacks[0],
+        )
+
+    def test_write_collapsed_stacks(self):
+        """Test that profiles are written in the collapsed stack format"""
+        name = profiling.write_profile(
+            "menu:menu-list", Counter({"a:main;b:view": 3, "a:main": 1})
+        )
+
+        self.assertIn("-menu.menu-list-", name)
+        self.assertEqual(self.profiles(), [name])
+        self.assertEqual(self.read_profile(name), "a:main;b:view 3\na:main 1\n")
+
+    def test_empty_profiles_are_not_written(self):
+        """Test that profiles without samples are skipped"""
+        self.assertIsNone(profiling.write_profile("healthz", Counter()))
+        self.assertEqual(self.profiles(), [])
+
+    @override_settings(PROFILING_MAX_FILES=2)
+    def test_rotation(self):
+        """Test that only the newest profiles are kept"""
+        names = [
+            profiling.write_profile(f"view{i}", Counter({"a:main": 1}))
+            for i in range(3)
+        ]
+
+        self.assertEqual(self.profiles(), sorted(names[1:]))
+
+
+class ProfilingMiddlewareTests(ProfilingTestCase):
+    """Test the triggers of request profiles"""
+
+    def get(self, **headers):
+        """Response of a slow healthz request through the middleware"""
+
+        def get_response(request):
+            busy_wait(0.02)
+            return HttpResponse()
+
+        request = RequestFactory().get(HEALTHZ_URL, **headers)
+        request.resolver_match = resolve(HEALTHZ_URL)
+        return ProfilingMiddleware(get_response)(request)
+
+    def test_disabled(self):
+        """Test that the middleware is removed from the chain when disabled"""
+        with override_settings(PROFILING_ENABLED=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilingMiddleware(lambda request: None)
+
+    def test_signed_header(self):
+        """Test that requests with a signed header are profiled"""
+        token = profiling.make_profiling_token()
+
+        res = self.get(HTTP_X_PROFILE=token)
+
+        self.assertEqual(self.profiles(), [res["X-Profile-Id"]])
+        self.assertIn("-healthz-", res["X-Profile-Id"])
+        self.assertIn("busy_wait", self.read_profile(res["X-Profile-Id"]))
+
+    def test_invalid_header(self):
+        """Test that forged and expired headers are ignored"""
+        token = profiling.make_profiling_token()
+
+        res = self.get(HTTP_X_PROFILE=f"{token}x")
+        self.assertFalse(res.has_header("X-Profile-Id"))
+        with override_settings(PROFILING_TOKEN_MAX_AGE=-1):
+            res = self.get(HTTP_X_PROFILE=token)
+        self.assertFalse(res.has_header("X-Profile-Id"))
+
+        self.assertEqual(self.profiles(), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sample_rate(self):
+        """Test that a share of the requests is profiled"""
+        res = self.get()
+
+        self.assertEqual(self.profiles(), [res["X-Profile-Id"]])
+
+    def test_profiling_token_command(self):
+        """Test that the command prints a valid header"""
+        out = StringIO()
+        call_command("profiling_token", stdout=out)
+
+        header, token = out.getvalue().strip().split(": ")
+        self.assertEqual(header, "X-Profile")
+        request = Mock(META={profiling.PROFILE_HEADER: token})
+        self.assertTrue(profiling.should_profile_request(request))
+
+
+class TaskProfilingTests(ProfilingTestCase):
+    """Test the profiles of Celery tasks"""
+
+    def run_task(self, task):
+        profiling.start_task_profile(sender=task, task_id="task-1", task=task)
+        busy_wait(0.02)
+        profiling.stop_task_profile(sender=task, task_id="task-1", task=task)
+
+    def test_flagged_task(self):
+        """Test that tasks flagged with profile=True are profiled"""
+        task = Mock(profile=True)
+        task.name = "slow_task"
+
+        self.run_task(task)
+
+        profiles = self.profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertIn("-task-slow_task-", profiles[0])
+        self.assertIn("busy_wait", self.read_profile(profiles[0]))
+
+    @override_settings(PROFILING_TASKS=["send_todays_menu_to_slack_task"])
+    def test_listed_task(self):
+        """Test that tasks listed in the settings are profiled"""
+        task = Mock(profile=False)
+        task.name = "send_todays_menu_to_slack_task"
+
+        self.run_task(task)
+
+        self.assertEqual(len(self.profiles()), 1)
+
+    def test_other_tasks(self):
+        """Test that other tasks are not profiled"""
+        task = Mock(profile=False)
+        task.name = "other_task"
+
+        self.run_task(task)
+
+        self.assertEqual(self.profiles(), [])
@@ -0,0 +1,131 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from backend_test.utils.queries import QueryBudgetExceeded, QueryStats
+from core.models import Menu
+from menu.cache import menu_cache
+
+MENU_URL = reverse("menu:menu-list")
+
+
+class QueryStatsTests(TestCase):
+    """Test the query counting execute_wrapper"""
+
+    def test_capture(self):
+        """Test that queries are counted and the slowest one kept"""
+        with QueryStats().capture() as stats:
+            get_user_model().objects.count()
+            get_user_model().objects.exists()
+
+        self.assertEqual(stats.count, 2)
+        self.assertGreater(stats.duration, 0)
+        self.assertLessEqual(stats.slowest_duration, stats.duration)
+        self.assertIn("core_user", stats.slowest_sql)
+
+    def test_over_budget(self):
+        """Test that query and time budgets are checked"""
+        stats = QueryStats()
+        stats.count, stats.duration = 4, 0.02
+
+        self.assertEqual(stats.over_budget(None), [])
+        self.assertEqual(stats.over_budget({"queries": 4, "time_ms": 20}), [])
+        self.assertEqual(
+            stats.over_budget({"queries": 3, "time_ms": 10}),
+            ["4 queries > 3", "20.0ms > 10ms"],
+        )
+        self.assertEqual(
+            stats.over_budget({"queries": 4, "time_ms": 10}, limits=("queries",)),
+            [],
+        )
+
+    def test_long_statements_are_truncated(self):
+        """Test that logged statements are bounded"""
+        stats = QueryStats()
+        with stats.capture():
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT 1 {' ' * 2000}")
+
+        self.assertEqual(len(stats.as_data()["slowest_query"]), 1003)
+
+
+class QueryMetricsMiddlewareTests(TestCase):
+    """Test the per request query instrumentation"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser("querystaff", "test123")
+        Menu.objects.create(
+            added_by_user=self.user, main_dish="Main", side_dish="Side", dessert="Cake"
+        )
+        menu_cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing(self):
+        """Test that the queries are reported in the Server-Timing header"""
+        res = self.client.get(MENU_URL)
+
+        self.assertRegex(res["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries"$')
+
+    def test_queries_are_logged(self):
+        """Test that the query numbers are logged as structured data"""
+        with self.assertLogs("backend_test.queries", "INFO") as logs:
+            self.client.get(MENU_URL)
+
+        data = logs.records[0].data
+        self.assertEqual(data["view"], "menu:menu-list")
+        self.assertEqual(data["status"], 200)
+        self.assertGreater(data["queries"], 0)
+        self.assertEqual(
+            set(data) - {"view", "method", "status"},
+            {"queries", "db_time_ms", "slowest_query_ms", "slowest_query"},
+        )
+
+    @override_settings(
+        QUERY_BUDGETS={"GET menu:menu-list": {"queries": 0}},
+        QUERY_BUDGET_RAISE=False,
+    )
+    def test_over_budget_is_logged(self):
+        """Test that requests over their budget are logged as warnings"""
+        with self.assertLogs("backend_test.queries", "WARNING") as logs:
+            res = self.client.get(MENU_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("menu:menu-list is over its query budget", logs.output[0])
+
+    @override_settings(
+        QUERY_BUDGETS={"menu:menu-list": {"queries": 0}}, QUERY_BUDGET_RAISE=True
+    )
+    def test_over_budget_raises(self):
+        """Test that requests over their budget raise when configured"""
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(MENU_URL)
+
+    @override_settings(
+        QUERY_BUDGETS={"menu:menu-list": {"queries": 100, "time_ms": 0}},
+        QUERY_BUDGET_RAISE=True,
+    )
+    def test_over_time_budget_is_logged(self):
+        """Test that requests over their time budget are logged even when
+        configured to raise"""
+        with self.assertLogs("backend_test.queries", "WARNING") as logs:
+            res = self.client.get(MENU_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("menu:menu-list is over its query budget", logs.output[0])
+
+    @override_settings(
+        QUERY_BUDGETS={
+            "menu:menu-list": {"queries": 100},
+            "GET menu:menu-list": {"queries": 0},
+        },
+        QUERY_BUDGET_RAISE=True,
+    )
+    def test_method_budget(self):
+        """Test that the budget of a method takes precedence"""
+        self.client.post(MENU_URL, {})
+
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(MENU_URL)
@@ -0,0 +1,174 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from backend_test.utils.replicas import is_pinned_to_primary, replica_reads
+from core.models import Menu
+from menu.cache import bump_generations, menu_cache
+
+MENU_URL = reverse("menu:menu-list")
+MENU_SELECTION_URL = reverse("menu_selection:menuselection-list")
+
+
+def detail_url(menu_id):
+    return reverse("menu:menu-detail", args=[menu_id])
+
+
+def sample_menu(user, using="default", **params):
+    """Create and return a sample menu on a database"""
+    defaults = {
+        "main_dish": "Sample dish",
+        "side_dish": "Side sample",
+        "dessert": "Cake",
+    }
+    defaults.update(params)
+
+    return Menu.objects.using(using).create(added_by_user=user, **defaults)
+
+
+@override_settings(READ_REPLICAS=["replica"])
+class ReplicaReadTests(TestCase):
+    """Test that the reads of the viewsets go to the replica"""
+
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        menu_cache.clear()
+        self.user = get_user_model().objects.create_superuser(
+            "replicastaff", "test123.@1"
+        )
+        # The replica is not replicated in tests, its rows differ on purpose
+        self.user.save(using="replica")
+        self.primary_menu = sample_menu(self.user, main_dish="Primary")
+        self.replica_menu = sample_menu(self.user, using="replica", main_dish="Replica")
+        self.client = APIClient()
+
+    def list_main_dishes(self):
+        # Clearing the menu cache would flush the pins too
+        bump_generations()
+        return self.list_cached_main_dishes()
+
+    def list_cached_main_dishes(self):
+        res = self.client.get(MENU_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [menu["main_dish"] for menu in res.data["results"]]
+
+    def test_list_from_replica(self):
+        """Test that menus are listed from the replica"""
+        self.assertEqual(self.list_main_dishes(), ["Replica"])
+
+    def test_retrieve_from_replica(self):
+        """Test that a menu is retrieved from the replica"""
+        res = self.client.get(detail_url(self.replica_menu.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["main_dish"], "Replica")
+
+    @override_settings(READ_REPLICAS=[])
+    def test_no_replicas(self):
+        """Test that reads go to the default database without replicas"""
+        self.assertEqual(self.list_main_dishes(), ["Primary"])
+
+    def test_write_pins_reads_to_primary(self):
+        """Test that a user reads their writes while others read the replica"""
+        self.client.force_authenticate(user=self.user)
+        payload = {
+            "main_dish": "Created",
+            "side_dish": "Side",
+            "dessert": "Cake",
+            "preparation_date": timezone.now().isoformat(),
+        }
+
+        res = self.client.post(MENU_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Menu.objects.using("default").filter(main_dish="Created"))
+        self.assertFalse(Menu.objects.using("replica").filter(main_dish="Created"))
+        self.assertTrue(is_pinned_to_primary(self.user))
+        self.assertCountEqual(self.list_main_dishes(), ["Primary", "Created"])
+
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.list_main_dishes(), ["Replica"])
+
+    def test_replica_reads_after_write_not_cached(self):
+        """Test that reads of the replica right after a write do not cache
+        pre-write data"""
+        staff_client = APIClient()
+        staff_client.force_authenticate(user=self.user)
+        staff_client.patch(detail_url(self.replica_menu.id), {"dessert": "Pie"})
+
+        res = self.client.get(detail_url(self.replica_menu.id))
+        self.assertEqual(res.data["dessert"], "Cake")
+        # The replica catches up
+        Menu.objects.using("replica").filter(pk=self.replica_menu.pk).update(
+            dessert="Pie"
+        )
+
+        for client in (self.client, staff_client):
+            res = client.get(detail_url(self.replica_menu.id))
+            self.assertEqual(res.data["dessert"], "Pie")
+
+    @override_settings(READ_REPLICA_PIN_SECONDS=0)
+    def test_replica_reads_cached_once_caught_up(self):
+        """Test that reads of the replica are cached once the pin window of
+        the last write passed"""
+        bump_generations()
+        self.client.get(MENU_URL)
+
+        with CaptureQueriesContext(connections["replica"]) as queries:
+            self.assertEqual(self.list_cached_main_dishes(), ["Replica"])
+
+        self.assertFalse(queries.captured_queries)
+
+    def test_failed_write_does_not_pin(self):
+        """Test that a rejected write leaves the reads on the replica"""
+        self.client.force_authenticate(user=self.user)
+
+        res = self.client.post(MENU_URL, {"weekday": 3})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(is_pinned_to_primary(self.user))
+        self.assertEqual(self.list_main_dishes(), ["Replica"])
+
+    @override_settings(READ_REPLICA_PIN_SECONDS=0)
+    def test_pin_expires(self):
+        """Test that the reads go back to the replica once the pin expires"""
+        self.client.force_authenticate(user=self.user)
+
+        res = self.client.patch(detail_url(self.primary_menu.id), {"dessert": "Pie"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(is_pinned_to_primary(self.user))
+        self.assertEqual(self.list_main_dishes(), ["Replica"])
+
+    def test_staff_selections_from_replica(self):
+        """Test that only the selection listings of the staff read the replica"""
+        user = get_user_model().objects.create_user("replicauser", "test123.@1")
+
+        for listing_user, replica_queries in ((self.user, True), (user, False)):
+            self.client.force_authenticate(user=listing_user)
+            with CaptureQueriesContext(connections["replica"]) as queries:
+                res = self.client.get(MENU_SELECTION_URL)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(bool(queries.captured_queries), replica_queries)
+
+    def test_replica_instances_saved_to_primary(self):
+        """Test that an instance read from the replica is saved to the primary"""
+        with replica_reads():
+            menu = Menu.objects.get(main_dish="Replica")
+        menu.dessert = "Pie"
+        menu.save()
+
+        self.assertEqual(Menu.objects.using("default").get(pk=menu.pk).dessert, "Pie")
+        self.assertEqual(
+            Menu.objects.using("replica").get(pk=menu.pk).dessert,
+            self.replica_menu.dessert,
+        )
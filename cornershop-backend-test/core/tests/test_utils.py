@@ -1,11 +1,18 @@
+import asyncio
+import time
 from datetime import datetime
 from unittest import mock
 
+from django.contrib.auth import get_user_model
 from django.test import TestCase
 
 from backend_test.envtools import getenv
+from core.models import Menu
+from core.tests.slack_stub import StubSlackServer
+from core.utils.cache import LRUCache, TieredCache
 from core.utils.date_utils import generate_day_range_for_date, is_between
-from core.utils.slack_client import SlackRESTClient
+from core.utils.pagination import keyset_batches
+from core.utils.slack_client import AsyncSlackClient, SlackRESTClient, TokenBucket
 
 
 class DateUtilsTests(TestCase):
@@ -31,12 +38,120 @@ class DateUtilsTests(TestCase):
         self.assertTrue(is_between(left_value=gte, value=date, right_value=lte))
 
 
+class LRUCacheTests(TestCase):
+    """Class to test the in-process LRU cache"""
+
+    def test_evicts_least_recently_used(self):
+        """Test that the least recently used entry is evicted when full"""
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+
+    @mock.patch("core.utils.cache.time.monotonic")
+    def test_entries_expire(self, monotonic_mock):
+        """Test that entries are not returned after their TTL"""
+        monotonic_mock.return_value = 100
+        cache = LRUCache(ttl=5)
+        cache.set("a", 1)
+
+        monotonic_mock.return_value = 104
+        self.assertEqual(cache.get("a"), 1)
+        monotonic_mock.return_value = 106
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+
+class TieredCacheTests(TestCase):
+    """Class to test the two tier cache"""
+
+    def setUp(self):
+        self.cache = TieredCache()
+        self.cache.clear()
+
+    def test_local_tier_serves_hits(self):
+        """Test that values in the local tier do not reach the backend"""
+        self.cache.set("key", "value")
+        self.cache.backend.delete("key")
+
+        self.assertEqual(self.cache.get("key"), "value")
+
+    def test_backend_fills_local_tier(self):
+        """Test that backend hits are copied to the local tier"""
+        self.cache.backend.set("key", "value")
+
+        self.assertEqual(self.cache.get("key"), "value")
+        self.assertEqual(self.cache.local.get("key"), "value")
+
+    def test_set_many(self):
+        """Test that many values are stored in both tiers at once"""
+        with mock.patch.object(
+            self.cache.backend, "set_many", wraps=self.cache.backend.set_many
+        ) as set_many:
+            self.cache.set_many({"a": 1, "b": 2})
+
+        set_many.assert_called_once_with({"a": 1, "b": 2}, timeout=300)
+        self.assertEqual(self.cache.local.get("b"), 2)
+        self.assertEqual(self.cache.backend.get("a"), 1)
+
+    def test_incr_creates_counter(self):
+        """Test that incrementing a missing counter starts it at one"""
+        self.assertEqual(self.cache.incr("counter"), 1)
+        self.assertEqual(self.cache.incr("counter"), 2)
+        self.assertEqual(self.cache.get("counter"), 2)
+
+
+class KeysetBatchesTests(TestCase):
+    """Class to test the keyset batched reads"""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user("keysetuser", "test123")
+        # Ties on the first key are broken by the id
+        for dessert in ("b", "a", "b", "a", "c"):
+            Menu.objects.create(
+                added_by_user=user, main_dish="Main", side_dish="Side", dessert=dessert
+            )
+        self.rows = Menu.objects.values("dessert", "id")
+
+    def test_batches_follow_the_keys(self):
+        """Test that every row is read once, in order, in bounded batches"""
+        with self.assertNumQueries(3):
+            batches = list(keyset_batches(self.rows, ("dessert", "id"), 2))
+
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(
+            [row for batch in batches for row in batch],
+            list(self.rows.order_by("dessert", "id")),
+        )
+
+    def test_last_batch_full(self):
+        """Test that a full last batch is followed by an empty read"""
+        with self.assertNumQueries(2):
+            batches = list(keyset_batches(self.rows, ("dessert", "id"), 5))
+
+        self.assertEqual([len(batch) for batch in batches], [5])
+
+    def test_empty_queryset(self):
+        """Test that an empty queryset yields no batches"""
+        rows = self.rows.filter(dessert="z")
+
+        self.assertEqual(list(keyset_batches(rows, ("id",), 2)), [])
+
+
 slack_client_base = "core.utils.slack_client."
 
 
 class ResponseMock:
-    def __init__(self, expected):
+    def __init__(self, expected, status_code=200, headers=None):
         self.__expected = expected
+        self.status_code = status_code
+        self.headers = headers or {}
 
     @property
     def expected(self):
@@ -56,12 +171,13 @@ class SlackClientTests(TestCase):
     def setUp(self):
         token = getenv("SLACK_BOT_TOKEN", default="No token")
         self.client = SlackRESTClient(token)
+        self.client.conversation_cache.clear()
 
     def test_endpoint_is_null_initially(self):
         """Test the client has no endpoint set at initialization"""
         self.assertIsNone(self.client.current_endpoint)
 
-    @mock.patch(slack_client_base + "requests.request")
+    @mock.patch(slack_client_base + "requests.Session.request")
     def test_request_fails_if_no_token(self, request_mock):
         """Test request fails if token is wrong"""
         mocked_res = ResponseMock({"ok": False, "error": "invalid_auth"})
@@ -72,7 +188,7 @@ class SlackClientTests(TestCase):
         self.assertEqual(self.client.last_error, "invalid_auth")
         self.assertEqual(self.client.request_errors, 1)
 
-    @mock.patch(slack_client_base + "requests.request")
+    @mock.patch(slack_client_base + "requests.Session.request")
     def test_response_when_no_token_is_used(self, request_mock):
         """Test the response is what was expected when no token is sent"""
         mocked_res = ResponseMock({"ok": False, "error": "invalid_auth"})
@@ -82,7 +198,7 @@ class SlackClientTests(TestCase):
         request_mock.assert_called_once()
         self.assertEqual(client_res, mocked_res.json())
 
-    @mock.patch(slack_client_base + "requests.request")
+    @mock.patch(slack_client_base + "requests.Session.request")
     def test_get_slack_conversation_id(self, request_mock):
         """Test that the correct conversation id is returned"""
         mocked_res = ResponseMock(
@@ -101,7 +217,7 @@ class SlackClientTests(TestCase):
         res = self.client.get_slack_conversation("conversation_name")
         self.assertEqual(res, "expected")
 
-    @mock.patch(slack_client_base + "requests.request")
+    @mock.patch(slack_client_base + "requests.Session.request")
     def test_send_slack_message(self, request_mock):
         expected_response = {
             "ok": True,
@@ -118,3 +234,383 @@ class SlackClientTests(TestCase):
         self.assertEqual(res["channel"], "id_channel")
         self.assertIsInstance(res["message"], dict)
         self.assertEqual(res["message"]["text"], "test")
+
+
+class SlackClientTransportTests(TestCase):
+    """Class to test the Slack client against a local stub server"""
+
+    def setUp(self):
+        self.server = StubSlackServer().__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.client = SlackRESTClient(
+            "token",
+            base_url=self.server.base_url,
+            read_timeout=0.5,
+            max_retries=2,
+            backoff_factor=0,
+        )
+        self.addCleanup(self.client.close)
+
+    def test_connection_is_reused(self):
+        """Test that consecutive requests share one keep-alive connection"""
+        for _ in range(3):
+            self.client.send_slack_message("id_channel", "test")
+
+        ports = {call["client_port"] for call in self.server.calls}
+        self.assertEqual(len(self.server.calls), 3)
+        self.assertEqual(len(ports), 1)
+
+    def test_retries_rate_limited_request(self):
+        """Test that 429 responses are retried after their Retry-After"""
+        self.client.backoff_factor = 1
+        self.server.add_response(
+            "chat.postMessage",
+            {"ok": False, "error": "ratelimited"},
+            status=429,
+            headers={"Retry-After": "0"},
+        )
+        self.server.add_response("chat.postMessage", {"ok": True, "ts": "1"})
+
+        with mock.patch(slack_client_base + "time.sleep") as sleep_mock:
+            res = self.client.send_slack_message("id_channel", "test")
+
+        self.assertEqual(res, {"ok": True, "ts": "1"})
+        sleep_mock.assert_called_once_with(0)
+        self.assertEqual(len(self.server.calls_to("chat.postMessage")), 2)
+
+    def test_retry_after_is_capped(self):
+        """Test that long Retry-After values are capped"""
+        self.client.max_retry_after = 5
+        response = ResponseMock({}, status_code=429, headers={"Retry-After": "60"})
+
+        self.assertEqual(self.client._get_retry_delay(response, 0), 5)
+
+    def test_backoff_between_server_errors(self):
+        """Test that 5xx responses of reads are retried with exponential
+        backoff"""
+        self.client.backoff_factor = 0.5
+        for _ in range(3):
+            self.server.add_response(
+                "conversations.list", {"ok": False, "error": "fatal_error"}, status=500
+            )
+
+        with mock.patch(slack_client_base + "time.sleep") as sleep_mock:
+            res = self.client.get_slack_conversation("general")
+
+        self.assertIsNone(res)
+        self.assertEqual(
+            [call.args[0] for call in sleep_mock.call_args_list], [0.5, 1.0]
+        )
+        self.assertEqual(len(self.server.calls_to("conversations.list")), 3)
+        self.assertEqual(self.client.request_errors, 1)
+
+    def test_posts_are_not_retried_after_reaching_slack(self):
+        """Test that messages are not sent again after a 5xx or a read
+        timeout, Slack may have posted them"""
+        self.server.add_response(
+            "chat.postMessage", {"ok": False, "error": "fatal_error"}, status=500
+        )
+        self.server.add_response("chat.postMessage", {"ok": True}, delay=1)
+
+        for error in ("fatal_error", "Read timed out"):
+            res = self.client.send_slack_message("id_channel", "test")
+
+            self.assertIn(error, res["error"])
+        self.assertEqual(len(self.server.calls_to("chat.postMessage")), 2)
+
+    def test_posts_are_retried_when_not_sent(self):
+        """Test that messages are retried when Slack could not be reached"""
+        self.server.__exit__()
+
+        with mock.patch(slack_client_base + "time.sleep") as sleep_mock:
+            res = self.client.send_slack_message("id_channel", "test")
+
+        self.assertFalse(res["ok"])
+        self.assertEqual(sleep_mock.call_count, 2)
+
+    def test_retries_stop_at_the_deadline(self):
+        """Test that no retry is made past the deadline of the request"""
+        self.client.deadline = 0.5
+        self.client.max_retries = 10
+        self.server.add_response(
+            "chat.postMessage",
+            {"ok": False, "error": "ratelimited"},
+            status=429,
+            headers={"Retry-After": "0.3"},
+        )
+        self.server.add_response(
+            "chat.postMessage",
+            {"ok": False, "error": "ratelimited"},
+            status=429,
+            headers={"Retry-After": "0.3"},
+        )
+
+        start = time.monotonic()
+        res = self.client.send_slack_message("id_channel", "test")
+
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(res, {"ok": False, "error": "ratelimited"})
+        self.assertEqual(len(self.server.calls_to("chat.postMessage")), 2)
+
+    def test_read_timeout(self):
+        """Test that a hung Slack socket does not block the caller"""
+        self.client.max_retries = 0
+        self.server.add_response("chat.postMessage", {"ok": True}, delay=2)
+
+        start = time.monotonic()
+        res = self.client.send_slack_message("id_channel", "test")
+
+        self.assertLess(time.monotonic() - start, 1.5)
+        self.assertFalse(res["ok"])
+        self.assertEqual(self.client.request_errors, 1)
+
+    def test_read_timeout_is_cut_to_the_deadline(self):
+        """Test that the last attempt only waits until the deadline"""
+        self.client.timeout = (3.05, 10)
+        self.client.deadline = 0.5
+        self.server.add_response("conversations.list", {"ok": True}, delay=2)
+
+        start = time.monotonic()
+        res = self.client.get_slack_conversation("general")
+
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertIsNone(res)
+
+
+class SlackConversationCacheTests(TestCase):
+    """Class to test the cached resolution of conversation ids"""
+
+    def setUp(self):
+        self.server = StubSlackServer().__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.client = SlackRESTClient(
+            "token", base_url=self.server.base_url, conversations_page_size=2
+        )
+        self.client.conversation_cache.clear()
+        self.addCleanup(self.client.close)
+
+    def add_pages(self, *pages):
+        for index, names in enumerate(pages, start=1):
+            next_cursor = f"page{index + 1}" if index < len(pages) else ""
+            self.server.add_response(
+                "conversations.list",
+                {
+                    "ok": True,
+                    "channels": [{"id": f"id_{name}", "name": name} for name in names],
+                    "response_metadata": {"next_cursor": next_cursor},
+                },
+            )
+
+    def test_channel_past_the_first_page(self):
+        """Test that conversations.list is paged through with its cursor"""
+        self.add_pages(["general", "random"], ["almuerzo"])
+
+        res = self.client.get_slack_conversation("almuerzo")
+
+        calls = self.server.calls_to("conversations.list")
+        self.assertEqual(res, "id_almuerzo")
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[0]["params"]["limit"], ["2"])
+        self.assertNotIn("cursor", calls[0]["params"])
+        self.assertEqual(calls[1]["params"]["cursor"], ["page2"])
+
+    def test_missing_channel(self):
+        """Test that None is returned after the last page"""
+        self.add_pages(["general", "random"], ["almuerzo"])
+
+        self.assertIsNone(self.client.get_slack_conversation("cena"))
+        self.assertEqual(len(self.server.calls_to("conversations.list")), 2)
+
+    def test_repeated_lookups_make_no_requests(self):
+        """Test that resolved ids and the channels seen on the way are cached"""
+        self.add_pages(["general", "random"], ["almuerzo"])
+        self.client.get_slack_conversation("almuerzo")
+
+        self.assertEqual(self.client.get_slack_conversation("almuerzo"), "id_almuerzo")
+        self.assertEqual(self.client.get_slack_conversation("general"), "id_general")
+        self.assertEqual(len(self.server.calls_to("conversations.list")), 2)
+
+    def test_page_is_cached_at_once(self):
+        """Test that the channels of a page are written in one cache call"""
+        self.add_pages(["general", "random"], ["almuerzo"])
+        backend = self.client.conversation_cache.backend
+
+        with mock.patch.object(backend, "set_many", wraps=backend.set_many) as set_many:
+            self.client.get_slack_conversation("almuerzo")
+
+        self.assertEqual(set_many.call_count, 2)
+        self.assertEqual(
+            set(set_many.call_args_list[0].args[0]),
+            {"slack:conversation:general", "slack:conversation:random"},
+        )
+
+    def test_cache_is_shared_through_the_backend(self):
+        """Test that other processes resolve the id from the shared cache"""
+        self.add_pages(["almuerzo"])
+        self.client.get_slack_conversation("almuerzo")
+        self.client.conversation_cache.local.clear()
+
+        self.assertEqual(self.client.get_slack_conversation("almuerzo"), "id_almuerzo")
+        self.assertEqual(len(self.server.calls_to("conversations.list")), 1)
+
+    def test_channel_not_found_invalidates_cache(self):
+        """Test that a deleted channel is resolved again on the next lookup"""
+        self.add_pages(["almuerzo"])
+        self.client.get_slack_conversation("almuerzo")
+        self.server.add_response(
+            "chat.postMessage", {"ok": False, "error": "channel_not_found"}
+        )
+        self.client.send_slack_message("id_almuerzo", "test")
+        self.server.add_response(
+            "conversations.list",
+            {"ok": True, "channels": [{"id": "id_new", "name": "almuerzo"}]},
+        )
+
+        self.assertEqual(self.client.get_slack_conversation("almuerzo"), "id_new")
+        self.assertEqual(len(self.server.calls_to("conversations.list")), 2)
+
+
+class TokenBucketTests(TestCase):
+    """Class to test the token bucket rate limiter"""
+
+    def setUp(self):
+        self.now = 0
+        self.bucket = TokenBucket(rate=2, capacity=2, clock=lambda: self.now)
+
+    def test_burst_then_wait(self):
+        """Test that tokens over the capacity wait for the refill rate"""
+        self.assertEqual(
+            [self.bucket.reserve() for _ in range(4)], [0.0, 0.0, 0.5, 1.0]
+        )
+
+    def test_refill(self):
+        """Test that the bucket refills up to its capacity"""
+        self.bucket.reserve()
+        self.bucket.reserve()
+        self.now = 10
+
+        self.assertEqual([self.bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.5])
+
+    def test_pause(self):
+        """Test that a pause delays the next token"""
+        self.bucket.pause(3)
+
+        self.assertEqual(self.bucket.reserve(), 3.5)
+
+
+class AsyncSlackClientTests(TestCase):
+    """Class to test the asyncio Slack client against a local stub server"""
+
+    def setUp(self):
+        self.server = StubSlackServer().__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.client = AsyncSlackClient(
+            "token",
+            base_url=self.server.base_url,
+            max_concurrency=5,
+            backoff_factor=0,
+        )
+        self.client.conversation_cache.clear()
+        self.addCleanup(self.client.close)
+
+    def test_send_many_results(self):
+        """Test that send_many returns the result of every recipient in order"""
+        self.server.add_response("chat.postMessage", {"ok": True, "ts": "1"})
+        self.server.add_response(
+            "chat.postMessage", {"ok": False, "error": "user_not_found"}
+        )
+        messages = [("U1", "Hola U1"), ("U2", "Hola U2")]
+
+        results = asyncio.run(self.client.send_many(messages))
+
+        calls = self.server.calls_to("chat.postMessage")
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(
+            {call["json"]["channel"]: call["json"]["text"] for call in calls},
+            dict(messages),
+        )
+        self.assertEqual([result.channel for result in results], ["U1", "U2"])
+        self.assertEqual(
+            sorted((result.ok, result.error) for result in results),
+            [(False, "user_not_found"), (True, None)],
+        )
+        self.assertEqual(self.client.request_errors, 1)
+        self.assertEqual(calls[0]["headers"]["Authorization"], "Bearer token")
+
+    def test_send_many_is_concurrent(self):
+        """Test that requests overlap up to the concurrency bound"""
+        for _ in range(10):
+            self.server.add_response("chat.postMessage", {"ok": True}, delay=0.2)
+        messages = [(f"U{i}", "Hola") for i in range(10)]
+
+        start = time.monotonic()
+        results = asyncio.run(self.client.send_many(messages))
+        elapsed = time.monotonic() - start
+
+        self.assertTrue(all(result.ok for result in results))
+        # Two rounds of five concurrent requests, serially it would take 2s
+        self.assertGreaterEqual(elapsed, 0.4)
+        self.assertLess(elapsed, 1.5)
+
+    def test_send_many_respects_rate_limit(self):
+        """Test that each method is throttled by its token bucket"""
+        self.client.rate_limits["chat.postMessage"] = 600
+        bucket = self.client.get_bucket("chat.postMessage")
+        bucket.capacity = bucket.tokens = 1
+
+        start = time.monotonic()
+        asyncio.run(self.client.send_many([("U1", "a"), ("U2", "b"), ("U3", "c")]))
+
+        # 10 requests per second with no burst
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_rate_limit_wait_past_the_deadline(self):
+        """Test that a message held back by the rate limit past the deadline
+        is reported as failed without being sent"""
+        self.client.deadline = 0.1
+        self.client.get_bucket("chat.postMessage").pause(0.3)
+
+        results = asyncio.run(self.client.send_many([("U1", "Hola")]))
+
+        self.assertEqual(
+            [(result.ok, result.error) for result in results],
+            [(False, "deadline_exceeded")],
+        )
+        self.assertFalse(self.server.calls_to("chat.postMessage"))
+
+    def test_rate_limited_request_pauses_method(self):
+        """Test that a 429 pauses the method bucket before retrying"""
+        self.server.add_response(
+            "chat.postMessage",
+            {"ok": False, "error": "ratelimited"},
+            status=429,
+            headers={"Retry-After": "3"},
+        )
+        bucket = self.client.get_bucket("chat.postMessage")
+
+        with mock.patch.object(bucket, "pause") as pause_mock:
+            results = asyncio.run(self.client.send_many([("U1", "Hola")]))
+
+        pause_mock.assert_called_once_with(3)
+        self.assertTrue(results[0].ok)
+        self.assertEqual(len(self.server.calls_to("chat.postMessage")), 2)
+
+    def test_get_slack_conversation(self):
+        """Test that conversation ids are resolved through every page"""
+        self.server.add_response(
+            "conversations.list",
+            {
+                "ok": True,
+                "channels": [{"id": "id_general", "name": "general"}],
+                "response_metadata": {"next_cursor": "page2"},
+            },
+        )
+        self.server.add_response(
+            "conversations.list",
+            {"ok": True, "channels": [{"id": "id_almuerzo", "name": "almuerzo"}]},
+        )
+
+        res = asyncio.run(self.client.get_slack_conversation("almuerzo"))
+
+        self.assertEqual(res, "id_almuerzo")
+        self.assertEqual(len(self.server.calls_to("conversations.list")), 2)
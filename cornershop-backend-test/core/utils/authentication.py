@@ -0,0 +1,100 @@
+import hashlib
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from core.utils.cache import TieredCache
+
+# User fields kept in the snapshots, any other field is loaded on access
+SNAPSHOT_FIELDS = ("id", "username", "is_staff", "is_active")
+
+token_cache = TieredCache(
+    timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT,
+    local_maxsize=settings.AUTH_TOKEN_CACHE_LOCAL_MAXSIZE,
+    local_ttl=settings.AUTH_TOKEN_CACHE_LOCAL_TTL,
+)
+
+
+def token_key(key: str) -> str:
+    # Hashed so token keys never show up in the cache backend
+    return f"auth:token:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def forget_token(key: str) -> None:
+    """Drops the cached snapshot of a token"""
+    token_cache.delete(token_key(key))
+
+
+def user_from_snapshot(snapshot: dict):
+    """Builds a user instance from a snapshot as if it had been fetched with
+    ``only(*SNAPSHOT_FIELDS)``.
+
+    Args:
+        snapshot (dict): Values of the ``SNAPSHOT_FIELDS``.
+
+    Returns:
+        User: User whose other fields are deferred.
+    """
+    user_model = get_user_model()
+    fields = [
+        field.attname
+        for field in user_model._meta.concrete_fields
+        if field.attname in snapshot
+    ]
+    return user_model.from_db(
+        router.db_for_read(user_model),
+        fields,
+        [snapshot[field] for field in fields],
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Drop-in ``TokenAuthentication`` that caches token to user snapshots.
+
+    Warm requests are authenticated without queries. Snapshots are dropped by
+    signals when the token is deleted or its user saved; other processes may
+    still use their local copy for up to ``AUTH_TOKEN_CACHE_LOCAL_TTL``
+    seconds.
+    """
+
+    def get_snapshot(self, key: str) -> Optional[dict]:
+        """Gets the user snapshot of a token, from the cache or the database.
+
+        Args:
+            key (str): Token key.
+
+        Returns:
+            Optional[dict]: User snapshot, None if the token does not exist.
+        """
+        cache_key = token_key(key)
+        snapshot = token_cache.get(cache_key)
+        if snapshot is None:
+            model = self.get_model()
+            snapshot = (
+                model.objects.filter(key=key)
+                .values(*(f"user__{field}" for field in SNAPSHOT_FIELDS))
+                .first()
+            )
+            if snapshot is None:
+                return None
+            snapshot = {field: snapshot[f"user__{field}"] for field in SNAPSHOT_FIELDS}
+            token_cache.set(cache_key, snapshot)
+        return snapshot
+
+    def authenticate_credentials(self, key):
+        snapshot = self.get_snapshot(key)
+        if snapshot is None:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+        if not snapshot["is_active"]:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+
+        user = user_from_snapshot(snapshot)
+        token = self.get_model()(key=key, user=user)
+        token._state.adding = False
+        return (user, token)
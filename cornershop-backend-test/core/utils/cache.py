@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+from uuid import uuid4
+
+from django.core.cache import caches
+
+MISSING = object()
+
+
+class LRUCache:
+    """Thread safe, size bounded in-process cache with per entry TTL"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 5):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Gets a value, refreshing its position in the LRU order.
+
+        Args:
+            key (str): Key of the entry.
+            default (Any): Value returned if key is missing or expired.
+
+        Returns:
+            Any: Cached value or default.
+        """
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+            if entry is MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Stores a value, evicting the least recently used entry when full.
+
+        Args:
+            key (str): Key of the entry.
+            value (Any): Value to store.
+            ttl (float | None): Seconds the entry lives, defaults to self.ttl.
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class TieredCache:
+    """Read-through cache with an in-process LRU tier in front of a Django
+    cache backend (Redis in every environment but tests).
+
+    Entries found in the local tier never reach the backend, so values stored
+    here must tolerate being up to ``local_ttl`` seconds stale in processes
+    other than the one that wrote them.
+    """
+
+    def __init__(
+        self,
+        alias: str = "default",
+        timeout: Optional[int] = 300,
+        local_maxsize: int = 1024,
+        local_ttl: float = 5,
+    ):
+        self.alias = alias
+        self.timeout = timeout
+        self.local = LRUCache(maxsize=local_maxsize, ttl=local_ttl)
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Gets a value from the local tier, falling back to the backend.
+
+        Args:
+            key (str): Key of the entry.
+            default (Any): Value returned if key is missing in both tiers.
+
+        Returns:
+            Any: Cached value or default.
+        """
+        value = self.local.get(key, MISSING)
+        if value is not MISSING:
+            return value
+        value = self.backend.get(key, MISSING)
+        if value is MISSING:
+            return default
+        self.local.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any, timeout: Optional[int] = MISSING) -> None:
+        timeout = self.timeout if timeout is MISSING else timeout
+        self.backend.set(key, value, timeout=timeout)
+        self.local.set(key, value)
+
+    def set_many(self, data: Dict[str, Any], timeout: Optional[int] = MISSING) -> None:
+        """Stores many values in both tiers, with a single round trip to the
+        backend (a pipeline on Redis)"""
+        if not data:
+            return
+        timeout = self.timeout if timeout is MISSING else timeout
+        self.backend.set_many(data, timeout=timeout)
+        for key, value in data.items():
+            self.local.set(key, value)
+
+    def incr(self, key: str) -> int:
+        """Atomically increments a counter in the backend, creating it if
+        missing, and refreshes the local copy.
+
+        Args:
+            key (str): Key of the counter.
+
+        Returns:
+            int: Value of the counter after the increment.
+        """
+        self.backend.add(key, 0, timeout=None)
+        value = self.backend.incr(key)
+        self.local.set(key, value)
+        return value
+
+    def delete(self, key: str) -> None:
+        self.backend.delete(key)
+        self.local.delete(key)
+
+    def clear(self) -> None:
+        """Clears both tiers. This flushes the whole backend, use in tests."""
+        self.backend.clear()
+        self.local.clear()
+
+
+@contextmanager
+def cache_lock(key: str, timeout: int, alias: str = "default") -> Iterator[bool]:
+    """Non blocking lock shared by every process using the cache backend.
+
+    The lock is taken with ``add`` (SET NX on Redis) and expires after
+    ``timeout`` seconds, so a killed holder cannot keep it forever.
+
+    Usage:
+        with cache_lock("lock:digest", timeout=120) as acquired:
+            if acquired:
+                ...
+
+    Args:
+        key (str): Key of the lock.
+        timeout (int): Seconds after which the lock is released anyway.
+        alias (str): Django cache holding the lock.
+
+    Yields:
+        bool: Whether the lock was acquired.
+    """
+    backend = caches[alias]
+    token = uuid4().hex
+    acquired = backend.add(key, token, timeout=timeout)
+    try:
+        yield acquired
+    finally:
+        # Only release our own lock, it may have expired and been taken again
+        if acquired and backend.get(key) == token:
+            backend.delete(key)
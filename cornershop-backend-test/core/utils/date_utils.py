@@ -1,6 +1,10 @@
 from datetime import datetime
 from typing import Tuple, Union
 
+from django.utils import timezone
+
+from dateutil import parser
+
 
 def generate_day_range_for_date(date: datetime) -> Tuple[datetime, datetime]:
     """Given a datetime, returns the range in which the date falls in.
@@ -39,3 +43,25 @@ def is_between(value, right_value, left_value) -> Union[bool, None]:
         return left_value < value < right_value
     except TypeError:
         return None
+
+
+def parse_aware_datetime(value: str) -> datetime:
+    """Parses a datetime string, making it aware in the current timezone if
+    it has no offset.
+
+    Args:
+        value (str): Date or datetime string, e.g. a query param.
+
+    Raises:
+        ValueError: If the string can not be parsed.
+
+    Returns:
+        datetime: Timezone aware datetime.
+    """
+    try:
+        date = parser.parse(value)
+    except OverflowError as e:
+        raise ValueError(str(e))
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
@@ -0,0 +1,109 @@
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.translation import ugettext_lazy as _
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+
+
+class WhitelistedCursorPagination(CursorPagination):
+    """Cursor pagination driven by the ``order_by`` and ``sort`` query params.
+
+    Only orderings in ``orderings`` are accepted, each one should be backed
+    by an index and end in a unique field so pages are stable keyset scans.
+    """
+
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    orderings: Dict[str, Tuple[str, ...]] = {"id": ("id",)}
+    default_order_by = "id"
+
+    def get_ordering(self, request, queryset=None, view=None) -> Tuple[str, ...]:
+        """Gets the whitelisted ordering requested through the query params.
+
+        Args:
+            request (Request): Request being paginated.
+
+        Raises:
+            ValidationError: If ``order_by`` is not a whitelisted ordering.
+
+        Returns:
+            Tuple[str, ...]: Fields to order the queryset by.
+        """
+        order_by = request.query_params.get("order_by") or self.default_order_by
+        order_by = order_by.strip()
+        if order_by not in self.orderings:
+            allowed = ", ".join(sorted(self.orderings))
+            raise ValidationError(
+                {"order_by": [_("Ordenamiento no permitido, usa: %s") % allowed]}
+            )
+
+        ordering = self.orderings[order_by]
+        sort = request.query_params.get("sort") or ""
+        if sort.lower() == "desc":
+            ordering = tuple(f"-{field}" for field in ordering)
+        return ordering
+
+
+def keyset_after(
+    queryset: QuerySet, keys: Sequence[str], values: Sequence[Any]
+) -> QuerySet:
+    """Filters the rows after ``values`` in the ascending ordering ``keys``.
+
+    The filter is a row comparison, ``(a, b) > (x, y)``, which the planner
+    turns into an index range scan starting at the last row read. Expanded
+    into ``a > x OR (a = x AND b > y)``, every batch would scan again the
+    rows tied on ``a``. Django has no lookup for it, hence ``extra()``.
+
+    Args:
+        queryset (QuerySet): Queryset of the model the keys are fields of.
+        keys (Sequence[str]): Names of fields of the model, not lookups.
+        values (Sequence[Any]): Values of the keys of the last row read.
+
+    Returns:
+        QuerySet: Queryset filtered to the rows after ``values``.
+    """
+    opts = queryset.model._meta
+    connection = connections[queryset.db]
+    quote_name = connection.ops.quote_name
+    fields = [opts.get_field(key) for key in keys]
+    columns = ", ".join(
+        f"{quote_name(opts.db_table)}.{quote_name(field.column)}" for field in fields
+    )
+    placeholders = ", ".join("%s" for _ in fields)
+    params = [
+        field.get_db_prep_value(value, connection)
+        for field, value in zip(fields, values)
+    ]
+    return queryset.extra(where=[f"({columns}) > ({placeholders})"], params=params)
+
+
+def keyset_batches(
+    queryset: QuerySet, keys: Tuple[str, ...], size: int
+) -> Iterator[List[Dict]]:
+    """Reads a ``values()`` queryset in batches ordered by ``keys``, each one
+    a query for the ``size`` rows after the last row of the previous batch.
+
+    Unlike ``iterator()``, this bounds memory without server side cursors,
+    which are disabled: psycopg2 would fetch the whole result set first.
+
+    Args:
+        queryset (QuerySet): ``values()`` queryset selecting the keys.
+        keys (Tuple[str, ...]): Fields of an ascending, non nullable
+        ordering, ending in a unique field and backed by an index.
+        size (int): Rows per batch.
+
+    Yields:
+        List[Dict]: Batches of up to ``size`` rows.
+    """
+    queryset = queryset.order_by(*keys)
+    batch = list(queryset[:size])
+    while batch:
+        yield batch
+        if len(batch) < size:
+            return
+        last = [batch[-1][key] for key in keys]
+        batch = list(keyset_after(queryset, keys, last)[:size])
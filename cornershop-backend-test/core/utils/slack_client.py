@@ -1,26 +1,59 @@
-from functools import wraps
-from typing import Union
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import partial, wraps
+from typing import Iterable, List, NamedTuple, Optional, Union
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 
 from backend_test.envtools import getenv
+from core.utils.cache import TieredCache
+
+
+def _config(value, env_name: str, default: str, coalesce):
+    """Explicit client option, or its environment variable, or its default"""
+    if value is not None:
+        return value
+    return getenv(env_name, default=default, coalesce=coalesce)
 
 
 def validate_slack_request(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        self: SlackRESTClient = args[0]
-        json_data = func(*args, **kwargs)
+    def check(self, json_data):
         if json_data["ok"] is False:
             self.last_error = json_data["error"]
             self._increase_error_count()
         return json_data
 
+    if asyncio.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            return check(args[0], await func(*args, **kwargs))
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        return check(args[0], func(*args, **kwargs))
+
     return wrapper
 
 
 def set_endpoint(endpoint_name):
     def set_endpoint_wrapper(func):
+        if asyncio.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                self: AsyncSlackClient = args[0]
+                self.current_endpoint = endpoint_name
+                return await func(*args, **kwargs)
+
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             self: SlackRESTClient = args[0]
@@ -32,15 +65,134 @@ def set_endpoint(endpoint_name):
     return set_endpoint_wrapper
 
 
+def _request_not_sent(error: requests.RequestException) -> bool:
+    """Whether a request failed before reaching Slack, so retrying it cannot
+    repeat its effects"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0] if error.args else None, "reason", None)
+    return isinstance(reason, NewConnectionError)
+
+
+def _parse_response(response: requests.Response) -> dict:
+    try:
+        return response.json()
+    except ValueError:
+        return {"ok": False, "error": f"http_{response.status_code}"}
+
+
+class TokenBucket:
+    """Token bucket rate limiter for asyncio code.
+
+    Callers reserve a token synchronously and then sleep until it is due, so
+    no lock (bound to a single event loop) is needed. A negative balance is
+    the debt of the callers already waiting.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def reserve(self) -> float:
+        """Takes a token.
+
+        Returns:
+            float: Seconds to wait before the token can be used.
+        """
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Empties the bucket so no token is available for ``seconds``"""
+        self.reserve()
+        self.tokens = min(self.tokens + 1, 0) - seconds * self.rate
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
 class SlackRESTClient:
-    def __init__(self, token=None):
+    RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+    # Other methods, e.g. the POST of chat.postMessage, are only retried when
+    # Slack did not get them or rate limited them, a retry may post twice
+    IDEMPOTENT_METHODS = frozenset(("get", "head", "options"))
+
+    def __init__(
+        self,
+        token=None,
+        *,
+        base_url: str = None,
+        pool_size: int = None,
+        connect_timeout: float = None,
+        read_timeout: float = None,
+        max_retries: int = None,
+        backoff_factor: float = None,
+        max_retry_after: float = None,
+        deadline: float = None,
+        conversations_page_size: int = None,
+        conversation_cache: TieredCache = None,
+    ):
         self.__token = token
-        self.__base_url = getenv("SLACK_BASE_URL", default="https://slack.com/api/")
+        self.__base_url = base_url or getenv(
+            "SLACK_BASE_URL", default="https://slack.com/api/"
+        )
         self.__request_errors = 0
         self.__last_error = None
         self._auth_headers = {"Authorization": "Bearer {}"}
         self._current_endpoint = None
         self._url = None
+        self.pool_size = _config(pool_size, "SLACK_POOL_SIZE", "10", int)
+        self.timeout = (
+            _config(connect_timeout, "SLACK_CONNECT_TIMEOUT", "3.05", float),
+            _config(read_timeout, "SLACK_READ_TIMEOUT", "10", float),
+        )
+        self.max_retries = _config(max_retries, "SLACK_MAX_RETRIES", "3", int)
+        self.backoff_factor = _config(
+            backoff_factor, "SLACK_BACKOFF_FACTOR", "0.5", float
+        )
+        self.max_retry_after = _config(
+            max_retry_after, "SLACK_MAX_RETRY_AFTER", "30", float
+        )
+        # Overall seconds of a request and its retries, a task making a few
+        # requests must stay below the celery soft time limit
+        self.deadline = _config(deadline, "SLACK_REQUEST_DEADLINE", "30", float)
+        self.conversations_page_size = _config(
+            conversations_page_size, "SLACK_CONVERSATIONS_PAGE_SIZE", "200", int
+        )
+        self.conversation_cache = conversation_cache or TieredCache(
+            timeout=_config(None, "SLACK_CONVERSATION_CACHE_TTL", "3600", int),
+            local_maxsize=256,
+            local_ttl=_config(None, "SLACK_CONVERSATION_LOCAL_TTL", "300", float),
+        )
+        self._conversation_names = {}
+        self._session = None
+
+    @property
+    def session(self) -> requests.Session:
+        """Keep-alive session shared by every request of this client"""
+        if self._session is None:
+            self._session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=self.pool_size,
+                pool_maxsize=self.pool_size,
+                max_retries=0,
+            )
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
+        return self._session
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
 
     @property
     def token(self):
@@ -77,11 +229,13 @@ class SlackRESTClient:
     def _increase_error_count(self):
         self.__request_errors += 1
 
+    def _endpoint_url(self):
+        if self.current_endpoint is not None:
+            return f"{self.__base_url}{self.current_endpoint}"
+        return self.__base_url
+
     def _build_url(self):
-        if self._current_endpoint is not None:
-            self._url = f"{self.__base_url}{self._current_endpoint}"
-        else:
-            self._url = self.__base_url
+        self._url = self._endpoint_url()
 
     @validate_slack_request
     def _make_request(
@@ -115,36 +269,185 @@ class SlackRESTClient:
         )
         headers.update(self.auth_headers)
         self._build_url()
-        request_config = {"headers": headers, "json": json_data, "params": params}
-        try:
-            return requests.request(method, self._url, **request_config).json()
-        except requests.RequestException as e:
-            return {"ok": False, "error": str(e)}
+        request_config = {
+            "headers": headers,
+            "json": json_data,
+            "params": params,
+        }
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            timeout = self._get_timeout(deadline)
+            if timeout is None:
+                return {"ok": False, "error": "deadline_exceeded"}
+            try:
+                response = self.session.request(
+                    method, self._url, timeout=timeout, **request_config
+                )
+            except requests.RequestException as e:
+                delay = self._get_retry_delay(None, attempt, method, deadline, e)
+                if delay is None:
+                    return {"ok": False, "error": str(e)}
+            else:
+                delay = self._get_retry_delay(response, attempt, method, deadline)
+                if delay is None:
+                    return _parse_response(response)
+            time.sleep(delay)
+            attempt += 1
+
+    def _get_timeout(self, deadline: float) -> Optional[tuple]:
+        """Connect and read timeouts of an attempt, cut to the time left
+        before the deadline. None once the deadline passed"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        return tuple(min(timeout, remaining) for timeout in self.timeout)
+
+    def _should_retry(
+        self,
+        response: Optional[requests.Response],
+        method: str,
+        error: requests.RequestException = None,
+    ) -> bool:
+        if response is not None:
+            status_code = response.status_code
+            if method.lower() in self.IDEMPOTENT_METHODS:
+                return status_code in self.RETRY_STATUSES
+            return status_code == 429
+        if method.lower() in self.IDEMPOTENT_METHODS:
+            return isinstance(error, (requests.ConnectionError, requests.Timeout))
+        return _request_not_sent(error)
+
+    def _get_retry_delay(
+        self,
+        response: Optional[requests.Response],
+        attempt: int,
+        method: str = "get",
+        deadline: float = None,
+        error: requests.RequestException = None,
+    ) -> Optional[float]:
+        """Gets how long to wait before retrying a request.
+
+        Args:
+            response (Response | None): Response of the attempt, None if the
+            request failed with ``error``.
+            attempt (int): Number of the failed attempt, starting at 0.
+            method (str): HTTP verb of the request.
+            deadline (float | None): time.monotonic() after which the request
+            is given up.
+            error (RequestException | None): Error of the attempt.
+
+        Returns:
+            float | None: Seconds to wait, the Retry-After header when present
+            (capped at max_retry_after) or an exponential backoff. None if the
+            request must not be retried.
+        """
+        if attempt >= self.max_retries or not self._should_retry(
+            response, method, error
+        ):
+            return None
+        delay = self._get_backoff(response, attempt)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def _get_backoff(
+        self, response: Optional[requests.Response], attempt: int
+    ) -> float:
+        """Retry-After of the response, capped at max_retry_after, or an
+        exponential backoff"""
+        retry_after = None
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.max_retry_after)
+            except ValueError:
+                pass
+        return self.backoff_factor * (2**attempt)
+
+    def _conversation_key(self, conversation_name: str) -> str:
+        return f"slack:conversation:{conversation_name}"
+
+    def _get_cached_conversation(self, conversation_name: str) -> Optional[str]:
+        id_conversation = self.conversation_cache.get(
+            self._conversation_key(conversation_name)
+        )
+        if id_conversation is not None:
+            self._conversation_names[id_conversation] = conversation_name
+        return id_conversation
+
+    def _index_conversations(
+        self, json_data: dict, conversation_name: str
+    ) -> Optional[str]:
+        """Caches every channel of a conversations.list page.
+
+        Returns:
+            Optional[str]: Id of conversation_name if it is in the page.
+        """
+        index = {
+            channel["name"]: channel["id"]
+            for channel in json_data.get("channels") or []
+        }
+        self.conversation_cache.set_many(
+            {
+                self._conversation_key(name): channel_id
+                for name, channel_id in index.items()
+            }
+        )
+        id_conversation = index.get(conversation_name)
+        if id_conversation is not None:
+            self._conversation_names[id_conversation] = conversation_name
+        return id_conversation
+
+    def _next_conversations_params(self, json_data: dict = None) -> Optional[dict]:
+        """Query params of the next conversations.list page, None after the
+        last one"""
+        params = {"limit": self.conversations_page_size, "exclude_archived": "true"}
+        if json_data is None:
+            return params
+        cursor = (json_data.get("response_metadata") or {}).get("next_cursor")
+        if json_data.get("ok") is False or not cursor:
+            return None
+        return {**params, "cursor": cursor}
 
     @set_endpoint("conversations.list")
     def get_slack_conversation(self, conversation_name: str) -> Union[str, None]:
         """Gets a slack conversation id from the conversation name.
 
+        Resolved ids are cached, so repeated lookups make no API calls. On a
+        miss conversations.list is paged through once, caching every channel
+        seen until the conversation is found.
+
         Args:
             conversation_name (str): Name of the channel or conversation`.
 
         Returns:
             Union[str, None]: Id of the conversation or None if not found.
         """
-        id_conversation = None
+        id_conversation = self._get_cached_conversation(conversation_name)
+        params = self._next_conversations_params()
         try:
-            json_data = self._make_request("get")
-            if json_data.get("channels"):
-                channels = json_data["channels"]
-                id_conversation = next(
-                    channel["id"]
-                    for channel in channels
-                    if channel["name"] == conversation_name
+            while id_conversation is None and params is not None:
+                json_data = self._make_request("get", params=params)
+                id_conversation = self._index_conversations(
+                    json_data, conversation_name
                 )
+                params = self._next_conversations_params(json_data)
             return id_conversation
         except Exception:
             return
 
+    def forget_conversation(self, id_conversation: str) -> None:
+        """Drops the cached id of a conversation, e.g. after it was deleted"""
+        conversation_name = self._conversation_names.pop(id_conversation, None)
+        if conversation_name is not None:
+            self.conversation_cache.delete(self._conversation_key(conversation_name))
+
+    def _check_conversation(self, id_conversation: str, json_data: dict) -> None:
+        if json_data.get("error") == "channel_not_found":
+            self.forget_conversation(id_conversation)
+
     @set_endpoint("chat.postMessage")
     def send_slack_message(self, id_conversation: str, message: str) -> None:
         """Sends a message to a specific conversation.
@@ -154,4 +457,242 @@ class SlackRESTClient:
             message (str): Message to be send_todays_menu_to_slack
         """
         payload = {"channel": id_conversation, "text": message}
-        return self._make_request("post", json_data=payload)
+        json_data = self._make_request("post", json_data=payload)
+        self._check_conversation(id_conversation, json_data)
+        return json_data
+
+    @set_endpoint("chat.update")
+    def update_slack_message(self, id_conversation: str, ts: str, message: str):
+        """Replaces the text of a message already sent.
+
+        Args:
+            id_conversation (str): Conversation or channel identifier.
+            ts (str): Timestamp identifying the message in the conversation.
+            message (str): New text of the message.
+        """
+        payload = {"channel": id_conversation, "ts": ts, "text": message}
+        json_data = self._make_request("post", json_data=payload)
+        self._check_conversation(id_conversation, json_data)
+        return json_data
+
+
+class SendResult(NamedTuple):
+    channel: str
+    ok: bool
+    error: Optional[str]
+    response: dict
+
+
+class AsyncSlackClient(SlackRESTClient):
+    """asyncio Slack client to send many messages concurrently.
+
+    Requests are made with the pooled session of ``SlackRESTClient`` on a
+    thread pool, at most ``max_concurrency`` at a time, and each API method
+    is throttled by a token bucket sized after its Slack rate tier.
+
+    Usage:
+        client = AsyncSlackClient(token)
+        results = asyncio.run(client.send_many([("U123", "Hola!")]))
+    """
+
+    # Requests per minute of each Slack rate tier
+    RATE_TIERS = {1: 1, 2: 20, 3: 50, 4: 100}
+    METHOD_TIERS = {
+        "conversations.list": 2,
+        "conversations.open": 3,
+        "chat.update": 3,
+    }
+
+    def __init__(
+        self,
+        token=None,
+        *,
+        max_concurrency: int = None,
+        rate_limits: dict = None,
+        **kwargs,
+    ):
+        super().__init__(token, **kwargs)
+        self.max_concurrency = _config(
+            max_concurrency, "SLACK_MAX_CONCURRENCY", "10", int
+        )
+        self.pool_size = max(self.pool_size, self.max_concurrency)
+        # chat.postMessage has a special tier, about one message per second
+        # per channel, so different recipients are only bounded by this budget
+        self.rate_limits = {
+            "chat.postMessage": _config(None, "SLACK_POST_MESSAGE_RATE", "600", int),
+            **{
+                method: self.RATE_TIERS[tier]
+                for method, tier in self.METHOD_TIERS.items()
+            },
+            **(rate_limits or {}),
+        }
+        self._endpoint = ContextVar(f"slack_endpoint_{id(self)}", default=None)
+        self._buckets = {}
+        self._executor = None
+        self._semaphore = None
+
+    @property
+    def current_endpoint(self):
+        return self._endpoint.get()
+
+    @current_endpoint.setter
+    def current_endpoint(self, current_endpoint):
+        # Each asyncio task has its own context, so concurrent calls to
+        # different endpoints do not overwrite each other
+        self._endpoint.set(current_endpoint)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency, thread_name_prefix="slack"
+            )
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        super().close()
+
+    def get_bucket(self, endpoint: str) -> Optional[TokenBucket]:
+        """Gets the token bucket of an API method, None if not throttled"""
+        if endpoint not in self._buckets:
+            per_minute = self.rate_limits.get(endpoint)
+            self._buckets[endpoint] = per_minute and TokenBucket(
+                per_minute / 60, capacity=max(1, per_minute // 10)
+            )
+        return self._buckets[endpoint]
+
+    def get_semaphore(self) -> asyncio.Semaphore:
+        """Gets the concurrency semaphore of the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore[0] is not loop:
+            self._semaphore = (loop, asyncio.Semaphore(self.max_concurrency))
+        return self._semaphore[1]
+
+    @validate_slack_request
+    async def _make_request(
+        self,
+        method: str,
+        params: dict = None,
+        headers: dict = None,
+        json_data: dict = None,
+    ) -> dict:
+        """Makes a throttled request to the Slack REST API
+
+        Args:
+            method (str): HTTP verb.
+            json_data (dict | None): Json data to send.
+            params (dict | None): Query string parameters to send.
+
+        Returns:
+            dict: Raw json data returned.
+        """
+        endpoint = self.current_endpoint
+        url = self._endpoint_url()
+        request_config = {
+            "headers": {**(headers or {}), "Authorization": f"Bearer {self.token}"},
+            "json": json_data or {},
+            "params": params or {},
+        }
+        bucket = self.get_bucket(endpoint)
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        async with self.get_semaphore():
+            deadline = time.monotonic() + self.deadline
+            while True:
+                if bucket is not None:
+                    await bucket.acquire()
+                # The rate limit of the method may have held the attempt back
+                timeout = self._get_timeout(deadline)
+                if timeout is None:
+                    return {"ok": False, "error": "deadline_exceeded"}
+                request = partial(
+                    self.session.request, method, url, timeout=timeout, **request_config
+                )
+                try:
+                    response = await loop.run_in_executor(self.executor, request)
+                except requests.RequestException as e:
+                    delay = self._get_retry_delay(None, attempt, method, deadline, e)
+                    if delay is None:
+                        return {"ok": False, "error": str(e)}
+                else:
+                    delay = self._get_retry_delay(response, attempt, method, deadline)
+                    if delay is None:
+                        return _parse_response(response)
+                    if response.status_code == 429 and bucket is not None:
+                        # Hold back every caller of the method, not just this one
+                        bucket.pause(delay)
+                        delay = 0
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    @set_endpoint("conversations.list")
+    async def get_slack_conversation(self, conversation_name: str) -> Union[str, None]:
+        """Gets a slack conversation id from the conversation name, see
+        ``SlackRESTClient.get_slack_conversation``"""
+        id_conversation = self._get_cached_conversation(conversation_name)
+        params = self._next_conversations_params()
+        try:
+            while id_conversation is None and params is not None:
+                json_data = await self._make_request("get", params=params)
+                id_conversation = self._index_conversations(
+                    json_data, conversation_name
+                )
+                params = self._next_conversations_params(json_data)
+            return id_conversation
+        except Exception:
+            return
+
+    @set_endpoint("chat.postMessage")
+    async def send_slack_message(self, id_conversation: str, message: str) -> dict:
+        """Sends a message to a specific conversation or user.
+
+        Args:
+            id_conversation (str): Conversation, channel or user identifier.
+            message (str): Message to be sent.
+        """
+        payload = {"channel": id_conversation, "text": message}
+        json_data = await self._make_request("post", json_data=payload)
+        self._check_conversation(id_conversation, json_data)
+        return json_data
+
+    @set_endpoint("chat.update")
+    async def update_slack_message(
+        self, id_conversation: str, ts: str, message: str
+    ) -> dict:
+        """Replaces the text of a message already sent"""
+        payload = {"channel": id_conversation, "ts": ts, "text": message}
+        json_data = await self._make_request("post", json_data=payload)
+        self._check_conversation(id_conversation, json_data)
+        return json_data
+
+    async def send_many(self, messages: Iterable[tuple]) -> List[SendResult]:
+        """Sends many messages concurrently.
+
+        Args:
+            messages (Iterable[tuple]): ``(id_conversation, message)`` pairs,
+            an user id as conversation sends a direct message.
+
+        Returns:
+            List[SendResult]: Result of each message, in the same order.
+        """
+        messages = list(messages)
+        responses = await asyncio.gather(
+            *(self.send_slack_message(channel, text) for channel, text in messages),
+            return_exceptions=True,
+        )
+        results = []
+        for (channel, _), response in zip(messages, responses):
+            if isinstance(response, Exception):
+                response = {"ok": False, "error": str(response)}
+            results.append(
+                SendResult(
+                    channel=channel,
+                    ok=bool(response.get("ok")),
+                    error=response.get("error"),
+                    response=response,
+                )
+            )
+        return results
@@ -1,20 +1,48 @@
+import asyncio
 import atexit
 import gc
 import os
 import signal
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import psutil
 
 bind = "0.0.0.0:8000"
 
 workers = int(os.getenv("CONCURRENCY", default=2))
-worker_class = "sync"
+threads = int(os.getenv("THREADS", default=4))
+
+# Worker profiles, selected with GUNICORN_PROFILE. The uvicorn profile serves
+# backend_test.asgi instead of backend_test.wsgi, see docker-entrypoint.sh
+#   sync: one request at a time per worker
+#   gthread: THREADS requests per worker, each thread with its own DB connection
+#   uvicorn: ASGI event loop, sync views run in a pool of THREADS threads
+WORKER_PROFILES = {
+    "sync": "sync",
+    "gthread": "gthread",
+    "uvicorn": "uvicorn.workers.UvicornWorker",
+}
+worker_profile = os.getenv("GUNICORN_PROFILE", default="sync")
+if worker_profile not in WORKER_PROFILES:
+    raise RuntimeError(
+        f"Unknown GUNICORN_PROFILE {worker_profile!r}, "
+        f"expected one of {', '.join(WORKER_PROFILES)}"
+    )
+worker_class = WORKER_PROFILES[worker_profile]
+# gunicorn only reads threads for gthread workers, the uvicorn executor is
+# sized in post_worker_init
+asgi_threads = threads
+if worker_profile != "gthread":
+    threads = 1
 
 preload_app = True
 
-timeout = 10
+# Threaded and async workers heartbeat while serving, so the timeout only
+# bounds sync workers blocked on a single request. Streaming a large menu
+# selection export takes longer, serve exports from gthread or uvicorn workers
+timeout = int(os.getenv("GUNICORN_TIMEOUT", default=10))
 graceful_timeout = 30
 
 restart_on_rss = int(os.getenv("RESTART_ON_RSS", default=500))
@@ -49,6 +77,17 @@ class MemoryWatch(threading.Thread):
 gc.disable()
 
 
+def on_starting(server):
+    # histograms of a previous run would be summed with the new workers' ones
+    from django.conf import settings
+
+    from backend_test.utils.metrics import get_histograms
+
+    get_histograms(
+        settings.LATENCY_METRICS_DIR, settings.LATENCY_METRICS_MAX_SERIES
+    ).reset()
+
+
 def when_ready(server):
     # mark preloaded app objects as uncollectable
     gc.freeze()
@@ -57,8 +96,36 @@ def when_ready(server):
     mw.start()
 
 
+def pre_fork(server, worker):
+    # connections opened while preloading the app must not be shared by the
+    # forked workers, each worker (and thread) opens its own
+    from django.db import connections
+
+    connections.close_all()
+
+
 def post_fork(server, worker):
     # reenable GC on worker
     gc.enable()
     # no final GC needed
     atexit.register(os._exit, 0)
+
+
+def child_exit(server, worker):
+    # keep the histograms of the dead worker in the archive, without its file
+    from django.conf import settings
+
+    from backend_test.utils.metrics import get_histograms
+
+    get_histograms(
+        settings.LATENCY_METRICS_DIR, settings.LATENCY_METRICS_MAX_SERIES
+    ).mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    if worker_profile == "uvicorn":
+        # sync views run in the default executor of the loop the worker is
+        # about to run, bound it so DB connections are bounded too
+        asyncio.get_event_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=asgi_threads, thread_name_prefix="asgi")
+        )
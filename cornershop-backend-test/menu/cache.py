@@ -0,0 +1,94 @@
+import hashlib
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional, Union
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.utils.cache import TieredCache
+
+ALL_DAYS = "all"
+# Time of the last menu write, replicas may lag behind it
+WRITTEN_AT_KEY = "menu:written_at"
+
+menu_cache = TieredCache(
+    timeout=settings.MENU_CACHE_TIMEOUT,
+    local_maxsize=settings.MENU_CACHE_LOCAL_MAXSIZE,
+    local_ttl=settings.MENU_CACHE_LOCAL_TTL,
+)
+
+
+def _day_key(day: Union[date, str]) -> str:
+    return day if isinstance(day, str) else day.isoformat()
+
+
+def generation_key(day: Union[date, str]) -> str:
+    return f"menu:generation:{_day_key(day)}"
+
+
+def get_generation(day: Union[date, str]) -> int:
+    """Gets the current cache generation for a day (or for all days)"""
+    return menu_cache.get(generation_key(day), 0)
+
+
+def bump_generations(*preparation_dates: Optional[datetime]) -> None:
+    """Invalidates every cached response that may contain menus prepared on
+    the given dates.
+
+    Neighbouring days are bumped too, since a day requested with a UTC offset
+    spans two UTC days.
+
+    Args:
+        preparation_dates (datetime | None): Preparation dates of the menus
+        that were written. None values are ignored.
+    """
+    days = set()
+    for preparation_date in preparation_dates:
+        if preparation_date is None:
+            continue
+        day = timezone.localtime(preparation_date).date()
+        days.update(day + timedelta(days=offset) for offset in (-1, 0, 1))
+    for day in sorted(days):
+        menu_cache.incr(generation_key(day))
+    menu_cache.incr(generation_key(ALL_DAYS))
+    menu_cache.set(WRITTEN_AT_KEY, time.time(), timeout=None)
+
+
+def replicas_caught_up() -> bool:
+    """Whether READ_REPLICA_PIN_SECONDS passed since the last menu write, so
+    responses read from a replica hold it and may be cached.
+
+    Read from the backend, the local tier of other processes may be stale.
+    """
+    written_at = menu_cache.backend.get(WRITTEN_AT_KEY, 0)
+    return time.time() - written_at >= settings.READ_REPLICA_PIN_SECONDS
+
+
+def list_key(preparation_date: Optional[datetime], variant: str) -> str:
+    """Builds the cache key of a menu listing from its normalized params.
+
+    Args:
+        preparation_date (datetime | None): Parsed preparation date filter.
+        variant (str): Every other normalized param that changes the
+        response, e.g. ordering and cursor.
+
+    Returns:
+        str: Cache key, scoped to the current generation of the day.
+    """
+    day = preparation_date.date() if preparation_date else ALL_DAYS
+    digest = hashlib.md5(variant.encode()).hexdigest()
+    return f"menu:list:{_day_key(day)}:{get_generation(day)}:{digest}"
+
+
+def detail_key(pk: str) -> str:
+    return f"menu:detail:{get_generation(ALL_DAYS)}:{pk}"
+
+
+def digest_key(day: date, channel: str) -> str:
+    """Builds the key marking the daily digest of a channel as delivered.
+
+    The key is scoped to the generation of the day, so it is missed once the
+    menus of the day change and the digest has to be updated.
+    """
+    return f"menu:digest:{_day_key(day)}:{get_generation(day)}:{channel}"
@@ -0,0 +1,89 @@
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from django.urls import reverse
+
+from core.models import Menu
+
+# Columns of each menu row, see ``MenuMessageRenderer.render``
+MENU_FIELDS = ("id", "meal_time", "main_dish", "side_dish", "dessert")
+
+HEADER_TEMPLATE = "\n        Menu de hoy {weekday}:\n"
+MEAL_TIME_TEMPLATE = "Opciones para {meal_time}:\n"
+MENU_TEMPLATE = (
+    "\tOpcion {index}:\n"
+    "        Plato fuerte o principal: {main_dish}\n"
+    "        Guarnicion: {side_dish}\n"
+    "        Postre: {dessert}\n"
+    "        Revisa este menu!: {url_prefix}{menu_id}{url_suffix}\n"
+)
+EMPTY_MESSAGE = "El dia de hoy no hay menus, una disculpa."
+FOOTER = "\nQue tengas excelente dia!"
+
+WEEKDAY_LABELS = {key: str(label).lower() for key, label in Menu.DOW_CHOICES}
+MEAL_TIME_LABELS = {key: str(label).lower() for key, label in Menu.MEAL_TIMES}
+
+_PK_PLACEHOLDER = "menu_id"
+
+
+class MenuMessageRenderer:
+    """Renders the daily menu message sent to Slack.
+
+    Everything that does not depend on a menu (site domain, detail URL,
+    labels) is resolved once when the renderer is built, so rendering is a
+    single pass over the menu rows and a single join.
+    """
+
+    def __init__(self, domain: str, now: Optional[datetime] = None):
+        now = now or datetime.now()
+        url = reverse("menu:menu-detail", args=[_PK_PLACEHOLDER])
+        path_prefix, _, url_suffix = url.rpartition(_PK_PLACEHOLDER)
+        self.url_prefix = f"https://{domain}{path_prefix}"
+        self.url_suffix = url_suffix
+        self.header = HEADER_TEMPLATE.format(weekday=WEEKDAY_LABELS[now.isoweekday()])
+
+    @classmethod
+    def for_current_site(cls, now: Optional[datetime] = None):
+        from django.contrib.sites.models import Site
+
+        return cls(Site.objects.get_current().domain, now=now)
+
+    def render(self, menus: Iterable[Tuple]) -> str:
+        """Renders the message of the menus of the day.
+
+        Args:
+            menus (Iterable[Tuple]): Menu rows with the ``MENU_FIELDS``
+            columns, e.g. ``queryset.values_list(*MENU_FIELDS)``.
+
+        Returns:
+            str: Slack message.
+        """
+        format_menu = MENU_TEMPLATE.format
+        url_prefix, url_suffix = self.url_prefix, self.url_suffix
+        # {meal_time: [rendered menu, ...]} in the order meal times appear
+        meal_time_menus = {}
+        for menu_id, meal_time, main_dish, side_dish, dessert in menus:
+            meal_menus = meal_time_menus.setdefault(meal_time, [])
+            meal_menus.append(
+                format_menu(
+                    index=len(meal_menus) + 1,
+                    main_dish=main_dish,
+                    side_dish=side_dish,
+                    dessert=dessert,
+                    url_prefix=url_prefix,
+                    menu_id=menu_id,
+                    url_suffix=url_suffix,
+                )
+            )
+
+        if not meal_time_menus:
+            return EMPTY_MESSAGE + FOOTER
+
+        parts = [self.header]
+        for meal_time, meal_menus in meal_time_menus.items():
+            parts.append(
+                MEAL_TIME_TEMPLATE.format(meal_time=MEAL_TIME_LABELS.get(meal_time, ""))
+            )
+            parts.extend(meal_menus)
+        parts.append(FOOTER)
+        return "".join(parts)
@@ -1,8 +1,21 @@
 import datetime
+from typing import Any, Dict, List, Optional
 
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
 from rest_framework import serializers
 
 from core.models import Menu
+from menu_selection import tallies
+
+
+def to_int(value: Any) -> Optional[int]:
+    """Coerce a raw payload value to int, None if it is not one"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
 
 
 class MenuSerializer(serializers.ModelSerializer):
@@ -34,3 +47,135 @@ class MenuDetailSerializer(MenuSerializer):
     """Serializer for details menu"""
 
     pass
+
+
+class MenuBulkSerializer(serializers.Serializer):
+    """Serializer to create and update many menus in a single transaction
+
+    Receives either a list of ``menus`` (rows with an ``id`` are updated) or
+    a ``template`` of menus by ``weekday`` for the week of ``week_start``.
+    """
+
+    MAX_ROWS = 500
+
+    menus = serializers.ListField(
+        child=serializers.DictField(), required=False, max_length=MAX_ROWS
+    )
+    week_start = serializers.DateField(required=False)
+    template = serializers.ListField(
+        child=serializers.DictField(), required=False, max_length=MAX_ROWS
+    )
+    skip_invalid = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        """Check that one payload style was used and expand the template"""
+        if ("menus" in data) == ("template" in data):
+            raise serializers.ValidationError(
+                _("Envia una lista de menus o un template semanal")
+            )
+        if "template" in data:
+            if "week_start" not in data:
+                raise serializers.ValidationError(
+                    {"week_start": [_("Requerido para usar un template")]}
+                )
+            data["menus"] = self.expand_template(data["week_start"], data["template"])
+        return data
+
+    def expand_template(self, week_start: datetime.date, template: List[Dict]):
+        """Set the preparation date of each template item from its weekday
+
+        Args:
+            week_start (date): Any day of the week to plan.
+            template (List[Dict]): Menus with a weekday from 1 to 7.
+
+        Returns:
+            List[Dict]: Menu rows, items with an invalid or missing weekday
+            keep it so their row reports the error.
+        """
+        monday = week_start - datetime.timedelta(days=week_start.isoweekday() - 1)
+        rows = []
+        for item in template:
+            row = dict(item)
+            weekday = to_int(row.get("weekday"))
+            if weekday in dict(Menu.DOW_CHOICES):
+                day = monday + datetime.timedelta(days=weekday - 1)
+                row["preparation_date"] = timezone.make_aware(
+                    datetime.datetime.combine(day, datetime.time.min)
+                )
+            else:
+                row["weekday"] = row.get("weekday") or ""
+            rows.append(row)
+        return rows
+
+    def validate_rows(self) -> List[Dict]:
+        """Validate every menu row in a single pass
+
+        Sets ``new_menus`` (unsaved), ``updated_menus`` and
+        ``touched_dates``, the old and new preparation dates of every menu.
+        A menu is updated by a single row, repeated ids are invalid.
+
+        Returns:
+            List[Dict]: Index and errors of every invalid row.
+        """
+        rows = self.validated_data["menus"]
+        ids = [to_int(row["id"]) for row in rows if row.get("id") is not None]
+        existing = Menu.objects.in_bulk([pk for pk in ids if pk is not None])
+        create_child = MenuSerializer(context=self.context)
+        update_child = MenuSerializer(context=self.context, partial=True)
+        now = timezone.now()
+
+        self.new_menus, self.updated_menus, self.touched_dates = [], [], []
+        errors = []
+        seen_ids = set()
+        for index, row in enumerate(rows):
+            menu = None
+            if row.get("id") is not None:
+                menu = existing.get(to_int(row["id"]))
+                if menu is None:
+                    errors.append({"index": index, "errors": {"id": [_("No existe")]}})
+                    continue
+                if menu.pk in seen_ids:
+                    errors.append({"index": index, "errors": {"id": [_("Repetido")]}})
+                    continue
+                seen_ids.add(menu.pk)
+            child = create_child if menu is None else update_child
+            try:
+                data = child.run_validation(row)
+            except serializers.ValidationError as e:
+                errors.append({"index": index, "errors": e.detail})
+                continue
+
+            if "preparation_date" in data:
+                data["weekday"] = data["preparation_date"].isoweekday()
+            if menu is None:
+                data.setdefault("preparation_date", now)
+                data.setdefault("weekday", data["preparation_date"].isoweekday())
+                menu = Menu(added_by_user=self.context["request"].user, **data)
+                self.new_menus.append(menu)
+            else:
+                self.touched_dates.append(menu.preparation_date)
+                for field, value in data.items():
+                    setattr(menu, field, value)
+                menu.modified_at = now
+                self.updated_menus.append(menu)
+            self.touched_dates.append(menu.preparation_date)
+        return errors
+
+    def save_rows(self) -> None:
+        """Write the validated menus in a single transaction"""
+        fields = [
+            field
+            for field in MenuSerializer.Meta.fields
+            if field not in MenuSerializer.Meta.read_only_fields
+        ] + ["modified_at"]
+        with transaction.atomic():
+            self.new_menus = Menu.objects.bulk_create(self.new_menus)
+            if self.updated_menus:
+                # bulk_update skips pre_save, which normalizes the values the
+                # response is serialized from
+                for menu in self.updated_menus:
+                    for field in fields:
+                        Menu._meta.get_field(field).pre_save(menu, add=False)
+                Menu.objects.bulk_update(self.updated_menus, fields)
+                # bulk_update sends no post_save signals
+                tallies.move_menus(self.updated_menus)
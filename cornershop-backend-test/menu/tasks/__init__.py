@@ -0,0 +1,7 @@
+# Binds the shared tasks to the app of backend_test, which is lazy
+from backend_test.celery import app as celery_app  # noqa: F401
+
+# Registers the shared tasks when celery autodiscovers menu.tasks
+from menu.tasks.fan_out import fan_out_todays_menu, report_fan_out, send_menu_chunk
+
+__all__ = ("fan_out_todays_menu", "send_menu_chunk", "report_fan_out")
@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import logging
+import time
+from functools import lru_cache
+from itertools import islice
+from typing import TYPE_CHECKING, Iterable, Iterator, List
+
+from celery import chord, shared_task
+from django.utils import timezone
+
+from backend_test.envtools import getenv
+from menu.tasks.send_menu import render_todays_menu
+
+if TYPE_CHECKING:
+    from core.utils.slack_client import AsyncSlackClient
+
+logger = logging.getLogger("backend_test")
+
+TOKEN = getenv("SLACK_BOT_TOKEN", default="No token")
+# Recipients per chunk task, small enough to fit the task hard time limit
+CHUNK_SIZE = getenv("MENU_FANOUT_CHUNK_SIZE", default="100", coalesce=int)
+
+
+@lru_cache(maxsize=None)
+def get_client() -> "AsyncSlackClient":
+    """One pooled client per worker process, shared by every chunk it runs
+    and built by the first one"""
+    from core.utils.slack_client import AsyncSlackClient
+
+    return AsyncSlackClient(TOKEN)
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """Splits an iterable in lists of ``size`` items, without loading it"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+@shared_task(name="fan_out_todays_menu_task")
+def fan_out_todays_menu() -> int:
+    """Sends today's menu to every employee with a Slack id as a direct
+    message.
+
+    The message is rendered once and recipients are read from the database
+    in keyset batches of ``CHUNK_SIZE``, each one sent by a
+    ``send_menu_chunk`` task of a chord whose callback reports throughput.
+
+    Returns:
+        int: Number of chunks dispatched.
+    """
+    from django.contrib.auth import get_user_model
+
+    from core.utils.pagination import keyset_batches
+
+    now = timezone.localtime()
+    message = render_todays_menu(now)
+    recipients = (
+        get_user_model()
+        .objects.filter(is_active=True)
+        .exclude(slack_id="")
+        .values("id", "slack_id")
+    )
+    header = [
+        send_menu_chunk.s(
+            now.date().isoformat(), message, [row["slack_id"] for row in batch]
+        )
+        for batch in keyset_batches(recipients, ("id",), CHUNK_SIZE)
+    ]
+    if header:
+        chord(header)(report_fan_out.s(started_at=time.time()))
+    return len(header)
+
+
+@shared_task(name="send_menu_chunk_task", ignore_result=False)
+def send_menu_chunk(day: str, message: str, slack_ids: List[str]) -> dict:
+    """Sends the menu message to a chunk of recipients.
+
+    Every delivered message is written to the ``MenuDigest`` ledger, as a
+    direct message, as soon as its batch completes, so a redelivered chunk
+    (acks are late) skips the recipients that already got it.
+
+    Args:
+        day (str): ISO date of the menu.
+        message (str): Rendered menu message.
+        slack_ids (List[str]): Slack member ids of the recipients.
+
+    Returns:
+        dict: Counts of sent, skipped and failed recipients.
+    """
+    from core.models import MenuDigest
+
+    start = time.monotonic()
+    delivered = set(
+        MenuDigest.objects.filter(
+            day=day, kind=MenuDigest.DIRECT_MESSAGE, channel__in=slack_ids
+        ).values_list("channel", flat=True)
+    )
+    pending = [slack_id for slack_id in slack_ids if slack_id not in delivered]
+    checksum = hashlib.md5(message.encode()).hexdigest()
+    sent = failed = 0
+    client = get_client()
+    # Batches of the client concurrency bound the messages resent if the
+    # worker is killed mid chunk
+    for batch in chunked(pending, client.max_concurrency):
+        results = asyncio.run(
+            client.send_many((slack_id, message) for slack_id in batch)
+        )
+        digests = [
+            MenuDigest(
+                day=day,
+                kind=MenuDigest.DIRECT_MESSAGE,
+                channel=result.channel,
+                channel_id=result.response.get("channel", result.channel),
+                ts=result.response.get("ts", ""),
+                checksum=checksum,
+            )
+            for result in results
+            if result.ok
+        ]
+        MenuDigest.objects.bulk_create(digests, ignore_conflicts=True)
+        for result in results:
+            if not result.ok:
+                logger.error(f"Menu not sent to {result.channel}: {result.error}")
+        sent += len(digests)
+        failed += len(results) - len(digests)
+
+    return {
+        "sent": sent,
+        "skipped": len(delivered),
+        "failed": failed,
+        "elapsed": time.monotonic() - start,
+    }
+
+
+@shared_task(name="report_fan_out_task")
+def report_fan_out(chunk_results: List[dict], started_at: float) -> dict:
+    """Aggregates the results of every chunk of a fan-out and logs its
+    throughput"""
+    report = {
+        key: sum(result[key] for result in chunk_results)
+        for key in ("sent", "skipped", "failed")
+    }
+    report["chunks"] = len(chunk_results)
+    report["elapsed"] = round(time.time() - started_at, 3)
+    report["messages_per_second"] = round(
+        report["sent"] / report["elapsed"] if report["elapsed"] else 0, 2
+    )
+    logger.info(
+        "Menu fan-out: {sent} sent, {skipped} skipped, {failed} failed in "
+        "{chunks} chunks, {elapsed}s ({messages_per_second} msg/s)".format(**report)
+    )
+    return report
@@ -1,13 +1,17 @@
+import hashlib
 import logging
-from collections import defaultdict
 from datetime import datetime
-from typing import List
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
-from django.urls import reverse
+from django.utils import timezone
 
 from backend_test.envtools import getenv
+from core.utils.cache import cache_lock
 from core.utils.date_utils import generate_day_range_for_date
-from core.utils.slack_client import SlackRESTClient
+
+if TYPE_CHECKING:
+    from core.utils.slack_client import SlackRESTClient
 
 logger = logging.getLogger("backend_test")
 
@@ -15,76 +19,108 @@ CONVERSATION_NAME = getenv(
     "CONVERSATION_NAME", default="cornershop-backend-test"
 ).lower()
 TOKEN = getenv("SLACK_BOT_TOKEN", default="No token")
-client = SlackRESTClient(TOKEN)
-
+# Longer than the hard time limit of the task
+DIGEST_LOCK_TIMEOUT = 60 * 3
+DIGEST_TIMEOUT = 60 * 60 * 24
 
-def detail_url(menu_id):
-    """Return menu detail URL"""
-    return reverse("menu:menu-detail", args=[menu_id])
 
+@lru_cache(maxsize=None)
+def get_client() -> "SlackRESTClient":
+    """Slack client of the process, the Slack code and requests are only
+    imported by the processes sending the digest"""
+    from core.utils.slack_client import SlackRESTClient
 
-def send_todays_menu_to_slack():
+    return SlackRESTClient(TOKEN)
 
-    from django.contrib.sites.models import Site
 
+def render_todays_menu(now: datetime) -> str:
+    """Renders the message of the menus prepared on the day of ``now``"""
     from core.models import Menu
+    from menu.renderer import MENU_FIELDS, MenuMessageRenderer
 
-    # Retrieve menus for today
-    try:
-        now = datetime.now()
-        gte, lte = generate_day_range_for_date(now)
-        menus_found = Menu.objects.filter(
+    gte, lte = generate_day_range_for_date(now)
+    menus_found = (
+        Menu.objects.filter(
             preparation_date__gte=gte,
             preparation_date__lte=lte,
         )
+        .order_by("meal_time", "id")
+        .values_list(*MENU_FIELDS)
+    )
+    return MenuMessageRenderer.for_current_site(now=now).render(menus_found)
+
+
+def deliver_digest(now: datetime) -> bool:
+    """Posts today's menu digest, or updates the message already posted if
+    its content changed. The send ledger is the source of truth.
+
+    Args:
+        now (datetime): Aware datetime of the run.
+
+    Returns:
+        bool: Whether the channel shows the current digest.
+    """
+    from core.models import MenuDigest
 
-        def get_menu_message(menus: List[Menu]):
-            """Function that will create message from the menus"""
-            # Set weekday name
-            weekday_name = ""
-            output_message = """
-        Menu de hoy %s:\n"""
-            weekday_name = Menu.get_human_readable_value(
-                now.isoweekday(), "DOW_CHOICES"
-            ).lower()
-            output_message = output_message.replace("%s", weekday_name)
-
-            # Store the meal time keys and menus
-            # {
-            #     'Opcion para {meal_time_name}': ['Menu1', 'Menu2']
-            # }
-            meal_time_menus = defaultdict(list)
-            for menu in menus:
-                # Get name of meal instead of 1, 2, 3, etc.
-                meal_time_name = Menu.get_human_readable_value(
-                    menu.meal_time, "MEAL_TIMES"
-                ).lower()
-                meal_message = f"Opciones para {meal_time_name}"
-                menu_url = detail_url(menu.id)
-                site_url = Site.objects.get_current().domain
-                full_url = "https://%s%s" % (site_url, menu_url)
-                # Build menu string
-                menu_string = str(menu)
-                menu_string += f"Revisa este menu!: {full_url}"
-                meal_time_menus[meal_message].append(menu_string)
-
-            # Parse the menu options string
-            for meal_message, meal_menus in meal_time_menus.items():
-                output_message += f"{meal_message}:\n"
-                for i, meal_menu in enumerate(meal_menus, 1):
-                    meal_menu = meal_menu.replace("%s", str(i))
-                    output_message += f"\t{meal_menu}\n"
-            return output_message
-
-        if len(menus_found) > 0:
-
-            output_message = get_menu_message(menus_found)
-        else:
-            output_message = "El dia de hoy no hay menus, una disculpa."
-        output_message += "\nQue tengas excelente dia!"
-        logger.info(str(output_message))
+    output_message = render_todays_menu(now)
+    checksum = hashlib.md5(output_message.encode()).hexdigest()
+
+    digest = MenuDigest.objects.filter(
+        day=now.date(), kind=MenuDigest.CHANNEL, channel=CONVERSATION_NAME
+    ).first()
+    if digest is not None and digest.checksum == checksum:
+        return True
+
+    logger.info(output_message)
+    client = get_client()
+    if digest is None:
         # Send message to slack
         conversation_id = client.get_slack_conversation(CONVERSATION_NAME)
-        client.send_slack_message(conversation_id, output_message)
-    except Exception as e:
-        logger.error(str(e))
+        json_data = client.send_slack_message(conversation_id, output_message)
+        if not json_data.get("ok"):
+            logger.error(f"Menu digest not sent: {json_data.get('error')}")
+            return False
+        MenuDigest.objects.create(
+            day=now.date(),
+            kind=MenuDigest.CHANNEL,
+            channel=CONVERSATION_NAME,
+            channel_id=json_data["channel"],
+            ts=json_data["ts"],
+            checksum=checksum,
+        )
+    else:
+        json_data = client.update_slack_message(
+            digest.channel_id, digest.ts, output_message
+        )
+        if not json_data.get("ok"):
+            logger.error(f"Menu digest not updated: {json_data.get('error')}")
+            return False
+        digest.checksum = checksum
+        digest.save(update_fields=["checksum", "modified_at"])
+    return True
+
+
+def send_todays_menu_to_slack():
+    """Delivers today's menu digest exactly once per day and channel.
+
+    Once delivered, runs only cost a cache lookup until the menus of the day
+    change, then the posted message is updated. Concurrent runs are
+    serialized with a cache lock so beat or worker replicas do not post twice.
+    """
+    from menu import cache
+
+    now = timezone.localtime()
+    delivered_key = cache.digest_key(now.date(), CONVERSATION_NAME)
+    if cache.menu_cache.get(delivered_key):
+        return
+
+    lock_key = f"lock:menu:digest:{now.date().isoformat()}:{CONVERSATION_NAME}"
+    with cache_lock(lock_key, timeout=DIGEST_LOCK_TIMEOUT) as acquired:
+        if not acquired:
+            logger.info("Menu digest is being delivered by another worker")
+            return
+        try:
+            if deliver_digest(now):
+                cache.menu_cache.set(delivered_key, True, timeout=DIGEST_TIMEOUT)
+        except Exception as e:
+            logger.error(str(e))
@@ -0,0 +1,157 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from core.models import MenuDigest
+from core.tests.slack_stub import StubSlackServer
+from core.utils.slack_client import AsyncSlackClient
+from menu.tasks.fan_out import (
+    chunked,
+    fan_out_todays_menu,
+    report_fan_out,
+    send_menu_chunk,
+)
+
+DAY = "2021-07-12"
+
+
+class FanOutTests(TestCase):
+    """Test the coordinator of the per employee menu fan-out"""
+
+    def test_chunked(self):
+        """Test that iterables are split in fixed size lists"""
+        self.assertEqual(list(chunked(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(chunked([], 2)), [])
+
+    @mock.patch("menu.tasks.fan_out.CHUNK_SIZE", 2)
+    @mock.patch("menu.tasks.fan_out.chord")
+    def test_dispatches_chunks_of_recipients(self, chord_mock):
+        """Test that active users with a Slack id are sent in chunks"""
+        for i in range(5):
+            get_user_model().objects.create_user(f"user{i}", slack_id=f"U{i}")
+        get_user_model().objects.create_user("noslack")
+        get_user_model().objects.create_user("inactive", slack_id="UX", is_active=False)
+
+        self.assertEqual(fan_out_todays_menu(), 3)
+
+        header = chord_mock.call_args.args[0]
+        self.assertEqual(
+            [signature.args[2] for signature in header],
+            [["U0", "U1"], ["U2", "U3"], ["U4"]],
+        )
+        self.assertEqual(len({signature.args[1] for signature in header}), 1)
+        callback = chord_mock.return_value.call_args.args[0]
+        self.assertEqual(callback.task, "report_fan_out_task")
+
+    @mock.patch("menu.tasks.fan_out.chord")
+    def test_no_recipients(self, chord_mock):
+        """Test that nothing is dispatched without recipients"""
+        self.assertEqual(fan_out_todays_menu(), 0)
+        chord_mock.assert_not_called()
+
+
+class SendMenuChunkTests(TestCase):
+    """Test the chunk task of the per employee menu fan-out"""
+
+    def setUp(self):
+        self.server = StubSlackServer().__enter__()
+        self.addCleanup(self.server.__exit__)
+        client = AsyncSlackClient(
+            "token", base_url=self.server.base_url, max_concurrency=2
+        )
+        self.addCleanup(client.close)
+        patcher = mock.patch("menu.tasks.fan_out.get_client", return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sends_and_records_every_recipient(self):
+        """Test that each recipient gets the message and a ledger row"""
+        for slack_id in ("U1", "U2", "U3"):
+            self.server.add_response(
+                "chat.postMessage", {"ok": True, "channel": f"D{slack_id}", "ts": "1"}
+            )
+
+        result = send_menu_chunk(DAY, "Hola", ["U1", "U2", "U3"])
+
+        self.assertEqual(result["sent"], 3)
+        self.assertEqual(
+            sorted(call["json"]["channel"] for call in self.server.calls),
+            ["U1", "U2", "U3"],
+        )
+        self.assertEqual(
+            sorted(
+                MenuDigest.objects.filter(
+                    day=DAY, kind=MenuDigest.DIRECT_MESSAGE
+                ).values_list("channel", flat=True)
+            ),
+            ["U1", "U2", "U3"],
+        )
+
+    def test_resumes_where_it_stopped(self):
+        """Test that a redelivered chunk skips recipients already served"""
+        MenuDigest.objects.create(
+            day=DAY,
+            kind=MenuDigest.DIRECT_MESSAGE,
+            channel="U1",
+            channel_id="DU1",
+            ts="1",
+            checksum="",
+        )
+
+        result = send_menu_chunk(DAY, "Hola", ["U1", "U2"])
+
+        self.assertEqual(result["skipped"], 1)
+        self.assertEqual(result["sent"], 1)
+        self.assertEqual(
+            [call["json"]["channel"] for call in self.server.calls], ["U2"]
+        )
+
+    def test_channel_digests_are_not_direct_messages(self):
+        """Test that a channel digest named like a recipient does not skip
+        the direct message"""
+        MenuDigest.objects.create(
+            day=DAY, channel="U1", channel_id="C1", ts="1", checksum=""
+        )
+
+        result = send_menu_chunk(DAY, "Hola", ["U1"])
+
+        self.assertEqual((result["sent"], result["skipped"]), (1, 0))
+        self.assertEqual(MenuDigest.objects.filter(channel="U1").count(), 2)
+
+    def test_failed_recipients_are_not_recorded(self):
+        """Test that failed messages are retried by the next run"""
+        self.server.add_response(
+            "chat.postMessage", {"ok": False, "error": "user_not_found"}
+        )
+
+        result = send_menu_chunk(DAY, "Hola", ["U1"])
+
+        self.assertEqual((result["sent"], result["failed"]), (0, 1))
+        self.assertFalse(MenuDigest.objects.exists())
+
+
+class ReportFanOutTests(TestCase):
+    """Test the throughput report of the per employee menu fan-out"""
+
+    @mock.patch("menu.tasks.fan_out.time.time", return_value=110)
+    def test_aggregates_chunk_results(self, time_mock):
+        """Test that chunk counts are added up and throughput computed"""
+        chunk_results = [
+            {"sent": 100, "skipped": 0, "failed": 2, "elapsed": 4.0},
+            {"sent": 98, "skipped": 2, "failed": 0, "elapsed": 5.0},
+        ]
+
+        report = report_fan_out(chunk_results, started_at=100)
+
+        self.assertEqual(
+            report,
+            {
+                "sent": 198,
+                "skipped": 2,
+                "failed": 2,
+                "chunks": 2,
+                "elapsed": 10,
+                "messages_per_second": 19.8,
+            },
+        )
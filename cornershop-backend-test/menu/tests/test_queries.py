@@ -0,0 +1,42 @@
+import pytest
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core.models import Menu
+from menu.cache import menu_cache
+
+MENU_URL = reverse("menu:menu-list")
+
+
+@pytest.fixture
+def staff_user(django_user_model):
+    return django_user_model.objects.create_superuser("querystaff", "test123.@1")
+
+
+def add_menus(user, count=3):
+    """Return a callable adding menus and dropping the cached listings"""
+
+    def _add_menus():
+        Menu.objects.bulk_create(
+            Menu(added_by_user=user, main_dish="Main", side_dish="Side", dessert="Cake")
+            for _ in range(count)
+        )
+        menu_cache.clear()
+
+    return _add_menus
+
+
+@pytest.mark.django_db
+def test_menu_list_anonymous(api_client, staff_user, assert_list_queries):
+    """Validators aggregate and page query"""
+    assert_list_queries(api_client, MENU_URL, add_menus(staff_user), expected=2)
+
+
+@pytest.mark.django_db
+def test_menu_list_token_authenticated(api_client, staff_user, assert_list_queries):
+    """Validators aggregate and page query, the token is cached"""
+    token = Token.objects.create(user=staff_user)
+    api_client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    api_client.get(MENU_URL)
+
+    assert_list_queries(api_client, MENU_URL, add_menus(staff_user), expected=2)
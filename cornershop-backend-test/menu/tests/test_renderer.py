@@ -0,0 +1,79 @@
+import timeit
+from datetime import datetime
+
+import pytest
+from django.test import TestCase
+
+from menu.renderer import MENU_FIELDS, MenuMessageRenderer
+
+BENCHMARK_MENUS = 1_000
+# Generous budget for a single render of BENCHMARK_MENUS menus on a CI box
+BENCHMARK_BUDGET = 0.05
+
+
+class MenuMessageRendererTests(TestCase):
+    """Test the daily menu message renderer"""
+
+    def setUp(self):
+        # 2021-07-12 is a Monday
+        self.renderer = MenuMessageRenderer("example.com", now=datetime(2021, 7, 12))
+
+    def test_render_groups_by_meal_time(self):
+        """Test that menus are numbered within their meal time"""
+        menus = [
+            (1, 2, "Cazuela", "Arroz", "Flan"),
+            (2, 1, "Huevos", "Pan", "Fruta"),
+            (3, 2, "Pastel de choclo", "Ensalada", "Mote con huesillo"),
+        ]
+
+        message = self.renderer.render(menus)
+
+        self.assertEqual(
+            message,
+            "\n        Menu de hoy lunes:\n"
+            "Opciones para comida:\n"
+            "\tOpcion 1:\n"
+            "        Plato fuerte o principal: Cazuela\n"
+            "        Guarnicion: Arroz\n"
+            "        Postre: Flan\n"
+            "        Revisa este menu!: https://example.com/api/menu/menu/1/\n"
+            "\tOpcion 2:\n"
+            "        Plato fuerte o principal: Pastel de choclo\n"
+            "        Guarnicion: Ensalada\n"
+            "        Postre: Mote con huesillo\n"
+            "        Revisa este menu!: https://example.com/api/menu/menu/3/\n"
+            "Opciones para desayuno:\n"
+            "\tOpcion 1:\n"
+            "        Plato fuerte o principal: Huevos\n"
+            "        Guarnicion: Pan\n"
+            "        Postre: Fruta\n"
+            "        Revisa este menu!: https://example.com/api/menu/menu/2/\n"
+            "\nQue tengas excelente dia!",
+        )
+
+    def test_dish_text_is_not_interpolated(self):
+        """Test that placeholders typed in dishes are rendered verbatim"""
+        message = self.renderer.render([(1, 2, "Plato %s", "{index}", "Postre")])
+
+        self.assertIn("Plato fuerte o principal: Plato %s\n", message)
+        self.assertIn("Guarnicion: {index}\n", message)
+
+    def test_render_without_menus(self):
+        """Test the message of a day without menus"""
+        self.assertEqual(
+            self.renderer.render([]),
+            "El dia de hoy no hay menus, una disculpa.\nQue tengas excelente dia!",
+        )
+
+    @pytest.mark.slow
+    def test_render_benchmark(self):
+        """Benchmark rendering the message of 1k menus"""
+        menus = [
+            (i, i % 4 + 1, f"Main {i}", f"Side {i}", f"Dessert {i}")
+            for i in range(BENCHMARK_MENUS)
+        ]
+        self.assertEqual(len(MENU_FIELDS), len(menus[0]))
+
+        best = min(timeit.repeat(lambda: self.renderer.render(menus), number=1))
+
+        self.assertLess(best, BENCHMARK_BUDGET, f"rendered in {best * 1000:.2f}ms")
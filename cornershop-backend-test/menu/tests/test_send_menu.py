@@ -0,0 +1,109 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Menu, MenuDigest
+from core.utils.cache import cache_lock
+from menu import cache
+from menu.tasks.send_menu import CONVERSATION_NAME, send_todays_menu_to_slack
+
+
+class SendTodaysMenuTests(TestCase):
+    """Test the exactly-once delivery of the daily menu digest"""
+
+    def setUp(self):
+        cache.menu_cache.clear()
+        self.user = get_user_model().objects.create_superuser("staff", "test123")
+        self.menu = self.create_menu("cazuela")
+        patcher = mock.patch("menu.tasks.send_menu.get_client")
+        self.client_mock = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.client_mock.get_slack_conversation.return_value = "id_channel"
+        self.client_mock.send_slack_message.return_value = {
+            "ok": True,
+            "channel": "id_channel",
+            "ts": "1626085800.000100",
+        }
+        self.client_mock.update_slack_message.return_value = {"ok": True}
+
+    def create_menu(self, main_dish, **params):
+        menu = Menu.objects.create(
+            main_dish=main_dish,
+            side_dish="arroz",
+            dessert="flan",
+            preparation_date=timezone.now(),
+            added_by_user=self.user,
+            **params,
+        )
+        cache.bump_generations(menu.preparation_date)
+        return menu
+
+    def test_sends_rendered_message(self):
+        """Test that today's menus are rendered and sent to the conversation"""
+        send_todays_menu_to_slack()
+
+        conversation_id, message = self.client_mock.send_slack_message.call_args.args
+        self.assertEqual(conversation_id, "id_channel")
+        self.assertIn("Plato fuerte o principal: Cazuela\n", message)
+        self.assertIn(f"/api/menu/menu/{self.menu.id}/\n", message)
+        digest = MenuDigest.objects.get()
+        self.assertEqual(digest.channel, CONVERSATION_NAME)
+        self.assertEqual(digest.day, timezone.localdate())
+        self.assertEqual(digest.ts, "1626085800.000100")
+
+    def test_delivered_digest_short_circuits(self):
+        """Test that runs after the delivery only look up the cache"""
+        send_todays_menu_to_slack()
+
+        with self.assertNumQueries(0):
+            send_todays_menu_to_slack()
+        self.client_mock.send_slack_message.assert_called_once()
+
+    def test_changed_menus_update_the_message(self):
+        """Test that the posted message is updated instead of posted again"""
+        send_todays_menu_to_slack()
+        sent_checksum = MenuDigest.objects.get().checksum
+        self.create_menu("porotos")
+
+        send_todays_menu_to_slack()
+
+        self.client_mock.send_slack_message.assert_called_once()
+        channel_id, ts, message = self.client_mock.update_slack_message.call_args.args
+        self.assertEqual((channel_id, ts), ("id_channel", "1626085800.000100"))
+        self.assertIn("Porotos", message)
+        self.assertNotEqual(MenuDigest.objects.get().checksum, sent_checksum)
+
+    def test_unchanged_message_is_not_updated(self):
+        """Test that invalidations not changing the digest skip Slack"""
+        send_todays_menu_to_slack()
+        cache.bump_generations(timezone.now())
+
+        send_todays_menu_to_slack()
+
+        self.client_mock.send_slack_message.assert_called_once()
+        self.client_mock.update_slack_message.assert_not_called()
+
+    def test_concurrent_run_does_not_send(self):
+        """Test that a run is skipped while another one holds the lock"""
+        lock_key = f"lock:menu:digest:{timezone.localdate()}:{CONVERSATION_NAME}"
+
+        with cache_lock(lock_key, timeout=60):
+            send_todays_menu_to_slack()
+
+        self.client_mock.send_slack_message.assert_not_called()
+        self.assertFalse(MenuDigest.objects.exists())
+
+    def test_failed_send_is_retried(self):
+        """Test that a digest Slack rejected is sent again on the next run"""
+        self.client_mock.send_slack_message.return_value = {
+            "ok": False,
+            "error": "channel_not_found",
+        }
+        send_todays_menu_to_slack()
+        self.assertFalse(MenuDigest.objects.exists())
+
+        send_todays_menu_to_slack()
+
+        self.assertEqual(self.client_mock.send_slack_message.call_count, 2)
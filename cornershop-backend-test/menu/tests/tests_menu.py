@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.urls import reverse
@@ -9,9 +11,11 @@ from dateutil import parser
 
 from core.models import Menu
 from core.utils.date_utils import generate_day_range_for_date, is_between
+from menu.cache import menu_cache
 from menu.serializers import MenuDetailSerializer, MenuSerializer
 
 MENU_URL = reverse("menu:menu-list")
+BULK_URL = reverse("menu:menu-bulk")
 
 
 def create_user(**kwargs):
@@ -43,6 +47,7 @@ class PublicMenuAPITests(TestCase):
     """Test API requests for menus that do not require authentication"""
 
     def setUp(self):
+        menu_cache.clear()
         self.client = APIClient()
 
     def test_retrieve_user_unauthorized(self):
@@ -56,6 +61,7 @@ class PrivateMenuAPITests(TestCase):
     """Test API requests for menu that require authentication"""
 
     def setUp(self):
+        menu_cache.clear()
         self.user_payload = {
             "username": "supertestuser30",
             "password": "test123.@1",
@@ -87,7 +93,7 @@ class PrivateMenuAPITests(TestCase):
         menus = Menu.objects.all()
         serializer = MenuSerializer(menus, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_menus_not_limited_to_user(self):
         """Test retrieving created menus available to all users and non users"""
@@ -98,7 +104,7 @@ class PrivateMenuAPITests(TestCase):
         res = self.client.get(MENU_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 2)
+        self.assertEqual(len(res.data["results"]), 2)
 
     def test_creating_a_menu(self):
         """Test creating a new menu and checking the generated fields"""
@@ -152,6 +158,376 @@ class PrivateMenuAPITests(TestCase):
 
         res = self.client.get(MENU_URL)
 
-        for menu in res.data:
+        for menu in res.data["results"]:
             self.assertEqual(menu["weekday"], weekday)
             self.assertTrue(is_between(preparation_date, lte, gte))
+
+
+class MenuCacheTests(TestCase):
+    """Test the menu response cache"""
+
+    def setUp(self):
+        menu_cache.clear()
+        self.user = create_staff_user(username="cachestaff", password="test123.@1")
+        self.client = APIClient()
+
+    def test_cached_list_does_not_query_database(self):
+        """Test that a repeated listing is served without queries"""
+        sample_menu(user=self.user)
+        self.client.get(MENU_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(MENU_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_cached_detail_does_not_query_database(self):
+        """Test that a repeated detail is served without queries"""
+        menu = sample_menu(user=self.user)
+        self.client.get(detail_url(menu.id))
+
+        with self.assertNumQueries(0):
+            res = self.client.get(detail_url(menu.id))
+
+        self.assertEqual(res.data, MenuDetailSerializer(menu).data)
+
+    def test_list_cache_key_is_normalized(self):
+        """Test that equivalent query params share the same cache entry"""
+        today = timezone.now().date().isoformat()
+        self.client.get(MENU_URL, {"preparation_date": today, "sort": "DESC"})
+
+        with self.assertNumQueries(0):
+            self.client.get(
+                MENU_URL,
+                {
+                    "preparation_date": today,
+                    "sort": "desc",
+                    "order_by": "preparation_date",
+                },
+            )
+
+    def test_invalid_preparation_date(self):
+        """Test that an unparseable preparation date is a bad request"""
+        res = self.client.get(MENU_URL, {"preparation_date": "not a date"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_writes_invalidate_cache(self):
+        """Test that creating, updating and deleting menus invalidates the cache"""
+        self.client.force_authenticate(user=self.user)
+        today = timezone.now().date().isoformat()
+        payload = {
+            "main_dish": "Sample dish",
+            "side_dish": "Side sample",
+            "dessert": "Cake",
+            "preparation_date": timezone.now().isoformat(),
+        }
+        self.assertEqual(len(self.client.get(MENU_URL).data["results"]), 0)
+        res = self.client.get(MENU_URL, {"preparation_date": today})
+        self.assertEqual(len(res.data["results"]), 0)
+
+        menu_id = self.client.post(MENU_URL, payload).data["id"]
+        self.assertEqual(len(self.client.get(MENU_URL).data["results"]), 1)
+        res = self.client.get(MENU_URL, {"preparation_date": today})
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(res.data["results"][0]["main_dish"], "Sample dish")
+
+        self.client.get(detail_url(menu_id))
+        self.client.patch(detail_url(menu_id), {"main_dish": "New main"})
+        res = self.client.get(detail_url(menu_id))
+        self.assertEqual(res.data["main_dish"], "New main")
+        res = self.client.get(MENU_URL, {"preparation_date": today})
+        self.assertEqual(res.data["results"][0]["main_dish"], "New main")
+
+        self.client.delete(detail_url(menu_id))
+        self.assertEqual(len(self.client.get(MENU_URL).data["results"]), 0)
+        res = self.client.get(detail_url(menu_id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MenuConditionalGetTests(TestCase):
+    """Test ETag and Last-Modified support of the menu endpoints"""
+
+    def setUp(self):
+        menu_cache.clear()
+        self.user = create_staff_user(username="etagstaff", password="test123.@1")
+        self.menu = sample_menu(user=self.user)
+        self.client = APIClient()
+
+    def test_responses_carry_validators(self):
+        """Test that list and detail responses have validators and are not
+        marked as never cache"""
+        for url in (MENU_URL, detail_url(self.menu.id)):
+            res = self.client.get(url)
+
+            self.assertTrue(res.has_header("ETag"))
+            self.assertTrue(res.has_header("Last-Modified"))
+            self.assertIn("no-cache", res["Cache-Control"])
+            self.assertNotIn("no-store", res["Cache-Control"])
+
+    def test_if_none_match_returns_not_modified(self):
+        """Test that a matching ETag answers 304 with a single query"""
+        for url in (MENU_URL, detail_url(self.menu.id)):
+            etag = self.client.get(url)["ETag"]
+            menu_cache.clear()
+
+            with self.assertNumQueries(1):
+                res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+            self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(res["ETag"], etag)
+            self.assertEqual(res.content, b"")
+
+    def test_if_none_match_of_missing_menu(self):
+        """Test that a menu that does not exist is not found, even when the
+        ETag of an empty listing is sent"""
+        res = self.client.get(
+            detail_url(self.menu.id + 1), HTTP_IF_NONE_MATCH='"empty"'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_if_none_match_from_cache(self):
+        """Test that a matching ETag is answered from the cache without queries"""
+        etag = self.client.get(MENU_URL)["ETag"]
+
+        with self.assertNumQueries(0):
+            res = self.client.get(MENU_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_if_modified_since_returns_not_modified(self):
+        """Test that an up to date Last-Modified answers 304"""
+        last_modified = self.client.get(MENU_URL)["Last-Modified"]
+        menu_cache.clear()
+
+        res = self.client.get(MENU_URL, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_changes_invalidate_etag(self):
+        """Test that modifying or deleting menus changes the ETag"""
+        etag = self.client.get(MENU_URL)["ETag"]
+        self.client.force_authenticate(user=self.user)
+        self.client.patch(detail_url(self.menu.id), {"main_dish": "New main"})
+
+        res = self.client.get(MENU_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+        self.assertEqual(res.data["results"][0]["main_dish"], "New main")
+
+        etag = res["ETag"]
+        other_menu = sample_menu(user=self.user)
+        self.client.delete(detail_url(other_menu.id))
+        res = self.client.get(MENU_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.delete(detail_url(self.menu.id))
+        res = self.client.get(MENU_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"], [])
+
+
+class MenuPaginationTests(TestCase):
+    """Test the cursor pagination of the menu listing"""
+
+    def setUp(self):
+        menu_cache.clear()
+        self.user = create_staff_user(username="pagestaff", password="test123.@1")
+        self.client = APIClient()
+        now = timezone.now()
+        self.menus = [
+            sample_menu(user=self.user, preparation_date=now + timedelta(hours=i))
+            for i in range(5)
+        ]
+
+    def test_pages_follow_cursor(self):
+        """Test that following the next links returns every menu once in order"""
+        ids = []
+        res = self.client.get(MENU_URL, {"page_size": 2})
+        while True:
+            self.assertLessEqual(len(res.data["results"]), 2)
+            ids.extend(menu["id"] for menu in res.data["results"])
+            if not res.data["next"]:
+                break
+            res = self.client.get(res.data["next"])
+
+        self.assertEqual(ids, [menu.id for menu in self.menus])
+
+    def test_descending_sort(self):
+        """Test that sort=desc reverses the ordering"""
+        res = self.client.get(
+            MENU_URL, {"order_by": "preparation_date", "sort": "desc"}
+        )
+
+        ids = [menu["id"] for menu in res.data["results"]]
+        self.assertEqual(ids, [menu.id for menu in reversed(self.menus)])
+
+    def test_page_size_is_bounded(self):
+        """Test that the page size can not exceed the maximum"""
+        res = self.client.get(MENU_URL, {"page_size": 10_000})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("next", res.data)
+
+    def test_non_whitelisted_ordering(self):
+        """Test that orderings without an index behind them are rejected"""
+        res = self.client.get(MENU_URL, {"order_by": "main_dish"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("order_by", res.data)
+
+
+class MenuBulkAPITests(TestCase):
+    """Test creating and updating menus in bulk"""
+
+    def setUp(self):
+        menu_cache.clear()
+        self.user = create_staff_user(username="bulkstaff", password="test123.@1")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_bulk_requires_staff(self):
+        """Test that only staff can create menus in bulk"""
+        user = create_user(username="bulkuser", password="test123.@1")
+        self.client.force_authenticate(user=user)
+
+        res = self.client.post(BULK_URL, {"menus": []}, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_create_and_update(self):
+        """Test that new rows are created and rows with id are updated"""
+        menu = sample_menu(user=self.user)
+        preparation_date = timezone.now() + timedelta(days=1)
+        payload = {
+            "menus": [
+                {
+                    "main_dish": "pollo",
+                    "side_dish": "arroz",
+                    "dessert": "flan",
+                    "preparation_date": preparation_date.isoformat(),
+                    "meal_time": 1,
+                },
+                {"id": menu.id, "main_dish": "new main"},
+            ]
+        }
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data["created"]), 1)
+        self.assertEqual(len(res.data["updated"]), 1)
+        # The response holds the saved values
+        self.assertEqual(res.data["created"][0]["main_dish"], "Pollo")
+        self.assertEqual(res.data["updated"][0]["main_dish"], "New main")
+        created = Menu.objects.get(main_dish="Pollo")
+        self.assertEqual(created.weekday, preparation_date.isoweekday())
+        self.assertEqual(created.added_by_user, self.user)
+        menu.refresh_from_db()
+        self.assertEqual(menu.main_dish, "New main")
+
+    def test_bulk_invalid_rows_abort(self):
+        """Test that an invalid row aborts the whole request by default"""
+        payload = {
+            "menus": [
+                {"main_dish": "pollo", "side_dish": "arroz", "dessert": "flan"},
+                {"main_dish": "pollo", "meal_time": 9},
+                {"id": 999999, "main_dish": "New main"},
+            ]
+        }
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error["index"] for error in res.data["errors"]], [1, 2])
+        self.assertIn("meal_time", res.data["errors"][0]["errors"])
+        self.assertFalse(Menu.objects.exists())
+
+    def test_bulk_repeated_ids(self):
+        """Test that a menu can only be updated by one row"""
+        menu = sample_menu(user=self.user)
+        payload = {
+            "menus": [
+                {"id": menu.id, "main_dish": "First"},
+                {"id": menu.id, "main_dish": "Second"},
+            ]
+        }
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["errors"][0]["index"], 1)
+        self.assertIn("id", res.data["errors"][0]["errors"])
+        menu.refresh_from_db()
+        self.assertEqual(menu.main_dish, "Sample dish")
+
+    def test_bulk_skip_invalid_rows(self):
+        """Test that valid rows are written when skip_invalid is set"""
+        payload = {
+            "skip_invalid": True,
+            "menus": [
+                {"main_dish": "pollo", "side_dish": "arroz", "dessert": "flan"},
+                {"main_dish": "pollo", "meal_time": 9},
+            ],
+        }
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data["created"]), 1)
+        self.assertEqual(res.data["errors"][0]["index"], 1)
+        self.assertEqual(Menu.objects.count(), 1)
+
+    def test_bulk_week_template(self):
+        """Test that a week template creates a menu per weekday of the week"""
+        payload = {
+            "week_start": "2021-07-14",
+            "template": [
+                {"weekday": day, "main_dish": "a", "side_dish": "b", "dessert": "c"}
+                for day in range(1, 6)
+            ],
+        }
+        invalid = {"main_dish": "a", "side_dish": "b", "dessert": "c"}
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        dates = Menu.objects.order_by("preparation_date").values_list(
+            "preparation_date", "weekday"
+        )
+        self.assertEqual(
+            [(date.date().isoformat(), weekday) for date, weekday in dates],
+            [
+                ("2021-07-12", 1),
+                ("2021-07-13", 2),
+                ("2021-07-14", 3),
+                ("2021-07-15", 4),
+                ("2021-07-16", 5),
+            ],
+        )
+
+        payload["template"] = [invalid]
+        res = self.client.post(BULK_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("weekday", res.data["errors"][0]["errors"])
+
+    def test_bulk_requires_one_payload_style(self):
+        """Test that menus and a template can not be mixed"""
+        payload = {"menus": [], "week_start": "2021-07-14", "template": []}
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_invalidates_cache(self):
+        """Test that bulk writes are visible in cached listings"""
+        self.client.get(MENU_URL)
+        payload = {
+            "menus": [{"main_dish": "pollo", "side_dish": "arroz", "dessert": "flan"}]
+        }
+
+        self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(len(self.client.get(MENU_URL).data["results"]), 1)
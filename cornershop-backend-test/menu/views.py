@@ -1,10 +1,23 @@
-from rest_framework import viewsets
-from rest_framework.authentication import TokenAuthentication
+import hashlib
+
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import SAFE_METHODS, BasePermission
+from rest_framework.response import Response
 
+from backend_test.utils.replicas import ReplicaReadMixin, reads_from_replica
 from core.models import Menu
-from core.utils.date_utils import generate_day_range_for_date
-from menu.serializers import MenuDetailSerializer, MenuSerializer
+from core.utils.authentication import CachedTokenAuthentication
+from core.utils.date_utils import generate_day_range_for_date, parse_aware_datetime
+from core.utils.pagination import WhitelistedCursorPagination
+from menu import cache
+from menu.serializers import MenuBulkSerializer, MenuDetailSerializer, MenuSerializer
 
 
 class IsAuthenticatedStaffOrReadOnly(BasePermission):
@@ -19,20 +32,42 @@ class IsAuthenticatedStaffOrReadOnly(BasePermission):
         )
 
 
-class MenuViewSet(viewsets.ModelViewSet):
-    """Manage menus in the database"""
+class MenuPagination(WhitelistedCursorPagination):
+    """Keyset pagination over the indexed menu orderings"""
+
+    orderings = {
+        "preparation_date": ("preparation_date", "id"),
+        "id": ("id",),
+    }
+    default_order_by = "preparation_date"
+
+
+class MenuViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
+    """Manage menus in the database, listed and retrieved from a read replica"""
 
     queryset = Menu.objects.all()
     serializer_class = MenuSerializer
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticatedStaffOrReadOnly,)
+    pagination_class = MenuPagination
+
+    def get_list_params(self):
+        """Return the normalized preparation date and ordering of the request"""
+        preparation_date = self.request.query_params.get("preparation_date")
+
+        if preparation_date:
+            try:
+                preparation_date = parse_aware_datetime(preparation_date)
+            except ValueError:
+                raise ValidationError(
+                    {"preparation_date": [_("Fecha de preparacion invalida")]}
+                )
+
+        return preparation_date or None, self.paginator.get_ordering(self.request)
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
-        preparation_date = self.request.query_params.get("preparation_date")
-        order_by = self.request.query_params.get("order_by") or "weekday"
-        sort = self.request.query_params.get("sort") or ""
-        sort = "-" if sort == "desc" else ""
+        preparation_date, ordering = self.get_list_params()
 
         if preparation_date:
             gte, lte = generate_day_range_for_date(preparation_date)
@@ -41,7 +76,128 @@ class MenuViewSet(viewsets.ModelViewSet):
                 preparation_date__lte=lte,
             )
 
-        return self.queryset.order_by(f"{sort}{order_by}")
+        return self.queryset.order_by(*ordering)
+
+    def get_list_cache_key(self):
+        """Return the menu cache key of the requested listing page"""
+        preparation_date, ordering = self.get_list_params()
+        query_params = self.request.query_params
+        # Pagination links are absolute, so the host is part of the key
+        variant = "|".join(
+            (
+                self.request.get_host(),
+                ",".join(ordering),
+                query_params.get(self.paginator.cursor_query_param, ""),
+                str(self.paginator.get_page_size(self.request)),
+            )
+        )
+        return cache.list_key(preparation_date, variant)
+
+    def get_validators(self, queryset):
+        """Return the ETag and Last-Modified timestamp of a queryset
+
+        Both are derived from a single aggregate query, the count covers
+        deletions that do not move the latest modification date.
+        """
+        aggregate = queryset.aggregate(
+            last_modified=Max("modified_at"), count=Count("id")
+        )
+        last_modified = aggregate["last_modified"]
+        if last_modified is None:
+            return quote_etag("empty"), None
+        digest = hashlib.md5(
+            f"{aggregate['count']}:{last_modified.isoformat()}".encode()
+        ).hexdigest()
+        return quote_etag(digest), int(last_modified.timestamp())
+
+    def set_validators(self, response, etag, last_modified):
+        """Set validator headers so clients revalidate instead of re-downloading"""
+        if etag:
+            response["ETag"] = etag
+        if last_modified:
+            response["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def get_conditional_response(self, etag, last_modified):
+        """Return a 304 (or 412) response if the request preconditions allow it"""
+        placeholder = self.set_validators(HttpResponse(), etag, last_modified)
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=last_modified, response=placeholder
+        )
+        return None if response is placeholder else response
+
+    def get_cached_response(self, key, queryset, get_response, allow_empty=True):
+        """Return a response from the menu cache, answering conditional
+        requests without serializing anything.
+
+        Args:
+            key (str): Menu cache key of the response.
+            queryset (QuerySet): Queryset the response is built from, used to
+            compute the validators on cache misses.
+            get_response (Callable[[], Response]): Builds the full response.
+            allow_empty (bool): Whether an empty queryset is a response, if
+            not it is a 404, whatever the preconditions.
+
+        Raises:
+            Http404: If the queryset is empty and allow_empty is False.
+
+        Returns:
+            HttpResponse: Full or not modified response.
+        """
+        entry = cache.menu_cache.get(key)
+        if entry is None:
+            # A replica may not hold a recent write yet, the response would be
+            # cached under the generation of that write
+            cacheable = not reads_from_replica() or cache.replicas_caught_up()
+            etag, last_modified = self.get_validators(queryset)
+            if last_modified is None and not allow_empty:
+                raise Http404
+        else:
+            etag, last_modified = entry["etag"], entry["last_modified"]
+
+        conditional_response = self.get_conditional_response(etag, last_modified)
+        if conditional_response is not None:
+            return conditional_response
+
+        if entry is None:
+            response = get_response()
+            if cacheable:
+                cache.menu_cache.set(
+                    key,
+                    {
+                        "data": response.data,
+                        "etag": etag,
+                        "last_modified": last_modified,
+                    },
+                )
+        else:
+            response = Response(entry["data"])
+        return self.set_validators(response, etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        """List menus, served from the menu cache when possible"""
+        key = self.get_list_cache_key()
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.get_cached_response(
+            key,
+            queryset,
+            lambda: super(MenuViewSet, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a menu, served from the menu cache when possible"""
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            queryset = self.get_queryset().filter(pk=pk)
+        except (TypeError, ValueError):
+            raise Http404
+        return self.get_cached_response(
+            cache.detail_key(pk),
+            queryset,
+            lambda: super(MenuViewSet, self).retrieve(request, *args, **kwargs),
+            allow_empty=False,
+        )
 
     def perform_create(self, serializer):
         """Create a new menu object"""
@@ -50,10 +206,49 @@ class MenuViewSet(viewsets.ModelViewSet):
         # menu belongs to authenticated user
         # authentication class takes care of getting the authenticated user
         # and assigning it to request so we can get self.request.user
+        cache.bump_generations(serializer.instance.preparation_date)
+
+    def perform_update(self, serializer):
+        """Update a menu, invalidating both its old and new day"""
+        previous_date = serializer.instance.preparation_date
+        serializer.save()
+        cache.bump_generations(previous_date, serializer.instance.preparation_date)
+
+    def perform_destroy(self, instance):
+        """Delete a menu, invalidating its day"""
+        preparation_date = instance.preparation_date
+        instance.delete()
+        cache.bump_generations(preparation_date)
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """Create and update many menus, e.g. a whole week, in one transaction
+
+        Invalid rows abort the whole request, unless ``skip_invalid`` is set
+        in which case the valid rows are written and the errors reported.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        errors = serializer.validate_rows()
+        if errors and not serializer.validated_data["skip_invalid"]:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer.save_rows()
+        cache.bump_generations(*serializer.touched_dates)
+        return Response(
+            {
+                "created": MenuSerializer(serializer.new_menus, many=True).data,
+                "updated": MenuSerializer(serializer.updated_menus, many=True).data,
+                "errors": errors,
+            },
+            status=status.HTTP_201_CREATED,
+        )
 
     def get_serializer_class(self):
         """Return appropiate serializer class"""
         if self.action == "retrieve":
             return MenuDetailSerializer
+        if self.action == "bulk":
+            return MenuBulkSerializer
 
         return MenuSerializer
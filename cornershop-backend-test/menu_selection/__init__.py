@@ -0,0 +1 @@
+default_app_config = "menu_selection.apps.MenuSelectionConfig"
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class MenuSelectionConfig(AppConfig):
     name = "menu_selection"
+
+    def ready(self):
+        from menu_selection import signals  # noqa: F401
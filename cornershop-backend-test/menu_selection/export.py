@@ -0,0 +1,72 @@
+import csv
+from typing import Dict, Iterable, Iterator, List
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+
+from core.utils.pagination import keyset_batches
+
+# Columns of the export, as values() lookups from MenuSelection
+EXPORT_FIELDS = (
+    "id",
+    "selected_at",
+    "user_id",
+    "user__username",
+    "user__name",
+    "menu_id",
+    "menu__preparation_date",
+    "menu__meal_time",
+    "menu__main_dish",
+    "menu__side_dish",
+    "menu__dessert",
+    "customizations",
+)
+# Ordering of the export, backed by the core_selection_at_id_idx index
+EXPORT_KEYS = ("selected_at", "id")
+# Rows fetched per query, and rendered per yielded chunk
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object returning what is written, so csv.writer renders
+    single rows without buffering them"""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def export_batches(selections: QuerySet) -> Iterator[List[Dict]]:
+    """Reads the ``EXPORT_FIELDS`` of selections in keyset batches of
+    CHUNK_SIZE rows ordered by ``EXPORT_KEYS``, one query per batch"""
+    return keyset_batches(selections.values(*EXPORT_FIELDS), EXPORT_KEYS, CHUNK_SIZE)
+
+
+def stream_csv(batches: Iterable[List[Dict]]) -> Iterator[str]:
+    """Renders batches of ``EXPORT_FIELDS`` values as CSV, one batch at a
+    time.
+
+    Args:
+        batches (Iterable[List[Dict]]): Batches from ``export_batches``.
+
+    Yields:
+        str: Header line, then CHUNK_SIZE rendered rows at most.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for batch in batches:
+        yield "".join(
+            writer.writerow([row[field] for field in EXPORT_FIELDS]) for row in batch
+        )
+
+
+def stream_ndjson(batches: Iterable[List[Dict]]) -> Iterator[str]:
+    """Renders batches as newline delimited JSON, one batch at a time"""
+    encoder = DjangoJSONEncoder()
+    for batch in batches:
+        yield "".join(f"{encoder.encode(row)}\n" for row in batch)
+
+
+EXPORT_FORMATS = {
+    "csv": (stream_csv, "text/csv; charset=utf-8"),
+    "ndjson": (stream_ndjson, "application/x-ndjson; charset=utf-8"),
+}
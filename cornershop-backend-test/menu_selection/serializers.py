@@ -1,13 +1,11 @@
-from datetime import datetime
-
-from django.utils import timezone
+from django.db import IntegrityError, transaction
+from django.utils.translation import ugettext_lazy as _
 from rest_framework import serializers, status
 from rest_framework.exceptions import APIException
 
-from core.models import Menu, MenuSelection
-from core.utils.date_utils import generate_day_range_for_date, is_between
+from core.models import MenuSelection, MenuSelectionTally
+from menu_selection.validators import get_selection_errors
 from users.serializers import UserSerializer
-from django.utils.translation import ugettext_lazy as _
 
 
 class ValidationError422(APIException):
@@ -25,25 +23,45 @@ class MenuSelectionSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         """Create a menu selection"""
-        menu_selection = MenuSelection.objects.create(**validated_data)
-        return menu_selection
+        try:
+            with transaction.atomic():
+                return MenuSelection.objects.create(**validated_data)
+        except IntegrityError:
+            raise self.duplicate_error()
+
+    def update(self, instance, validated_data):
+        """Update a menu selection and its menu tallies together"""
+        try:
+            with transaction.atomic():
+                return super().update(instance, validated_data)
+        except IntegrityError:
+            raise self.duplicate_error()
+
+    def duplicate_error(self):
+        """The user already selected the menu, see the unique constraint of
+        MenuSelection"""
+        return serializers.ValidationError(
+            detail={"menu": [_("Ya seleccionaste este menu")]}
+        )
 
     def validate(self, data):
         """
-        Check that start is before finish.
+        Check that the menu is today's menu and that it is before 11 AM.
+
+        The menu was already resolved by its field, so no query is made. A
+        partial update without menu is checked against the selected one.
         """
-        menu_id = data["menu"].id
-        now = timezone.now()
-        hour = now.hour
-        gte, lte = generate_day_range_for_date(now)
-        menu = Menu.objects.get(id=menu_id)
-        valid_selection = is_between(menu.preparation_date, lte, gte)
-        # Check menu selected is for today
-        errors = []
-        if not valid_selection:
-            errors.append(_("El menu seleccionado no es del dia de hoy"))
-        if not hour < 11:
-            errors.append(_("No puedes seleccionar un menu despues de las 11 AM"))
+        menu = data["menu"] if "menu" in data else self.instance.menu
+        errors = get_selection_errors(menu)
         if errors:
             raise serializers.ValidationError(detail={"menu": errors})
         return data
+
+
+class MenuSelectionTallySerializer(serializers.ModelSerializer):
+    """Serializer for the selection tallies of the menus of a day"""
+
+    class Meta:
+        model = MenuSelectionTally
+        fields = ("menu", "day", "meal_time", "count")
+        read_only_fields = fields
@@ -0,0 +1,34 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from core.models import Menu, MenuSelection
+from menu_selection import tallies
+
+
+@receiver(post_init, sender=MenuSelection)
+def remember_selected_menu(sender, instance, **kwargs):
+    # Read from __dict__ so instances with a deferred menu are not loaded
+    instance._tallied_menu_id = instance.__dict__.get("menu_id")
+
+
+@receiver(post_save, sender=MenuSelection)
+def tally_saved_selection(sender, instance, created, **kwargs):
+    """Count new selections and selections moved to another menu"""
+    previous_menu_id = None if created else instance._tallied_menu_id
+    if previous_menu_id != instance.menu_id:
+        if previous_menu_id is not None:
+            tallies.add_selections(previous_menu_id, -1)
+        tallies.add_selections(instance.menu_id, 1, menu=instance.menu)
+    instance._tallied_menu_id = instance.menu_id
+
+
+@receiver(post_delete, sender=MenuSelection)
+def tally_deleted_selection(sender, instance, **kwargs):
+    tallies.add_selections(instance.menu_id, -1)
+
+
+@receiver(post_save, sender=Menu)
+def move_menu_tally(sender, instance, created, **kwargs):
+    """Keep the tally of a menu on its day and meal time"""
+    if not created:
+        tallies.move_menus([instance])
@@ -0,0 +1,126 @@
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from core.models import Menu, MenuSelection, MenuSelectionTally
+
+
+def tally_day(menu: Menu) -> date:
+    return timezone.localtime(menu.preparation_date).date()
+
+
+def add_selections(menu_id: int, delta: int, menu: Optional[Menu] = None) -> None:
+    """Adds ``delta`` selections to the tally of a menu with an ``F()``
+    increment, creating the tally on its first selection.
+
+    Args:
+        menu_id (int): Id of the selected menu.
+        delta (int): Selections added, negative for removed ones.
+        menu (Menu | None): The menu if already loaded, it is only needed to
+        create the tally.
+    """
+    with transaction.atomic():
+        tallies = MenuSelectionTally.objects.filter(menu_id=menu_id)
+        if delta < 0:
+            # Never below zero, a drifted tally is fixed by rebuilding it
+            tallies = tallies.filter(count__gte=-delta)
+        if tallies.update(count=F("count") + delta) or delta < 0:
+            return
+        if menu is None:
+            menu = Menu.objects.only("preparation_date", "meal_time").get(pk=menu_id)
+        try:
+            with transaction.atomic():
+                MenuSelectionTally.objects.create(
+                    menu=menu,
+                    day=tally_day(menu),
+                    meal_time=menu.meal_time,
+                    count=delta,
+                )
+        except IntegrityError:
+            # Created by a concurrent selection of the same menu
+            MenuSelectionTally.objects.filter(menu_id=menu_id).update(
+                count=F("count") + delta
+            )
+
+
+def move_menus(menus: Iterable[Menu]) -> None:
+    """Moves the tallies of updated menus to their current day and meal time"""
+    menus = {menu.pk: menu for menu in menus}
+    tallies = list(MenuSelectionTally.objects.filter(menu_id__in=menus))
+    for tally in tallies:
+        menu = menus[tally.menu_id]
+        tally.day, tally.meal_time = tally_day(menu), menu.meal_time
+    MenuSelectionTally.objects.bulk_update(tallies, ["day", "meal_time"])
+
+
+def count_selections(day: Optional[date] = None) -> Dict[int, Tuple[date, int, int]]:
+    """Counts the selections of every menu from the live table.
+
+    Args:
+        day (date | None): Only count the menus of this day.
+
+    Returns:
+        Dict[int, Tuple[date, int, int]]: ``(day, meal_time, count)`` of the
+        selected menus by menu id.
+    """
+    selections = MenuSelection.objects.all()
+    if day is not None:
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        selections = selections.filter(
+            menu__preparation_date__gte=start,
+            menu__preparation_date__lt=start + timedelta(days=1),
+        )
+    rows = (
+        selections.values("menu")
+        .annotate(count=Count("id"))
+        .values_list("menu", "menu__preparation_date", "menu__meal_time", "count")
+        .order_by()
+    )
+    return {
+        menu_id: (timezone.localtime(preparation_date).date(), meal_time, count)
+        for menu_id, preparation_date, meal_time, count in rows
+    }
+
+
+def stored_tallies(day: Optional[date] = None) -> Dict[int, Tuple[date, int, int]]:
+    """Same as ``count_selections`` but read from the tally table, zero
+    tallies are left out"""
+    tallies = MenuSelectionTally.objects.filter(count__gt=0)
+    if day is not None:
+        tallies = tallies.filter(day=day)
+    return {
+        menu_id: (menu_day, meal_time, count)
+        for menu_id, menu_day, meal_time, count in tallies.values_list(
+            "menu", "day", "meal_time", "count"
+        )
+    }
+
+
+def rebuild_tallies(day: Optional[date] = None) -> int:
+    """Rebuilds the tallies from the live selections table.
+
+    Args:
+        day (date | None): Only rebuild the tallies of this day.
+
+    Returns:
+        int: Number of tallies written.
+    """
+    counts = count_selections(day)
+    tallies = [
+        MenuSelectionTally(
+            menu_id=menu_id, day=menu_day, meal_time=meal_time, count=count
+        )
+        for menu_id, (menu_day, meal_time, count) in counts.items()
+    ]
+    with transaction.atomic():
+        stale = MenuSelectionTally.objects.all()
+        if day is not None:
+            stale = stale.filter(day=day)
+        stale.delete()
+        # Tallies of the day that moved from another day are replaced too
+        MenuSelectionTally.objects.filter(menu_id__in=counts).delete()
+        MenuSelectionTally.objects.bulk_create(tallies)
+    return len(tallies)
@@ -0,0 +1,236 @@
+import csv
+import json
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+import psutil
+import pytz
+
+from core.models import Menu, MenuSelection
+from menu_selection.export import EXPORT_FIELDS
+
+EXPORT_URL = reverse("menu_selection:menuselection-export")
+# users x menus selections are seeded for the memory test
+SEED_USERS = 1_000
+SEED_MENUS = 1_000
+# Growth of the process RSS while streaming, which unlike the Python heap
+# includes the result sets buffered by the database driver
+PEAK_RSS_BUDGET = 32 * 1024 * 1024
+# Seeded selections are a second apart, SQLite only seeks the first column of
+# a row comparison, so every batch would scan again rows tied on selected_at
+SELECTED_AT_SQL = {
+    "postgresql": "%s - i * interval '1 second'",
+    "sqlite": "strftime('%%Y-%%m-%%d %%H:%%M:%%f', %s, '-' || i || ' seconds')",
+}
+
+
+def read_csv(res):
+    content = b"".join(res.streaming_content).decode()
+    return list(csv.DictReader(content.splitlines()))
+
+
+class MenuSelectionExportTests(TestCase):
+    """Test the streaming export of menu selections"""
+
+    def setUp(self):
+        self.staff_user = get_user_model().objects.create_superuser(
+            "exportstaff", "test123"
+        )
+        self.users = [
+            get_user_model().objects.create_user(
+                f"exportuser{i}", "test123", name=f"User {i}"
+            )
+            for i in range(2)
+        ]
+        self.menu = Menu.objects.create(
+            added_by_user=self.staff_user,
+            main_dish="Cazuela",
+            side_dish="Arroz",
+            dessert="Flan",
+        )
+        self.days = [
+            datetime(2021, 7, 10, 12, tzinfo=pytz.UTC),
+            datetime(2021, 7, 12, 9, tzinfo=pytz.UTC),
+        ]
+        self.selections = []
+        for user, day in zip(self.users, self.days):
+            selection = MenuSelection.objects.create(
+                user=user, menu=self.menu, customizations="Sin tomate, por favor"
+            )
+            MenuSelection.objects.filter(pk=selection.pk).update(selected_at=day)
+            self.selections.append(selection)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff_user)
+
+    def test_export_csv(self):
+        """Test that every selection is streamed as a CSV row"""
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn('filename="menu_selections.csv"', res["Content-Disposition"])
+        rows = read_csv(res)
+        self.assertEqual(
+            [row["id"] for row in rows], [str(s.id) for s in self.selections]
+        )
+        self.assertEqual(list(rows[0]), list(EXPORT_FIELDS))
+        self.assertEqual(rows[0]["user__username"], "exportuser0")
+        self.assertEqual(rows[0]["menu__main_dish"], "Cazuela")
+        self.assertEqual(rows[0]["customizations"], "Sin tomate, por favor")
+
+    def test_export_ndjson(self):
+        """Test that every selection is streamed as a JSON line"""
+        res = self.client.get(EXPORT_URL, {"output": "ndjson"})
+
+        self.assertEqual(res["Content-Type"], "application/x-ndjson; charset=utf-8")
+        lines = b"".join(res.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row["id"] for row in rows], [s.id for s in self.selections])
+        self.assertEqual(rows[1]["selected_at"], "2021-07-12T09:00:00Z")
+
+    @mock.patch("menu_selection.export.CHUNK_SIZE", 1)
+    def test_export_in_batches(self):
+        """Test that rows are read one bounded batch per query"""
+        res = self.client.get(EXPORT_URL)
+
+        with self.assertNumQueries(len(self.selections) + 1):
+            rows = read_csv(res)
+
+        self.assertEqual(
+            [row["id"] for row in rows], [str(s.id) for s in self.selections]
+        )
+
+    def test_export_date_range(self):
+        """Test that the range includes whole start and end days"""
+        for params, expected in (
+            ({"start": "2021-07-11"}, [self.selections[1]]),
+            ({"end": "2021-07-10"}, [self.selections[0]]),
+            ({"start": "2021-07-10", "end": "2021-07-12"}, self.selections),
+            ({"start": "2021-07-13"}, []),
+        ):
+            rows = read_csv(self.client.get(EXPORT_URL, params))
+
+            self.assertEqual(
+                [row["id"] for row in rows], [str(s.id) for s in expected], params
+            )
+
+    def test_export_user(self):
+        """Test that the selections of a single user can be exported"""
+        rows = read_csv(self.client.get(EXPORT_URL, {"user": self.users[1].id}))
+
+        self.assertEqual([row["id"] for row in rows], [str(self.selections[1].id)])
+
+    def test_invalid_params(self):
+        """Test that invalid filters and formats are rejected"""
+        for params in (
+            {"output": "xml"},
+            {"start": "yesterday"},
+            {"end": "2021-13-01"},
+            {"user": "me"},
+        ):
+            res = self.client.get(EXPORT_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_export_is_staff_only(self):
+        """Test that employees can not export selections"""
+        self.client.force_authenticate(self.users[0])
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@pytest.mark.slow
+class MenuSelectionExportMemoryTests(TestCase):
+    """Test that exports run in bounded memory whatever the row count"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff_user = get_user_model().objects.create_superuser(
+            "exportstaff", "test123"
+        )
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO core_user (
+                    password, username, name, slack_id, is_active, is_staff,
+                    is_superuser
+                )
+                WITH RECURSIVE seq(i) AS (
+                    SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < %s
+                )
+                SELECT '', 'exportuser' || i, 'Export user', '', %s, %s, %s
+                FROM seq
+                """,
+                [SEED_USERS, True, False, False],
+            )
+            cursor.execute(
+                """
+                INSERT INTO core_menu (
+                    created_at, modified_at, preparation_date, main_dish,
+                    side_dish, dessert, meal_time, weekday, added_by_user_id
+                )
+                WITH RECURSIVE seq(i) AS (
+                    SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < %s
+                )
+                SELECT %s, %s, %s, 'Main', 'Side', 'Dessert', 2, 1, %s
+                FROM seq
+                """,
+                [SEED_MENUS, now, now, now, cls.staff_user.id],
+            )
+            cursor.execute(
+                """
+                INSERT INTO core_menuselection (
+                    selected_at, modified_at, customizations, user_id, menu_id
+                )
+                WITH RECURSIVE seq(i) AS (
+                    SELECT 0 UNION ALL SELECT i + 1 FROM seq WHERE i < %s
+                )
+                SELECT
+                    {selected_at}, %s, 'Sin tomate',
+                    (SELECT min(id) FROM core_user WHERE username <> %s) + i / %s,
+                    (SELECT min(id) FROM core_menu) + i %% %s
+                FROM seq
+                """.format(
+                    selected_at=SELECTED_AT_SQL[connection.vendor]
+                ),
+                [
+                    SEED_USERS * SEED_MENUS - 1,
+                    now - timedelta(hours=1),
+                    now,
+                    cls.staff_user.username,
+                    SEED_MENUS,
+                    SEED_MENUS,
+                ],
+            )
+
+    def test_peak_memory_is_bounded(self):
+        """Test that streaming 1M rows keeps the process memory flat"""
+        client = APIClient()
+        client.force_authenticate(self.staff_user)
+        process = psutil.Process()
+
+        baseline = peak = process.memory_info().rss
+        res = client.get(EXPORT_URL)
+        lines = 0
+        for chunk in res.streaming_content:
+            lines += chunk.count(b"\n")
+            peak = max(peak, process.memory_info().rss)
+
+        self.assertEqual(lines - 1, SEED_USERS * SEED_MENUS)
+        growth = peak - baseline
+        self.assertLess(
+            growth, PEAK_RSS_BUDGET, f"RSS grew {growth / 1024 / 1024:.1f}MiB"
+        )
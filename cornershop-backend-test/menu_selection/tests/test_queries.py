@@ -0,0 +1,58 @@
+import pytest
+from django.urls import reverse
+
+from core.models import Menu, MenuSelection
+
+MENU_SELECTION_URL = reverse("menu_selection:menuselection-list")
+
+
+@pytest.fixture
+def staff_user(django_user_model):
+    return django_user_model.objects.create_superuser("querystaff", "test123.@1")
+
+
+def add_selections(staff_user, users, count=3):
+    """Return a callable adding selections of new menus for new users (or a
+    given user)"""
+
+    def _add_selections():
+        for _ in range(count):
+            user = users() if callable(users) else users
+            menu = Menu.objects.create(
+                added_by_user=staff_user,
+                main_dish="Main",
+                side_dish="Side",
+                dessert="Cake",
+            )
+            MenuSelection.objects.create(menu=menu, user=user, customizations="")
+
+    return _add_selections
+
+
+@pytest.mark.django_db
+def test_menu_selection_list_user(
+    api_client, django_user_model, staff_user, assert_list_queries
+):
+    """Single page query for the selections of the user"""
+    user = django_user_model.objects.create_user("queryuser", "test123.@1")
+    api_client.force_authenticate(user=user)
+
+    assert_list_queries(
+        api_client, MENU_SELECTION_URL, add_selections(staff_user, user), expected=1
+    )
+
+
+@pytest.mark.django_db
+def test_menu_selection_list_staff(
+    api_client, django_user_model, staff_user, assert_list_queries
+):
+    """Single page query for the selections of every user"""
+    usernames = (f"queryuser{i}" for i in range(100))
+    api_client.force_authenticate(user=staff_user)
+
+    def new_user():
+        return django_user_model.objects.create_user(next(usernames), "test123.@1")
+
+    assert_list_queries(
+        api_client, MENU_SELECTION_URL, add_selections(staff_user, new_user), expected=1
+    )
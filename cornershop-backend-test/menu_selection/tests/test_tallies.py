@@ -0,0 +1,225 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Menu, MenuSelection, MenuSelectionTally
+from menu.serializers import MenuBulkSerializer
+
+TALLIES_URL = reverse("menu_selection:menuselection-tallies")
+
+
+class MenuSelectionTallyTests(TestCase):
+    """Test that tallies follow the selections and their menus"""
+
+    def setUp(self):
+        self.staff_user = get_user_model().objects.create_superuser(
+            "tallystaff", "test123"
+        )
+        self.users = [
+            get_user_model().objects.create_user(f"tallyuser{i}", "test123")
+            for i in range(3)
+        ]
+        self.menu = self.create_menu()
+        self.other_menu = self.create_menu(meal_time=1)
+
+    def create_menu(self, **params):
+        defaults = {
+            "main_dish": "Sample dish",
+            "side_dish": "Side sample",
+            "dessert": "Cake",
+            "preparation_date": timezone.now(),
+        }
+        defaults.update(params)
+        return Menu.objects.create(added_by_user=self.staff_user, **defaults)
+
+    def select(self, user, menu):
+        return MenuSelection.objects.create(user=user, menu=menu, customizations="")
+
+    def tally(self, menu):
+        return MenuSelectionTally.objects.get(menu=menu)
+
+    def test_selections_are_counted(self):
+        """Test that creating and deleting selections updates the tally"""
+        selections = [self.select(user, self.menu) for user in self.users]
+        self.assertEqual(self.tally(self.menu).count, 3)
+        self.assertEqual(self.tally(self.menu).day, timezone.localdate())
+        self.assertEqual(self.tally(self.menu).meal_time, 2)
+
+        selections[0].delete()
+
+        self.assertEqual(self.tally(self.menu).count, 2)
+
+    def test_changed_selection_moves_count(self):
+        """Test that selecting another menu moves the selection count"""
+        selection = self.select(self.users[0], self.menu)
+        selection = MenuSelection.objects.get(pk=selection.pk)
+
+        selection.menu = self.other_menu
+        selection.save()
+        selection.customizations = "Sin tomate"
+        selection.save()
+
+        self.assertEqual(self.tally(self.menu).count, 0)
+        self.assertEqual(self.tally(self.other_menu).count, 1)
+
+    def test_changed_menu_moves_tally(self):
+        """Test that tallies follow the day and meal time of their menu"""
+        self.select(self.users[0], self.menu)
+        tomorrow = timezone.now() + timedelta(days=1)
+
+        self.menu.meal_time = 3
+        self.menu.preparation_date = tomorrow
+        self.menu.save()
+
+        tally = self.tally(self.menu)
+        self.assertEqual((tally.day, tally.meal_time), (tomorrow.date(), 3))
+
+    def test_bulk_updated_menu_moves_tally(self):
+        """Test that menus updated in bulk move their tallies too"""
+        self.select(self.users[0], self.menu)
+        serializer = MenuBulkSerializer(
+            data={"menus": [{"id": self.menu.id, "meal_time": 4}]}
+        )
+        serializer.is_valid(raise_exception=True)
+        self.assertEqual(serializer.validate_rows(), [])
+
+        serializer.save_rows()
+
+        self.assertEqual(self.tally(self.menu).meal_time, 4)
+
+    def test_count_never_goes_below_zero(self):
+        """Test that a drifted tally is not decremented below zero"""
+        selection = self.select(self.users[0], self.menu)
+        MenuSelectionTally.objects.update(count=0)
+
+        selection.delete()
+
+        self.assertEqual(self.tally(self.menu).count, 0)
+
+
+class MenuSelectionTallyAPITests(TestCase):
+    """Test the staff endpoint of the selection tallies"""
+
+    def setUp(self):
+        self.staff_user = get_user_model().objects.create_superuser(
+            "tallystaff", "test123"
+        )
+        self.user = get_user_model().objects.create_user("tallyuser", "test123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff_user)
+
+    def create_selections(self, menus, users, preparation_date=None):
+        for i in range(menus):
+            menu = Menu.objects.create(
+                added_by_user=self.staff_user,
+                main_dish="Sample dish",
+                side_dish="Side sample",
+                dessert="Cake",
+                meal_time=i % 4 + 1,
+                preparation_date=preparation_date or timezone.now(),
+            )
+            for j in range(users):
+                user = get_user_model().objects.create_user(
+                    f"selector{menu.id}-{j}", "test123"
+                )
+                MenuSelection.objects.create(user=user, menu=menu, customizations="")
+
+    def test_tallies_of_today(self):
+        """Test that today's tallies are listed with a single query"""
+        self.create_selections(menus=2, users=3)
+        self.create_selections(
+            menus=1, users=1, preparation_date=timezone.now() - timedelta(days=2)
+        )
+
+        with self.assertNumQueries(1):
+            res = self.client.get(TALLIES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([row["count"] for row in res.data], [3, 3])
+        self.assertEqual([row["meal_time"] for row in res.data], [1, 2])
+
+    def test_tallies_of_a_day(self):
+        """Test that the tallies of another day can be requested"""
+        two_days_ago = timezone.now() - timedelta(days=2)
+        self.create_selections(menus=1, users=2, preparation_date=two_days_ago)
+
+        res = self.client.get(TALLIES_URL, {"day": two_days_ago.date().isoformat()})
+
+        self.assertEqual([row["count"] for row in res.data], [2])
+
+    def test_invalid_day(self):
+        """Test that invalid days are rejected"""
+        for day in ("tomorrow", "2021-02-30"):
+            res = self.client.get(TALLIES_URL, {"day": day})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tallies_are_staff_only(self):
+        """Test that employees can not see the tallies"""
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(TALLIES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class RebuildSelectionTalliesCommandTests(TestCase):
+    """Test the command rebuilding and checking the selection tallies"""
+
+    def setUp(self):
+        staff_user = get_user_model().objects.create_superuser("tallystaff", "test123")
+        self.menu = Menu.objects.create(
+            added_by_user=staff_user,
+            main_dish="Sample dish",
+            side_dish="Side sample",
+            dessert="Cake",
+            preparation_date=timezone.now(),
+        )
+        for i in range(3):
+            user = get_user_model().objects.create_user(f"tallyuser{i}", "test123")
+            MenuSelection.objects.create(user=user, menu=self.menu, customizations="")
+
+    def call(self, *args):
+        out = StringIO()
+        call_command("rebuild_selection_tallies", *args, stdout=out)
+        return out.getvalue()
+
+    def test_check_matching_tallies(self):
+        """Test that maintained tallies match the selections"""
+        self.assertIn("1 tallies match", self.call("--check"))
+
+    def test_check_detects_drift(self):
+        """Test that drifted tallies make the check fail"""
+        MenuSelectionTally.objects.update(count=10)
+
+        with self.assertRaises(CommandError):
+            self.call("--check", "--day", timezone.localdate().isoformat())
+
+    def test_rebuild(self):
+        """Test that rebuilding fixes drifted and missing tallies"""
+        MenuSelectionTally.objects.all().delete()
+
+        self.assertIn("Rebuilt 1 tallies", self.call())
+
+        self.assertEqual(MenuSelectionTally.objects.get(menu=self.menu).count, 3)
+        self.assertIn("1 tallies match", self.call("--check"))
+
+    def test_rebuild_day(self):
+        """Test that a single day can be rebuilt"""
+        MenuSelectionTally.objects.update(count=10)
+
+        self.call("--day", timezone.localdate().isoformat())
+
+        self.assertEqual(MenuSelectionTally.objects.get(menu=self.menu).count, 3)
+
+    def test_invalid_day(self):
+        """Test that invalid days are rejected"""
+        with self.assertRaises(CommandError):
+            self.call("--day", "yesterday")
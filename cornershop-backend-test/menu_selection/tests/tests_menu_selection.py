@@ -1,16 +1,20 @@
 from datetime import datetime, timedelta
 
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 
 import pytz
+from freezegun import freeze_time
 
 from core.models import Menu, MenuSelection
 from menu_selection.serializers import MenuSelectionSerializer
+from menu_selection.validators import get_selection_window
 
 MENU_SELECTION_URL = reverse("menu_selection:menuselection-list")
 
@@ -28,6 +32,11 @@ def detail_url(menu_id):
     return reverse("menu:menu-detail", args=[menu_id])
 
 
+def selection_url(selection_id):
+    """Return menu selection detail URL"""
+    return reverse("menu_selection:menuselection-detail", args=[selection_id])
+
+
 def sample_menu(user, **params):
     """Create and return a sample menu"""
     defaults = {
@@ -82,7 +91,7 @@ class PrivateMenuAPITests(TestCase):
         serializer = MenuSelectionSerializer(selections, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_creating_a_menu_selection(self):
         """Test creating a new menu selection for specific user"""
@@ -125,12 +134,12 @@ class PrivateMenuAPITests(TestCase):
         MenuSelection.objects.create(**payload2)
 
         res = self.client.get(MENU_SELECTION_URL)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]["user"]["username"], self.user.username)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(res.data["results"][0]["user"]["username"], self.user.username)
 
         self.client.force_authenticate(user=staff_user)
         res = self.client.get(MENU_SELECTION_URL)
-        self.assertEqual(len(res.data), 2)
+        self.assertEqual(len(res.data["results"]), 2)
 
     def test_creating_selection_conditions(self):
         """
@@ -169,3 +178,136 @@ class PrivateMenuAPITests(TestCase):
                 res.data["menu"][1],
                 "El menu seleccionado no es del dia de hoy",
             )
+
+
+class MenuSelectionPaginationTests(TestCase):
+    """Tests for the cursor pagination of the menu selection listing"""
+
+    def setUp(self):
+        self.staff_user = create_staff_user(username="pagestaff", password="test123.@1")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.staff_user)
+        menu = sample_menu(self.staff_user)
+        self.selections = [
+            MenuSelection.objects.create(
+                menu=menu,
+                user=create_user(username=f"pageuser{i}", password="test123.@1"),
+                customizations="",
+            )
+            for i in range(5)
+        ]
+
+    def test_staff_listing_is_paginated(self):
+        """Test that staff listings follow the cursor in selection order"""
+        usernames = []
+        res = self.client.get(MENU_SELECTION_URL, {"page_size": 2, "sort": "desc"})
+        while True:
+            self.assertLessEqual(len(res.data["results"]), 2)
+            usernames.extend(item["user"]["username"] for item in res.data["results"])
+            if not res.data["next"]:
+                break
+            res = self.client.get(res.data["next"])
+
+        expected = [selection.user.username for selection in self.selections]
+        self.assertEqual(usernames, list(reversed(expected)))
+
+    def test_non_whitelisted_ordering(self):
+        """Test that orderings without an index behind them are rejected"""
+        res = self.client.get(MENU_SELECTION_URL, {"order_by": "customizations"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@freeze_time("2021-07-12 10:30:00")
+class MenuSelectionValidationTests(TestCase):
+    """Tests for the menu selection validation pipeline"""
+
+    def setUp(self):
+        self.user = create_user(username="validationuser", password="test123.@1")
+        self.staff_user = create_staff_user(
+            username="validationstaff", password="test123.@1"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_menu_is_resolved_once(self):
+        """Test that validating a selection queries the menu only once"""
+        menu = sample_menu(self.staff_user, preparation_date=timezone.now())
+        payload = {"menu": menu.id, "customizations": "Sin tomate"}
+
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.post(MENU_SELECTION_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        menu_queries = [
+            query
+            for query in context.captured_queries
+            if query["sql"].startswith("SELECT") and "core_menu" in query["sql"]
+        ]
+        self.assertEqual(len(menu_queries), 1)
+
+    def test_selection_after_cutoff(self):
+        """Test that selections are rejected after 11 AM"""
+        menu = sample_menu(self.staff_user, preparation_date=timezone.now())
+        payload = {"menu": menu.id, "customizations": "Sin tomate"}
+
+        with freeze_time("2021-07-12 11:00:00"):
+            res = self.client.post(MENU_SELECTION_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data["menu"],
+            ["No puedes seleccionar un menu despues de las 11 AM"],
+        )
+
+    def test_duplicate_selection(self):
+        """Test that a menu can only be selected once per user"""
+        menu = sample_menu(self.staff_user, preparation_date=timezone.now())
+        payload = {"menu": menu.id, "customizations": "Sin tomate"}
+
+        self.client.post(MENU_SELECTION_URL, payload)
+        res = self.client.post(MENU_SELECTION_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["menu"], ["Ya seleccionaste este menu"])
+        self.assertEqual(MenuSelection.objects.filter(user=self.user).count(), 1)
+
+    @freeze_time("2021-07-12 10:00:00")
+    def test_partial_update_without_menu(self):
+        """Test that a selection can be updated without sending its menu"""
+        menu = sample_menu(self.staff_user, preparation_date=timezone.now())
+        selection = MenuSelection.objects.create(menu=menu, user=self.user)
+
+        res = self.client.patch(
+            selection_url(selection.id), {"customizations": "Sin sal"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        selection.refresh_from_db()
+        self.assertEqual(selection.customizations, "Sin sal")
+
+    @freeze_time("2021-07-12 10:00:00")
+    def test_update_to_selected_menu(self):
+        """Test that a selection can not be moved to a menu already selected"""
+        menus = [
+            sample_menu(self.staff_user, preparation_date=timezone.now())
+            for _ in range(2)
+        ]
+        selection, _ = [
+            MenuSelection.objects.create(menu=menu, user=self.user) for menu in menus
+        ]
+
+        res = self.client.patch(selection_url(selection.id), {"menu": menus[1].id})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["menu"], ["Ya seleccionaste este menu"])
+
+    def test_selection_window_is_cached_per_day(self):
+        """Test that the selection window is computed once per day"""
+        today = timezone.now().date()
+
+        window = get_selection_window(today)
+
+        self.assertIs(get_selection_window(today), window)
+        self.assertEqual(window.cutoff, timezone.now().replace(hour=11, minute=0))
+        self.assertIsNot(get_selection_window(today + timedelta(days=1)), window)
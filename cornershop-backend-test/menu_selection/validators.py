@@ -0,0 +1,76 @@
+from datetime import date, datetime, time
+from functools import lru_cache
+from typing import Callable, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+from core.models import Menu
+
+
+class SelectionWindow(NamedTuple):
+    """Day in which menus can be selected and the time selections close"""
+
+    start: datetime
+    end: datetime
+    cutoff: datetime
+
+
+SelectionValidator = Callable[[Menu, datetime, SelectionWindow], Optional[str]]
+
+
+@lru_cache(maxsize=8)
+def get_selection_window(day: date) -> SelectionWindow:
+    """Gets the selection window of a day, computed once per day and process.
+
+    Args:
+        day (date): Day of the window, in the current timezone.
+
+    Returns:
+        SelectionWindow: Bounds of the day and the selection cutoff.
+    """
+    tz = timezone.get_current_timezone()
+    return SelectionWindow(
+        start=timezone.make_aware(datetime.combine(day, time.min), tz),
+        end=timezone.make_aware(datetime.combine(day, time.max), tz),
+        cutoff=timezone.make_aware(
+            datetime.combine(day, time(hour=settings.MENU_SELECTION_CUTOFF_HOUR)), tz
+        ),
+    )
+
+
+def validate_menu_is_for_today(
+    menu: Menu, now: datetime, window: SelectionWindow
+) -> Optional[str]:
+    if not window.start <= menu.preparation_date <= window.end:
+        return _("El menu seleccionado no es del dia de hoy")
+
+
+def validate_before_cutoff(
+    menu: Menu, now: datetime, window: SelectionWindow
+) -> Optional[str]:
+    if not now < window.cutoff:
+        return _("No puedes seleccionar un menu despues de las 11 AM")
+
+
+SELECTION_VALIDATORS: List[SelectionValidator] = [
+    validate_menu_is_for_today,
+    validate_before_cutoff,
+]
+
+
+def get_selection_errors(menu: Menu, now: datetime = None) -> List[str]:
+    """Runs every selection rule against an already resolved menu.
+
+    Args:
+        menu (Menu): Menu being selected.
+        now (datetime | None): Time of the selection, defaults to now.
+
+    Returns:
+        List[str]: Error messages of the rules that failed, in order.
+    """
+    now = timezone.localtime(now or timezone.now())
+    window = get_selection_window(now.date())
+    errors = (validator(menu, now, window) for validator in SELECTION_VALIDATORS)
+    return [error for error in errors if error]
@@ -1,42 +1,165 @@
+from datetime import datetime, time, timedelta
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.translation import ugettext_lazy as _
 from rest_framework import viewsets
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+
+from backend_test.utils.replicas import ReplicaReadMixin
+from core.models import MenuSelection, MenuSelectionTally
+from core.utils.authentication import CachedTokenAuthentication
+from core.utils.date_utils import generate_day_range_for_date, parse_aware_datetime
+from core.utils.pagination import WhitelistedCursorPagination
+from menu_selection import export
+from menu_selection.serializers import (
+    MenuSelectionSerializer,
+    MenuSelectionTallySerializer,
+)
+
+
+class MenuSelectionPagination(WhitelistedCursorPagination):
+    """Keyset pagination over the indexed menu selection orderings"""
 
-from core.models import MenuSelection
-from core.utils.date_utils import generate_day_range_for_date
-from menu_selection.serializers import MenuSelectionSerializer
+    orderings = {
+        "selected_at": ("selected_at", "id"),
+        "id": ("id",),
+    }
+    default_order_by = "selected_at"
 
 
-class MenuSelectionViewSet(viewsets.ModelViewSet):
+class MenuSelectionViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """Manage menus in the database"""
 
     queryset = MenuSelection.objects.all()
     serializer_class = MenuSelectionSerializer
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = MenuSelectionPagination
+    list_fields = (
+        "id",
+        "selected_at",
+        "customizations",
+        "menu",
+        "user__username",
+        "user__name",
+    )
+    replica_actions = ("list", "tallies")
+
+    def use_replica(self, request):
+        """Only the listings of the staff are read from a replica"""
+        return request.user.is_staff and super().use_replica(request)
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
         selected_at = self.request.query_params.get("selected_at")
-        order_by = self.request.query_params.get("order_by") or "selected_at"
-        sort = self.request.query_params.get("sort") or ""
-        sort = "-" if sort == "desc" else ""
+        ordering = self.paginator.get_ordering(self.request)
 
         if selected_at:
+            try:
+                selected_at = parse_aware_datetime(selected_at)
+            except ValueError:
+                raise ValidationError(
+                    {"selected_at": [_("Fecha de seleccion invalida")]}
+                )
             gte, lte = generate_day_range_for_date(selected_at)
             self.queryset = self.queryset.filter(
-                preparation_date__gte=gte,
-                preparation_date__lte=lte,
+                selected_at__gte=gte,
+                selected_at__lte=lte,
             )
         is_staff = self.request.user.is_staff
         if not is_staff:
             self.queryset = self.queryset.filter(user=self.request.user)
 
-        return self.queryset.order_by(f"{sort}{order_by}")
+        queryset = self.queryset.select_related("user")
+        if self.action == "list":
+            # Only the serialized and cursor columns, instances with deferred
+            # fields would not update modified_at when saved
+            queryset = queryset.only(*self.list_fields)
+
+        return queryset.order_by(*ordering)
 
     def perform_create(self, serializer):
         """Create a new menu object"""
         serializer.save(user=self.request.user)
 
+    def get_date_param(self, name):
+        """Return the date of a query param, None if it was not sent"""
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValidationError({name: [_("Fecha invalida")]})
+        return day
+
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated, IsAdminUser),
+        pagination_class=None,
+    )
+    def tallies(self, request):
+        """Number of selections of each menu of a day, today by default"""
+        day = self.get_date_param("day") or timezone.localdate()
+        tallies = MenuSelectionTally.objects.filter(day=day).order_by(
+            "meal_time", "menu"
+        )
+        return Response(MenuSelectionTallySerializer(tallies, many=True).data)
+
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated, IsAdminUser),
+        pagination_class=None,
+    )
+    def export(self, request):
+        """Stream every selection in a date range as CSV or NDJSON
+
+        Rows are read in keyset batches and rendered as they are sent, so
+        memory use does not grow with the number of selections.
+
+        Sync workers do not heartbeat while streaming and are killed after
+        GUNICORN_TIMEOUT, so long exports need the gthread or uvicorn
+        GUNICORN_PROFILE.
+        """
+        output = request.query_params.get("output") or "csv"
+        if output not in export.EXPORT_FORMATS:
+            allowed = ", ".join(sorted(export.EXPORT_FORMATS))
+            raise ValidationError(
+                {"output": [_("Formato no permitido, usa: %s") % allowed]}
+            )
+        start, end = self.get_date_param("start"), self.get_date_param("end")
+        user = request.query_params.get("user")
+
+        selections = MenuSelection.objects.all()
+        if start:
+            selections = selections.filter(
+                selected_at__gte=timezone.make_aware(datetime.combine(start, time.min))
+            )
+        if end:
+            selections = selections.filter(
+                selected_at__lt=timezone.make_aware(
+                    datetime.combine(end + timedelta(days=1), time.min)
+                )
+            )
+        if user:
+            if not user.isdigit():
+                raise ValidationError({"user": [_("Usuario invalido")]})
+            selections = selections.filter(user_id=user)
+
+        stream, content_type = export.EXPORT_FORMATS[output]
+        response = StreamingHttpResponse(
+            stream(export.export_batches(selections)), content_type=content_type
+        )
+        filename = f"menu_selections.{output}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
     def retrieve(self, request):
         return self.queryset.get(user=request.user)
@@ -0,0 +1,22 @@
+import pytest
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+ME_URL = reverse("users:me")
+
+
+@pytest.mark.django_db
+def test_me_token_authenticated(api_client, django_user_model, assert_list_queries):
+    """Only the load of the fields missing from the cached token snapshot,
+    whatever the number of users"""
+    user = django_user_model.objects.create_user("queryuser", "test123.@1")
+    token = Token.objects.create(user=user)
+    api_client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    api_client.get(ME_URL)
+    usernames = (f"queryuser{i}" for i in range(100))
+
+    def add_users():
+        for _ in range(3):
+            django_user_model.objects.create_user(next(usernames), "test123.@1")
+
+    assert_list_queries(api_client, ME_URL, add_users, expected=1)